@@ -1,55 +1,67 @@
+import asyncio
+import functools
 import logging
+import threading
 import uvicorn
 from pathlib import Path
-from typing import Optional
-import difflib
+from enum import Enum
+from typing import Optional, Union
 from datetime import datetime
+from collections import defaultdict
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Query, Response, status
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 from mtg.objects import Card, Document
 from mtg.chroma.config import ChromaConfig
 from mtg.chroma.chroma_db import ChromaDB, CollectionType
+from mtg.chroma.batching import EmbeddingBatcher
+from mtg.chroma.embedding import normalize_query
 from mtg.util import load_config, read_json_file
-from mtg.url_parsing import parse_card_names
-from mtg.etl.create_card_db import update_cards
+from mtg.card_db import CardDB
+from mtg.executor import SearchExecutor
+from mtg.response_cache import ResponseCache
+from mtg.pagination import (
+    Cursor,
+    decode_cursor,
+    encode_cursor,
+    next_cursor,
+    select_page,
+)
+from mtg.serialization import (
+    NDJSON_MEDIA_TYPE,
+    CardField,
+    CardRef,
+    negotiate_media_type,
+    project_cards,
+    select_card_fields,
+)
+from mtg.intent import Intent, IntentRouter
+from mtg.mentions import Mentions
+from mtg.filter_index import CardFilter, SearchResult
+from mtg.etl.create_card_db import run_card_update
+from mtg.update_job import Job, JobRunner, JobStartingError
 
 config: dict = load_config(Path("configs/config.yaml"))
 chroma_config = ChromaConfig(**config["CHROMA"])
 db = ChromaDB(chroma_config)
 
 # load card data
-# TODO -> make class CardDB and load from config
 cards_folder = Path(config.get("cards_folder", "../data/etl/processed/cards"))
+card_snapshot_file = Path(
+    config.get("card_snapshot_file", "../data/etl/processed/cards.snapshot")
+)
 
 
-def load_cards(cards_folder: Path) -> tuple[dict, dict]:
-    data = []
-    for file in cards_folder.iterdir():
-        data.append(read_json_file(file))
-
-    cards = [Card(**d) for d in data]
-    card_name_2_card = {card.name: card for card in cards}
-    all_card_names = list(card_name_2_card)
-
-    all_keywords, all_legalities = set(), set()
-
-    for card in data:
-        for keyword in card["keywords"]:
-            all_keywords.add(keyword)
-        for legality in card["legalities"]:
-            if card["legalities"][legality] == "legal":
-                all_legalities.add(legality)
-    return all_card_names, card_name_2_card, list(all_keywords), list(all_legalities)
-
+def load_cards(cards_folder: Path, card_snapshot_file: Path) -> CardDB:
+    return CardDB.load(cards_folder=cards_folder, snapshot_file=card_snapshot_file)
 
-all_card_names, card_name_2_card, all_keywords, all_legalities = load_cards(
-    cards_folder=cards_folder
-)
 
-all_color_identities = {"W", "U", "B", "R", "G"}
-logging.info(f"loaded {len(all_card_names)} cards")
+card_db = load_cards(cards_folder=cards_folder, card_snapshot_file=card_snapshot_file)
+logging.info(f"loaded {len(card_db)} cards")
 
 
 # load rules data
@@ -62,17 +74,130 @@ for file in docs_folder.iterdir():
 document_name_2_document = {doc.name: doc for doc in documents}
 logging.info(f"loaded {len(documents)} documents")
 
+# search work runs in a thread pool sized to the available cores
+search_executor = SearchExecutor(max_workers=config.get("search_workers"))
+
+# concurrent queries are embedded together
+embedding_batcher = EmbeddingBatcher(
+    db.embedding_function.embed_queries,
+    executor=search_executor,
+    max_batch_size=config.get("embedding_batch_size", 32),
+    max_wait_ms=config.get("embedding_batch_wait_ms", 5.0),
+)
+
+
+def get_card_data_version(cards_folder: Path, card_snapshot_file: Path) -> int:
+    """modification time of the card data that load_cards reads"""
+    if card_snapshot_file.is_file():
+        return card_snapshot_file.stat().st_mtime_ns
+    return cards_folder.stat().st_mtime_ns
+
+
+# reloads of the update job monitor and the watcher run one at a time
+reload_lock = threading.Lock()
+
+
+def reload_data() -> bool:
+    """
+    Picks up a data update that was published since the last reload.
+
+    Every server worker checks the generation of the chroma folder
+    periodically, the worker that ran the update also right after the job
+    finished. The chroma client is reconnected to see the new rows and, if the
+    card data changed, a new CardDB is built next to the serving one and
+    replaces it with a single assignment, so requests see either the old or
+    the new cards.
+
+    Returns:
+        bool: True if an update was loaded.
+    """
+    with reload_lock:
+        generation = app.db.published_generation()
+        if generation == app.data_generation:
+            return False
+        card_data_version = get_card_data_version(cards_folder, card_snapshot_file)
+        new_card_db = None
+        if card_data_version != app.card_data_version:
+            new_card_db = load_cards(
+                cards_folder=cards_folder, card_snapshot_file=card_snapshot_file
+            )
+        app.db.reconnect()
+        if new_card_db is not None:
+            app.card_db = new_card_db
+            app.card_data_version = card_data_version
+            logging.info(f"activated {len(new_card_db)} cards")
+        app.data_generation = generation
+        app.response_cache.invalidate()
+        logging.info(f"loaded data generation {generation}")
+        return True
+
+
+def activate_card_update(num_changes: Optional[int]) -> None:
+    """loads a finished card update in this worker, runs in the update job monitor"""
+    if num_changes is not None:
+        reload_data()
+
+
+async def watch_data_updates(interval_seconds: float) -> None:
+    """reloads updates of other workers and the etl scripts, see reload_data"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await app.search_executor.run(reload_data)
+        except Exception:
+            logging.exception("could not load the data update")
+
+
+async def warm_up_embedding_model() -> None:
+    """loads the embedding model off the event loop, /health is ready once it is done"""
+    try:
+        await app.search_executor.run(app.db.embedding_provider.warm_up)
+        logging.info(f"embedding model {app.db.embedding_model} is ready")
+    except Exception:
+        # the model is loaded again on the first request that needs it
+        logging.exception("could not warm up the embedding model")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = [asyncio.create_task(warm_up_embedding_model())]
+    reload_interval_seconds = config.get("data_reload_interval_seconds", 10)
+    if reload_interval_seconds:
+        tasks.append(asyncio.create_task(watch_data_updates(reload_interval_seconds)))
+    yield
+    for task in tasks:
+        task.cancel()
+    app.search_executor.shutdown()
+
+
 # app
-app = FastAPI(title="Planeswalker Data Service")
+app = FastAPI(title="Planeswalker Data Service", lifespan=lifespan)
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=config.get("gzip_minimum_size", 1000),
+    compresslevel=config.get("gzip_compresslevel", 5),
+)
 
 # setting global variables
 app.db = db
-app.all_card_names = all_card_names
-app.card_name_2_card = card_name_2_card
+app.card_db = card_db
+app.search_executor = search_executor
+app.embedding_batcher = embedding_batcher
+app.response_cache = ResponseCache(
+    maxsize=config.get("response_cache_size", 1024),
+    ttl_seconds=config.get("response_cache_ttl_seconds", 300),
+)
+app.intent_router = IntentRouter(db.embedding_provider)
 app.document_name_2_document = document_name_2_document
-app.all_keywords = all_keywords
-app.all_legalities = all_legalities
-app.all_color_identities = all_color_identities
+# versions of the loaded data, see reload_data
+app.data_generation = db.published_generation()
+app.card_data_version = get_card_data_version(cards_folder, card_snapshot_file)
+# card updates run one at a time across all workers in a separate process
+app.update_jobs = JobRunner(
+    run_card_update,
+    on_success=activate_card_update,
+    jobs_folder=Path(config.get("update_jobs_folder", "../data/jobs")),
+)
 
 
 # Interface
@@ -81,6 +206,9 @@ class RulesRequest(BaseModel):
     text: str
     k: int = Field(default=5)
     threshold: float = Field(default=0.2)
+    cursor: Optional[str] = Field(
+        default=None, description="X-Next-Cursor header of the previous page"
+    )
 
 
 class GetRulesResponse(BaseModel):
@@ -88,6 +216,10 @@ class GetRulesResponse(BaseModel):
     distance: float
 
 
+class RulesBatchRequest(BaseModel):
+    queries: list[RulesRequest]
+
+
 ## Cards
 class CardsRequest(BaseModel):
     text: str
@@ -98,6 +230,19 @@ class CardsRequest(BaseModel):
     legality: Optional[str] = Field(default=None)
     k: int = Field(default=20)
     threshold: float = Field(default=0.4)
+    detect_mentions: bool = Field(
+        default=True,
+        description="Return cards that are named in the text with distance 0",
+    )
+    fields: Optional[list[CardField]] = Field(
+        default=None, description="Only return these fields of the cards"
+    )
+    exclude: list[CardField] = Field(
+        default_factory=list, description="Leave these fields out of the cards"
+    )
+    cursor: Optional[str] = Field(
+        default=None, description="X-Next-Cursor header of the previous page"
+    )
 
 
 class GetCardsResponse(BaseModel):
@@ -105,47 +250,237 @@ class GetCardsResponse(BaseModel):
     distance: float
 
 
+class CardsBatchRequest(BaseModel):
+    queries: list[CardsRequest]
+
+
+## Search
+class SearchRequest(BaseModel):
+    text: str
+    keywords: list[str] = Field(default_factory=list)
+    color_identity: list[str] = Field(
+        default_factory=list, description="Can be a single character of WUBRG"
+    )
+    legality: Optional[str] = Field(default=None)
+    k_cards: int = Field(default=20)
+    threshold_cards: float = Field(default=0.4)
+    k_rules: int = Field(default=5)
+    threshold_rules: float = Field(default=0.2)
+    route: bool = Field(
+        default=False,
+        description="Skip collections that are not needed for the intent of the text",
+    )
+
+
+class SearchResponse(BaseModel):
+    cards: list[GetCardsResponse]
+    rules: list[GetRulesResponse]
+    intent: Optional[Intent] = None
+
+
 class CardNameRequest(BaseModel):
     card_name: str
 
 
+class CardNamesRequest(BaseModel):
+    card_names: list[str]
+
+
+class CardNameMatch(str, Enum):
+    EXACT = "exact"
+    FUZZY = "fuzzy"
+    NOT_FOUND = "not_found"
+
+
+class CardNameLookupResponse(BaseModel):
+    card_name: str
+    status: CardNameMatch
+    card: Optional[Card] = None
+
+
 class CardParseRequest(BaseModel):
     text: str
+    detect_card_names: bool = Field(
+        default=False,
+        description="Also link capitalized card names that are not in <<markers>>",
+    )
 
 
 class CardParseResponse(BaseModel):
     text: str
 
 
+class HealthInfo(BaseModel):
+    embedding_model: str
+    embedding_model_ready: bool
+
+
 class DBInfo(BaseModel):
     last_updated: datetime
     number_of_cards: int
     number_of_documents: int
 
 
+async def embed_queries(texts: list[str]) -> list:
+    """embeddings from the cache, the rest is embedded in a shared batch"""
+    embeddings = app.db.embedding_function.get_cached(texts)
+    missing = [text for text, embedding in zip(texts, embeddings) if embedding is None]
+    if missing:
+        computed = iter(await app.embedding_batcher.embed_many(missing))
+        embeddings = [
+            embedding if embedding is not None else next(computed)
+            for embedding in embeddings
+        ]
+    return embeddings
+
+
+def encode_response(
+    content,
+    accept: Optional[str],
+    streaming: bool = False,
+    headers: Optional[dict] = None,
+) -> Response:
+    """
+    Encodes the content with pre-serialized cards as json or msgpack.
+    If streaming is enabled and the client accepts ndjson, the items of the
+    content are encoded while the response is sent.
+    """
+    media_type = negotiate_media_type(accept, streaming=streaming)
+    if media_type == NDJSON_MEDIA_TYPE:
+        # the gzip middleware passes responses with a content encoding through,
+        # compressed chunks would wait in its buffer instead of being sent
+        return StreamingResponse(
+            app.card_db.card_encoder.iter_ndjson(content),
+            media_type=media_type,
+            headers={**(headers or {}), "Content-Encoding": "identity"},
+        )
+    return Response(
+        content=app.card_db.card_encoder.encode(content, media_type),
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+def get_cursor(request: Union[CardsRequest, RulesRequest]) -> Optional[Cursor]:
+    """position of the requested page, None for the first page"""
+    try:
+        return decode_cursor(request.text, request.cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def get_fetch_size(
+    request: Union[CardsRequest, RulesRequest], cursor: Optional[Cursor]
+) -> int:
+    """number of search results needed for the requested page"""
+    return (cursor.offset if cursor is not None else 0) + request.k
+
+
+def needs_more_results(
+    request: Union[CardsRequest, RulesRequest],
+    response: list[dict],
+    distances: list[float],
+    n_results: int,
+) -> bool:
+    """
+    True if the page is not full although the search could have returned more
+    results within the threshold, e.g. because the results were on earlier pages.
+    """
+    return (
+        len(response) < request.k
+        and len(distances) == n_results
+        and distances[-1] <= request.threshold
+        and n_results < config.get("max_fetch_size", 1000)
+    )
+
+
+def create_page_headers(
+    request: Union[CardsRequest, RulesRequest],
+    cursor: Optional[Cursor],
+    response: list[dict],
+) -> dict:
+    """a cursor to the next page if the page is full"""
+    if not response or len(response) < request.k:
+        return {}
+    page = []
+    for result in response:
+        if "card" in result:
+            name = result["card"].card_name
+        else:
+            name = result["document"].name
+        page.append((result["distance"], name))
+    return {
+        "X-Next-Cursor": encode_cursor(
+            request.text,
+            next_cursor(cursor, get_fetch_size(request, cursor), page),
+        )
+    }
+
+
 # Routes
-@app.get("/card_name/{card_name}", tags=["Cards"])
-async def search_card(card_name: str) -> GetCardsResponse:
-
-    card = app.card_name_2_card.get(card_name, None)
-    if card is None:
-        card_names = difflib.get_close_matches(card_name, app.all_card_names, n=1)
-        card = app.card_name_2_card.get(card_names[0], None)
-    if card is None:
+@app.get("/card_name/{card_name}", tags=["Cards"], response_model=GetCardsResponse)
+async def search_card(
+    card_name: str,
+    fields: Optional[list[CardField]] = Query(default=None),
+    exclude: list[CardField] = Query(default=[]),
+    accept: Optional[str] = Header(default=None),
+) -> Response:
+
+    match = card_name
+    if match not in app.card_db.card_name_2_card:
+        match = app.card_db.name_index.lookup(card_name)
+    if match is None or match not in app.card_db.card_name_2_card:
         raise ValueError(f"Card Name not found - {card_name}")
-    return GetCardsResponse(card=card, distance=0.0)
+    card_ref = CardRef(match, fields=select_card_fields(fields, exclude))
+    return encode_response({"card": card_ref, "distance": 0.0}, accept)
+
+
+def lookup_card_names(card_names: list[str]) -> list[dict]:
+    """exact hits from the card data, the misses in one pass through the name index"""
+    card_name_2_card = app.card_db.card_name_2_card
+    misses = [
+        card_name for card_name in card_names if card_name not in card_name_2_card
+    ]
+    miss_2_match = dict(zip(misses, app.card_db.name_index.lookup_many(misses)))
+
+    response = []
+    for card_name in card_names:
+        if card_name in card_name_2_card:
+            status, card = CardNameMatch.EXACT, CardRef(card_name)
+        elif miss_2_match[card_name] is not None:
+            status, card = CardNameMatch.FUZZY, CardRef(miss_2_match[card_name])
+        else:
+            status, card = CardNameMatch.NOT_FOUND, None
+        response.append({"card_name": card_name, "status": status, "card": card})
+    return response
+
+
+@app.post("/card_names", tags=["Cards"], response_model=list[CardNameLookupResponse])
+async def search_card_names(
+    request: CardNamesRequest, accept: Optional[str] = Header(default=None)
+) -> Response:
+    """Look up several card names at once, results are in the order of the request"""
+
+    response = await app.search_executor.run(lookup_card_names, request.card_names)
+    return encode_response(response, accept)
+
+
+@app.get("/autocomplete", tags=["Cards"])
+async def autocomplete(prefix: str, limit: int = 10) -> list[str]:
+    """Card name suggestions for a typed prefix, most expensive cards first"""
+
+    return app.card_db.prefix_index.complete(prefix, n=min(limit, 50))
 
 
 @app.get("/info", tags=["Infrastructure"])
 async def db_info() -> DBInfo:
     """Get info from the Database"""
 
-    cards_collection = app.db.get_collection(CollectionType.CARDS)
-    documents_collection = app.db.get_collection(CollectionType.DOCUMENTS)
-
-    last_updated = cards_collection.metadata["last_updated"]
-    number_of_cards = cards_collection.count()
-    number_of_documents = documents_collection.count()
+    with app.db.use_collection(CollectionType.CARDS) as cards_collection:
+        last_updated = cards_collection.metadata["last_updated"]
+        number_of_cards = cards_collection.count()
+    with app.db.use_collection(CollectionType.DOCUMENTS) as documents_collection:
+        number_of_documents = documents_collection.count()
 
     return DBInfo(
         last_updated=last_updated,
@@ -154,129 +489,446 @@ async def db_info() -> DBInfo:
     )
 
 
-@app.get("/update_cards", tags=["Infrastructure"])
-async def update_card_db() -> int:
-    all_cards_file = config.get("all_cards_file")
-    all_keywords_file = config.get("all_keywords_file")
-    processed_cards_folder = config.get("cards_folder")
+@app.get("/metrics", tags=["Infrastructure"])
+async def metrics() -> dict:
+    """Get cache statistics of the service"""
 
-    num_new_cards = update_cards(
-        all_cards_file=Path(all_cards_file),
-        all_keywords_file=Path(all_keywords_file),
-        processed_cards_folder=Path(processed_cards_folder),
-        db=app.db,
-    )
+    return {
+        "embedding_cache": app.db.embedding_function.stats(),
+        "embedding_batcher": app.embedding_batcher.stats(),
+        "filter_resolver": app.card_db.filter_resolver.memo_stats(),
+        "response_cache": app.response_cache.stats(),
+    }
+
+
+@app.get("/health", tags=["Infrastructure"])
+async def health(response: Response) -> HealthInfo:
+    """Service health, responds with 503 until the embedding model is loaded"""
 
-    all_card_names, card_name_2_card, all_keywords, all_legalities = load_cards(
-        cards_folder=cards_folder
+    if not app.db.is_ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return HealthInfo(
+        embedding_model=app.db.embedding_model,
+        embedding_model_ready=app.db.is_ready,
     )
-    app.all_card_names = all_card_names
-    app.card_name_2_card = card_name_2_card
-    app.all_keywords = all_keywords
-    app.all_legalities = all_legalities
 
-    return num_new_cards
+
+@app.get(
+    "/update_cards",
+    tags=["Infrastructure"],
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def update_card_db(force: bool = False, rebuild: bool = False) -> Job:
+    """
+    Starts the card update in a background process, if an update is already
+    running its job is returned instead. With rebuild the cards collection
+    is rebuilt in a new version and switched over once it is validated.
+    """
+    # takes the job lock and may wait for the job of another worker
+    try:
+        job, started = await app.search_executor.run(
+            app.update_jobs.start,
+            chroma_config=chroma_config,
+            all_cards_file=Path(config.get("all_cards_file")),
+            all_keywords_file=Path(config.get("all_keywords_file")),
+            processed_cards_folder=Path(config.get("cards_folder")),
+            card_snapshot_file=card_snapshot_file,
+            force=force,
+            rebuild=rebuild,
+        )
+    except JobStartingError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+            headers={"Retry-After": "1"},
+        )
+    if not started:
+        logging.info(f"card update {job.id} is already running")
+    return job
+
+
+@app.get("/update_cards/{job_id}", tags=["Infrastructure"])
+async def get_update_job(job_id: str) -> Job:
+    """progress and result of a card update"""
+    job = await app.search_executor.run(app.update_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"update job {job_id} not found")
+    return job
 
 
 @app.post("/parse_card_urls", tags=["Cards"])
 async def parse_cards(request: CardParseRequest) -> CardParseResponse:
 
-    text = parse_card_names(request.text, card_name_2_card=app.card_name_2_card)
+    text = await app.search_executor.run(
+        app.card_db.card_linker.link,
+        request.text,
+        detect_names=request.detect_card_names,
+    )
     return CardParseResponse(text=text)
 
 
-@app.post("/cards", tags=["Cards"])
-async def get_cards(request: CardsRequest) -> list[GetCardsResponse]:
-    # create query
-    query = {"query_texts": [request.text], "n_results": request.k, "where": []}
+def resolve_cards_filter(request: CardsRequest) -> CardFilter:
+    """matches the requested keywords, legality and colors to known values"""
+    return app.card_db.filter_resolver.resolve(
+        keywords=request.keywords,
+        color_identity=request.color_identity,
+        legality=request.legality,
+    )
+
+
+def search_cards(
+    query_embeddings: list,
+    card_filter: CardFilter,
+    n_results: int,
+    threshold: Optional[float] = None,
+) -> list[SearchResult]:
+    """vector search over the cards allowed by the filter, see CardFilterIndex.search"""
+    return app.card_db.filter_index.search(
+        query_embeddings,
+        card_filter=card_filter,
+        n_results=n_results,
+        query=functools.partial(app.db.query, CollectionType.CARDS),
+        fetch_embeddings=functools.partial(app.db.get_embeddings, CollectionType.CARDS),
+        exact_search_limit=config.get("exact_search_limit", 2000),
+        max_candidates=config.get("ann_max_candidates", 1000),
+        threshold=threshold,
+        exact_fallback_limit=config.get("exact_fallback_limit", 10000),
+    )
+
+
+def find_mentions(request: CardsRequest, card_filter: CardFilter) -> Mentions:
+    """cards named in the text that pass the filter"""
+    if not request.detect_mentions:
+        return Mentions(card_names=[], name_only=False)
+    mentions = app.card_db.mention_detector.detect(request.text)
+    return Mentions(
+        card_names=[
+            card_name
+            for card_name in mentions.card_names
+            if card_filter.is_empty()
+            or app.card_db.filter_index.allows(card_filter, card_name)
+        ],
+        name_only=mentions.name_only,
+    )
+
+
+def create_cards_response(
+    distances: list[float],
+    card_names: list[str],
+    request: CardsRequest,
+    mentioned_card_names: Optional[list[str]] = None,
+    cursor: Optional[Cursor] = None,
+) -> list[dict]:
+    """the cards of a GetCardsResponse list, cards are encoded when the response is sent"""
+    # mentioned cards come first with distance 0 on the first page
+    page = select_page(
+        zip(distances, card_names),
+        k=request.k,
+        threshold=request.threshold,
+        cursor=cursor,
+        pinned_names=mentioned_card_names or (),
+    )
+
+    response = []
+    for distance, card_name in page:
+        if card_name not in app.card_db.card_name_2_card:
+            logging.warning(f"card {card_name} is not in the card data")
+            continue
+        response.append({"card": CardRef(card_name), "distance": distance})
+    return response
+
+
+def create_rules_response(
+    distances: list[float],
+    metadatas: list[dict],
+    request: RulesRequest,
+    cursor: Optional[Cursor] = None,
+) -> list[dict]:
+    """the documents of a GetRulesResponse list, documents are encoded when the response is sent"""
+    page = select_page(
+        (
+            (distance, metadata["name"])
+            for distance, metadata in zip(distances, metadatas)
+        ),
+        k=request.k,
+        threshold=request.threshold,
+        cursor=cursor,
+    )
+    return [
+        {
+            "document": app.document_name_2_document.get(name, None),
+            "distance": distance,
+        }
+        for distance, name in page
+    ]
+
+
+def response_cache_generation() -> tuple[int, int]:
+    """changes whenever the collections or the card data change"""
+    return (app.db.generation, app.response_cache.generation)
+
+
+@app.post("/cards", tags=["Cards"], response_model=list[GetCardsResponse])
+async def get_cards(
+    request: CardsRequest, accept: Optional[str] = Header(default=None)
+) -> Response:
+    card_filter = resolve_cards_filter(request)
+    cursor = get_cursor(request)
+    generation = response_cache_generation()
+    cache_key = (
+        normalize_query(request.text),
+        request.k,
+        request.threshold,
+        request.detect_mentions,
+        card_filter.model_dump_json(),
+        cursor,
+    )
+    response = app.response_cache.get("cards", generation, cache_key)
+    if response is None:
+        response = await search_cards_request(request, card_filter, cursor)
+        app.response_cache.put("cards", generation, cache_key, response)
+
+    fields = select_card_fields(request.fields, request.exclude)
+    return encode_response(
+        project_cards(response, fields),
+        accept,
+        streaming=True,
+        headers=create_page_headers(request, cursor, response),
+    )
+
+
+async def search_cards_request(
+    request: CardsRequest, card_filter: CardFilter, cursor: Optional[Cursor] = None
+) -> list[dict]:
+    mentions = await app.search_executor.run(find_mentions, request, card_filter)
+    if mentions.name_only and mentions.card_names:
+        # the query only names cards, no need for the embedding model
+        return create_cards_response(
+            [], [], request, mentions.card_names, cursor=cursor
+        )
 
-    # adding keywords as or combinations
-    keyword_query = {}
-    for search_term in request.keywords:
-        matches = difflib.get_close_matches(
-            search_term, app.all_keywords, n=1, cutoff=0.8
+    query_embeddings = await embed_queries([request.text])
+    n_results = get_fetch_size(request, cursor)
+    while True:
+        results = await app.search_executor.run(
+            search_cards,
+            query_embeddings,
+            card_filter=card_filter,
+            n_results=n_results,
+            threshold=request.threshold,
         )
-        print("keyword matches", matches)
-        if matches:
-            keyword_query[f"keyword_{matches[0]}"] = True
-        else:
-            logging.info(f"did not find keyword: {query}")
-    if len(keyword_query) > 1:
-        query["where"].append(
-            {"$or": [{key: value} for key, value in keyword_query.items()]}
+        distances, card_names = results[0]
+        response = create_cards_response(
+            distances, card_names, request, mentions.card_names, cursor=cursor
         )
-    elif keyword_query:
-        query["where"].append(keyword_query)
-
-    # adding legalities as and (must be legal in...)
-    if request.legality is not None:
-        matches = difflib.get_close_matches(request.legality, app.all_legalities, n=1)
-        if matches:
-            query["where"].append({f"{matches[0]}_legal": True})
-        else:
-            logging.info(f"did not find legality: {query}")
-
-    # color identity (must have color identity...)
-    color_mapper = {"black": "B", "green": "G", "blue": "U", "white": "W", "red": "R"}
-    colors = []
-    for color in request.color_identity:
-        if color.upper() in app.all_color_identities:
-            colors.append(color.upper())
-        else:
-            color = color_mapper.get(color)
-            if color:
-                colors.append(color)
-    if len(colors) > 1:
-        query["where"].append(
-            {"$or": [{f"color_identity_{color}": True} for color in colors]}
+        if not needs_more_results(request, response, distances, n_results):
+            return response
+        n_results = min(n_results * 2, config.get("max_fetch_size", 1000))
+
+
+@app.post("/cards/batch", tags=["Cards"], response_model=list[list[GetCardsResponse]])
+async def get_cards_batch(
+    request: CardsBatchRequest, accept: Optional[str] = Header(default=None)
+) -> Response:
+    """Search cards for several queries with one embedding pass"""
+
+    card_filters = [resolve_cards_filter(query) for query in request.queries]
+    mentions = await app.search_executor.run(
+        lambda: [
+            find_mentions(query, card_filter)
+            for query, card_filter in zip(request.queries, card_filters)
+        ]
+    )
+
+    # queries that only name cards are answered without the embedding model
+    search_idxs = [
+        idx
+        for idx, query_mentions in enumerate(mentions)
+        if not (query_mentions.name_only and query_mentions.card_names)
+    ]
+    query_embeddings = dict(
+        zip(
+            search_idxs,
+            await embed_queries([request.queries[idx].text for idx in search_idxs]),
         )
-    elif colors:
-        query["where"].append({f"color_identity_{colors[0]}": True})
-
-    # combining where statements
-    if len(query["where"]) > 1:
-        query["where"] = {"$and": query["where"]}
-    elif len(query["where"]) == 1:
-        query["where"] = query["where"][0]
-    else:
-        del query["where"]
-
-    print("query", query)
-    # query
-    cards_collection = app.db.get_collection(CollectionType.CARDS)
-    results = cards_collection.query(**query)
+    )
 
-    response = []
-    for distance, metadata in zip(results["distances"][0], results["metadatas"][0]):
-        if distance <= request.threshold:
-            response.append(
-                GetCardsResponse(
-                    card=app.card_name_2_card.get(metadata["name"], None),
-                    distance=distance,
-                )
-            )
+    # queries with the same filter share one multi query search
+    filter_2_query_idxs = defaultdict(list)
+    filter_2_card_filter = {}
+    for idx in search_idxs:
+        filter_key = card_filters[idx].model_dump_json()
+        filter_2_query_idxs[filter_key].append(idx)
+        filter_2_card_filter[filter_key] = card_filters[idx]
+
+    cursors = [get_cursor(query) for query in request.queries]
+
+    async def search(filter_key: str) -> list[SearchResult]:
+        query_idxs = filter_2_query_idxs[filter_key]
+        return await app.search_executor.run(
+            search_cards,
+            [query_embeddings[idx] for idx in query_idxs],
+            card_filter=filter_2_card_filter[filter_key],
+            n_results=max(
+                get_fetch_size(request.queries[idx], cursors[idx]) for idx in query_idxs
+            ),
+            threshold=max(request.queries[idx].threshold for idx in query_idxs),
+        )
 
-    return response
+    filter_keys = list(filter_2_query_idxs)
+    results = await asyncio.gather(*[search(filter_key) for filter_key in filter_keys])
 
+    idx_2_result = {}
+    for filter_key, result in zip(filter_keys, results):
+        idx_2_result.update(zip(filter_2_query_idxs[filter_key], result))
 
-@app.post("/rules", tags=["Rules"])
-async def get_rules(request: RulesRequest) -> list[GetRulesResponse]:
+    response = []
+    for idx, query in enumerate(request.queries):
+        distances, card_names = idx_2_result.get(idx, ([], []))
+        cards = create_cards_response(
+            distances, card_names, query, mentions[idx].card_names, cursor=cursors[idx]
+        )
+        fields = select_card_fields(query.fields, query.exclude)
+        response.append(project_cards(cards, fields))
+    return encode_response(response, accept)
+
+
+@app.post("/rules", tags=["Rules"], response_model=list[GetRulesResponse])
+async def get_rules(
+    request: RulesRequest, accept: Optional[str] = Header(default=None)
+) -> Response:
+
+    cursor = get_cursor(request)
+    generation = response_cache_generation()
+    cache_key = (normalize_query(request.text), request.k, request.threshold, cursor)
+    response = app.response_cache.get("rules", generation, cache_key)
+    if response is None:
+        response = await search_rules_request(request, cursor)
+        app.response_cache.put("rules", generation, cache_key, response)
+    return encode_response(
+        response,
+        accept,
+        streaming=True,
+        headers=create_page_headers(request, cursor, response),
+    )
 
-    query = {"query_texts": [request.text], "n_results": request.k}
-    documents_collection = app.db.get_collection(CollectionType.DOCUMENTS)
-    results = documents_collection.query(**query)
 
-    response = []
-    for distance, metadata in zip(results["distances"][0], results["metadatas"][0]):
-        if distance <= request.threshold:
-            response.append(
-                GetRulesResponse(
-                    document=app.document_name_2_document.get(metadata["name"], None),
-                    distance=distance,
-                )
+async def search_rules_request(
+    request: RulesRequest, cursor: Optional[Cursor] = None
+) -> list[dict]:
+    query_embeddings = await embed_queries([request.text])
+    n_results = get_fetch_size(request, cursor)
+    while True:
+        results = await app.search_executor.run(
+            app.db.query,
+            CollectionType.DOCUMENTS,
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+        )
+        distances = results["distances"][0]
+        response = create_rules_response(
+            distances, results["metadatas"][0], request, cursor=cursor
+        )
+        if not needs_more_results(request, response, distances, n_results):
+            return response
+        n_results = min(n_results * 2, config.get("max_fetch_size", 1000))
+
+
+@app.post("/rules/batch", tags=["Rules"])
+async def get_rules_batch(request: RulesBatchRequest) -> list[list[GetRulesResponse]]:
+    """Search rules for several queries with one embedding pass and one search"""
+    if not request.queries:
+        return []
+
+    cursors = [get_cursor(query) for query in request.queries]
+    query_embeddings = await embed_queries([query.text for query in request.queries])
+    results = await app.search_executor.run(
+        app.db.query,
+        CollectionType.DOCUMENTS,
+        query_embeddings=query_embeddings,
+        n_results=max(
+            get_fetch_size(query, cursor)
+            for query, cursor in zip(request.queries, cursors)
+        ),
+    )
+
+    return [
+        create_rules_response(
+            results["distances"][idx],
+            results["metadatas"][idx],
+            query,
+            cursor=cursors[idx],
+        )
+        for idx, query in enumerate(request.queries)
+    ]
+
+
+@app.post("/search", tags=["Search"], response_model=SearchResponse)
+async def search(
+    request: SearchRequest, accept: Optional[str] = Header(default=None)
+) -> Response:
+    """Search cards and rules with one embedding of the text"""
+
+    cards_request = CardsRequest(
+        text=request.text,
+        keywords=request.keywords,
+        color_identity=request.color_identity,
+        legality=request.legality,
+        k=request.k_cards,
+        threshold=request.threshold_cards,
+    )
+    rules_request = RulesRequest(
+        text=request.text, k=request.k_rules, threshold=request.threshold_rules
+    )
+    query_embeddings = await embed_queries([request.text])
+
+    # cards are needed for deckbuilding and rules questions, rules only for rules
+    intent = None
+    search_cards_collection, search_rules_collection = True, True
+    if request.route:
+        intent = await app.search_executor.run(
+            app.intent_router.classify, query_embeddings[0]
+        )
+        search_cards_collection = intent != Intent.CONVERSATION
+        search_rules_collection = intent in (Intent.RULES, None)
+
+    card_filter = resolve_cards_filter(cards_request)
+    mentions = await app.search_executor.run(find_mentions, cards_request, card_filter)
+
+    searches = []
+    if search_cards_collection:
+        searches.append(
+            app.search_executor.run(
+                search_cards,
+                query_embeddings,
+                card_filter=card_filter,
+                n_results=cards_request.k,
+            )
+        )
+    if search_rules_collection:
+        searches.append(
+            app.search_executor.run(
+                app.db.query,
+                CollectionType.DOCUMENTS,
+                query_embeddings=query_embeddings,
+                n_results=rules_request.k,
             )
+        )
+    results = iter(await asyncio.gather(*searches))
 
-    return response
+    cards, rules = [], []
+    if search_cards_collection:
+        distances, card_names = next(results)[0]
+        cards = create_cards_response(
+            distances, card_names, cards_request, mentions.card_names
+        )
+    if search_rules_collection:
+        rules_results = next(results)
+        rules = create_rules_response(
+            rules_results["distances"][0], rules_results["metadatas"][0], rules_request
+        )
+
+    return encode_response({"cards": cards, "rules": rules, "intent": intent}, accept)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,140 @@
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Generic, Hashable, Iterable, Iterator, NamedTuple, TypeVar
+
+from mtg.name_index import normalize_name
+
+T = TypeVar("T", bound=Hashable)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+ASCII_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9]+")
+
+
+class Token(NamedTuple):
+    key: str  # normalized token
+    start: int  # character offsets in the original text
+    end: int
+
+
+class Match(NamedTuple):
+    start: int  # token offsets
+    end: int
+    values: list
+
+
+@lru_cache(maxsize=65536)
+def normalize_token(token: str) -> list[str]:
+    return normalize_name(token).split()
+
+
+def tokenize(text: str) -> list[Token]:
+    """word tokens with their normalized key and position in the text"""
+    if text.isascii():
+        return [
+            Token(match.group().lower(), match.start(), match.end())
+            for match in ASCII_TOKEN_PATTERN.finditer(text)
+        ]
+
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text):
+        for key in normalize_token(match.group()):
+            tokens.append(Token(key, match.start(), match.end()))
+    return tokens
+
+
+class TokenAutomaton(Generic[T]):
+    """
+    Aho-Corasick automaton over normalized word tokens.
+
+    Working on tokens instead of characters keeps the automaton small for
+    tens of thousands of card names and only matches whole words.
+    A token that does not continue a pattern is retried without a trailing
+    "s", so plurals and possessives like "Falkenraths" still match.
+    """
+
+    def __init__(self, patterns: Iterable[tuple[str, T]] = ()):
+        self.goto: list[dict[str, int]] = [{}]
+        self.fail: list[int] = [0]
+        self.depth: list[int] = [0]
+        self.values: list[list[T]] = [[]]
+        # next state on the fail path with values
+        self.output: list[int] = [0]
+        for pattern, value in patterns:
+            self.add(pattern, value)
+        self.build()
+
+    def __len__(self) -> int:
+        return len(self.goto)
+
+    def add(self, pattern: str, value: T) -> None:
+        state = 0
+        for key in normalize_name(pattern).split():
+            next_state = self.goto[state].get(key)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.depth.append(self.depth[state] + 1)
+                self.values.append([])
+                self.output.append(0)
+                self.goto[state][key] = next_state
+            state = next_state
+        if state != 0 and value not in self.values[state]:
+            self.values[state].append(value)
+
+    def build(self) -> None:
+        """computes the fail links, has to be called after adding patterns"""
+        queue = deque(self.goto[0].values())
+        for state in queue:
+            self.fail[state] = 0
+        while queue:
+            state = queue.popleft()
+            for key, next_state in self.goto[state].items():
+                fail = self.fail[state]
+                while fail and key not in self.goto[fail]:
+                    fail = self.fail[fail]
+                fail = self.goto[fail].get(key, 0)
+                self.fail[next_state] = fail if fail != next_state else 0
+                self.output[next_state] = (
+                    fail if self.values[fail] else self.output[fail]
+                )
+                queue.append(next_state)
+
+    def _step(self, state: int, key: str) -> int:
+        goto = self.goto
+        while True:
+            next_state = goto[state].get(key)
+            if next_state is None and len(key) > 3 and key[-1] == "s":
+                next_state = goto[state].get(key[:-1])
+            if next_state is not None:
+                return next_state
+            if state == 0:
+                return 0
+            state = self.fail[state]
+
+    def iter_matches(self, tokens: list[Token]) -> Iterator[Match]:
+        """all pattern occurrences in the tokens, overlapping matches included"""
+        state = 0
+        values, output, depth = self.values, self.output, self.depth
+        for idx, token in enumerate(tokens):
+            state = self._step(state, token.key)
+            if state == 0:
+                continue
+            match_state = state if values[state] else output[state]
+            while match_state:
+                yield Match(idx + 1 - depth[match_state], idx + 1, values[match_state])
+                match_state = output[match_state]
+
+    def find_longest(self, tokens: list[Token]) -> list[Match]:
+        """non overlapping matches, preferring the leftmost and then the longest"""
+        matches = sorted(
+            self.iter_matches(tokens), key=lambda match: (match.start, -match.end)
+        )
+        selected = []
+        position = 0
+        for match in matches:
+            if match.start >= position:
+                selected.append(match)
+                position = match.end
+        return selected
@@ -0,0 +1,74 @@
+import bisect
+
+import numpy as np
+
+from mtg.name_index import normalize_name
+
+# suggestions where the name starts with the prefix rank above word matches
+NAME_START_BONUS = 1e9
+
+
+class PrefixIndex:
+    """
+    Card name suggestions for a typed prefix.
+
+    Every normalized card name is stored once from its start and once from
+    every later word, so "bolt" also suggests "Lightning Bolt". The keys are
+    kept in a sorted array, a prefix is answered with two binary searches and
+    a partial sort of the matching range by the precomputed score.
+    """
+
+    def __init__(self, summaries: list[dict]):
+        self.card_names: list[str] = []
+        entries = []
+        for summary in summaries:
+            row = len(self.card_names)
+            self.card_names.append(summary["name"])
+            price = summary.get("price") or 0.0
+            words = normalize_name(summary["name"]).split()
+            for idx in range(len(words)):
+                score = price + NAME_START_BONUS if idx == 0 else price
+                entries.append((" ".join(words[idx:]), row, score))
+        entries.sort(key=lambda entry: entry[0])
+
+        self.keys: list[str] = [key for key, _, _ in entries]
+        self.rows = np.array([row for _, row, _ in entries], dtype=np.int32)
+        self.scores = np.array([score for _, _, score in entries], dtype=np.float64)
+
+    def __repr__(self) -> str:
+        return f"PrefixIndex(cards:{len(self.card_names)}, keys:{len(self.keys)})"
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def complete(self, prefix: str, n: int = 10) -> list[str]:
+        """the n best card names starting with the prefix or with a word starting with it"""
+        prefix = normalize_name(prefix).strip()
+        if not prefix or n <= 0:
+            return []
+
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + "\uffff", lo=start)
+        if start == end:
+            return []
+
+        scores = self.scores[start:end]
+        # a name can match with several words, fetch more candidates until
+        # there are n different names or all matches are taken
+        n_candidates = min(n * 2, len(scores))
+        while True:
+            best = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+            best = best[np.argsort(-scores[best], kind="stable")]
+
+            card_names = []
+            seen = set()
+            for idx in best:
+                card_name = self.card_names[self.rows[start + idx]]
+                if card_name not in seen:
+                    seen.add(card_name)
+                    card_names.append(card_name)
+                    if len(card_names) == n:
+                        return card_names
+            if n_candidates == len(scores):
+                return card_names
+            n_candidates = min(n_candidates * 2, len(scores))
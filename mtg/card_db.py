@@ -0,0 +1,83 @@
+import logging
+from pathlib import Path
+from typing import Optional
+from collections.abc import Mapping
+
+from mtg.objects import Card
+from mtg.name_index import CardNameIndex
+from mtg.filter_index import CardFilterIndex
+from mtg.filter_resolver import FilterResolver
+from mtg.url_parsing import CardLinker
+from mtg.mentions import MentionDetector, create_name_automaton
+from mtg.autocomplete import PrefixIndex
+from mtg.serialization import CardEncoder
+from mtg.card_snapshot import (
+    CardSnapshot,
+    summarize_card,
+    load_cards_from_folder,
+)
+
+
+class CardDB:
+    """In memory card data of the service, loaded from a snapshot or the cards folder."""
+
+    def __init__(self, card_name_2_card: Mapping[str, Card], summaries: list[dict]):
+        self.card_name_2_card = card_name_2_card
+        self.summaries = summaries
+        self.all_card_names = list(card_name_2_card)
+        self.name_index = CardNameIndex(self.all_card_names)
+        name_automaton = create_name_automaton(summaries)
+        self.card_linker = CardLinker(
+            card_name_2_card, name_index=self.name_index, automaton=name_automaton
+        )
+        self.filter_index = CardFilterIndex(summaries)
+        self.mention_detector = MentionDetector(summaries, automaton=name_automaton)
+        self.prefix_index = PrefixIndex(summaries)
+        self.card_encoder = CardEncoder(self.load_card_json)
+
+        all_keywords, all_legalities = set(), set()
+        for summary in summaries:
+            all_keywords.update(summary["keywords"])
+            all_legalities.update(summary["legalities"])
+        self.all_keywords = list(all_keywords)
+        self.all_legalities = list(all_legalities)
+        self.filter_resolver = FilterResolver(self.all_keywords, self.all_legalities)
+
+    def __repr__(self) -> str:
+        return f"CardDB(cards:{len(self.all_card_names)})"
+
+    def __len__(self) -> int:
+        return len(self.all_card_names)
+
+    def load_card_json(self, card_name: str) -> bytes:
+        """json of a card, read directly from the snapshot if there is one"""
+        if isinstance(self.card_name_2_card, CardSnapshot):
+            return self.card_name_2_card.card_json(card_name)
+        return self.card_name_2_card[card_name].model_dump_json().encode()
+
+    @classmethod
+    def from_snapshot(cls, snapshot_file: Path) -> "CardDB":
+        snapshot = CardSnapshot(snapshot_file)
+        return cls(card_name_2_card=snapshot, summaries=snapshot.entries)
+
+    @classmethod
+    def from_folder(cls, cards_folder: Path) -> "CardDB":
+        cards = load_cards_from_folder(cards_folder)
+        card_name_2_card = {card.name: card for card in cards}
+        return cls(
+            card_name_2_card=card_name_2_card,
+            summaries=[summarize_card(card) for card in card_name_2_card.values()],
+        )
+
+    @classmethod
+    def load(cls, cards_folder: Path, snapshot_file: Optional[Path] = None) -> "CardDB":
+        """loads the snapshot if it exists and is valid, otherwise falls back to the cards folder"""
+        if snapshot_file is not None and Path(snapshot_file).is_file():
+            logging.info(f"loading cards from snapshot {snapshot_file}")
+            try:
+                return cls.from_snapshot(snapshot_file)
+            except ValueError as error:
+                # e.g. a snapshot of an older version, rewritten by the next card update
+                logging.warning(f"ignoring card snapshot: {error}")
+        logging.info(f"no card snapshot found, loading cards from {cards_folder}")
+        return cls.from_folder(cards_folder)
@@ -0,0 +1,170 @@
+import os
+import json
+import mmap
+import zlib
+import struct
+import logging
+import threading
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from mtg.objects import Card
+
+
+# file layout:
+#   header: magic (8 bytes) | index offset (uint64) | index length (uint64)
+#   data:   one zlib compressed card json blob per card
+#   index:  zlib compressed json with the offset, length and summary of every card
+MAGIC = b"MTGSNAP1"
+HEADER = struct.Struct("<8sQQ")
+# bump whenever the layout or the fields of summarize_card change
+SNAPSHOT_VERSION = 2
+
+
+def summarize_card(card: Card) -> dict:
+    """the fields that are needed for building indexes without parsing the full card"""
+    return {
+        "name": card.name,
+        "id": card.id,
+        "price": card.price,
+        "legendary": "Legendary" in card.type,
+        "color_identity": card.color_identity,
+        "keywords": card.keywords,
+        "legalities": [
+            legality
+            for legality, status in card.legalities.items()
+            if status == "legal"
+        ],
+    }
+
+
+def write_card_snapshot(cards: Iterable[Card], snapshot_file: Path) -> int:
+    """
+    Writes all cards into a single packed snapshot file.
+
+    The file is written to a temporary path first and then moved into place,
+    so running services that have the old snapshot mapped keep a consistent view.
+
+    Returns:
+        int: number of cards in the snapshot.
+    """
+    snapshot_file = Path(snapshot_file)
+    snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = snapshot_file.with_name(f"{snapshot_file.name}.{os.getpid()}.tmp")
+
+    entries = []
+    with tmp_file.open("wb") as outfile:
+        outfile.write(HEADER.pack(MAGIC, 0, 0))
+        for card in cards:
+            blob = zlib.compress(card.model_dump_json().encode("utf-8"))
+            entry = summarize_card(card)
+            entry["offset"] = outfile.tell()
+            entry["length"] = len(blob)
+            entries.append(entry)
+            outfile.write(blob)
+
+        index = zlib.compress(
+            json.dumps(
+                {"version": SNAPSHOT_VERSION, "cards": entries}, ensure_ascii=False
+            ).encode("utf-8")
+        )
+        index_offset = outfile.tell()
+        outfile.write(index)
+        outfile.seek(0)
+        outfile.write(HEADER.pack(MAGIC, index_offset, len(index)))
+        outfile.flush()
+        os.fsync(outfile.fileno())
+
+    os.replace(tmp_file, snapshot_file)
+    logging.info(f"wrote snapshot with {len(entries)} cards to {snapshot_file}")
+    return len(entries)
+
+
+class CardSnapshot(Mapping):
+    """
+    Read only mapping of card name to Card backed by a memory mapped snapshot file.
+
+    Only the index is parsed on open, Card objects are created on first access
+    and the most recently used maxsize of them are kept.
+    """
+
+    def __init__(self, snapshot_file: Path, maxsize: int = 4096):
+        self.snapshot_file = Path(snapshot_file)
+        self.maxsize = maxsize
+        with self.snapshot_file.open("rb") as infile:
+            self._mmap = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, index_offset, index_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"not a card snapshot file: {self.snapshot_file}")
+
+        index = json.loads(
+            zlib.decompress(self._mmap[index_offset : index_offset + index_length])
+        )
+        if index["version"] != SNAPSHOT_VERSION:
+            raise ValueError(
+                f"unsupported snapshot version {index['version']}: {self.snapshot_file}"
+            )
+
+        self.entries: list[dict] = index["cards"]
+        self._name_2_entry = {entry["name"]: entry for entry in self.entries}
+        self._name_2_card: OrderedDict[str, Card] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"CardSnapshot({self.snapshot_file}, cards:{len(self)})"
+
+    def __getitem__(self, card_name: str) -> Card:
+        with self._lock:
+            card = self._name_2_card.get(card_name)
+            if card is not None:
+                self._name_2_card.move_to_end(card_name)
+                return card
+        card = Card.model_validate_json(self.card_json(card_name))
+        with self._lock:
+            self._name_2_card[card_name] = card
+            while len(self._name_2_card) > self.maxsize:
+                self._name_2_card.popitem(last=False)
+        return card
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._name_2_entry)
+
+    def __len__(self) -> int:
+        return len(self._name_2_entry)
+
+    def __contains__(self, card_name) -> bool:
+        return card_name in self._name_2_entry
+
+    def card_json(self, card_name: str) -> bytes:
+        """raw json of a card as written by the etl"""
+        entry = self._name_2_entry[card_name]
+        offset = entry["offset"]
+        return zlib.decompress(self._mmap[offset : offset + entry["length"]])
+
+    def close(self) -> None:
+        self._mmap.close()
+
+
+def load_cards_from_folder(cards_folder: Path) -> list[Card]:
+    """loads cards from the legacy format with one json file per card"""
+    cards = []
+    for file in Path(cards_folder).iterdir():
+        if file.suffix != ".json":
+            continue
+        with file.open("r", encoding="utf-8") as infile:
+            cards.append(Card(**json.load(infile)))
+    return cards
+
+
+if __name__ == "__main__":
+    # migrate an existing cards folder to a snapshot
+    from mtg.util import load_config
+
+    config = load_config(Path("configs/config.yaml"))
+    cards_folder = Path(config.get("cards_folder"))
+    snapshot_file: Optional[str] = config.get("card_snapshot_file")
+
+    write_card_snapshot(load_cards_from_folder(cards_folder), Path(snapshot_file))
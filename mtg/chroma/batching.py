@@ -0,0 +1,115 @@
+import time
+import asyncio
+from typing import Callable, Optional
+
+from chromadb.api.types import Embeddings
+
+from mtg.executor import SearchExecutor
+
+
+class EmbeddingBatcher:
+    """
+    Collects query texts of concurrent requests and embeds them in one forward pass.
+
+    A batch is sent to the model once max_batch_size texts are waiting or
+    max_wait_ms after the first text arrived, whichever comes first.
+    The batcher lives on the event loop, the model runs in the search executor.
+    """
+
+    def __init__(
+        self,
+        embed_function: Callable[[list[str]], Embeddings],
+        executor: SearchExecutor,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+    ):
+        self.embed_function = embed_function
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._pending: list[tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # the loop only keeps weak references to tasks
+        self._tasks: set[asyncio.Task] = set()
+
+        # metrics
+        self.batches = 0
+        self.items = 0
+        self.max_observed_batch_size = 0
+        self.total_queue_delay_ms = 0.0
+        self.max_queue_delay_ms = 0.0
+
+    def __repr__(self) -> str:
+        return f"EmbeddingBatcher(max_batch_size:{self.max_batch_size}, max_wait_ms:{self.max_wait_ms})"
+
+    async def embed(self, text: str) -> list[float]:
+        embeddings = await self.embed_many([text])
+        return embeddings[0]
+
+    async def embed_many(self, texts: list[str]) -> Embeddings:
+        """queues the texts and waits until their batch is embedded"""
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._pending.append((text, future, time.perf_counter()))
+            futures.append(future)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            mini_batch = self._pending[: self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size :]
+            task = asyncio.ensure_future(self._run_batch(mini_batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, mini_batch: list[tuple[str, asyncio.Future, float]]):
+        started = time.perf_counter()
+        delays = [(started - queued) * 1000 for _, _, queued in mini_batch]
+        self.batches += 1
+        self.items += len(mini_batch)
+        self.max_observed_batch_size = max(
+            self.max_observed_batch_size, len(mini_batch)
+        )
+        self.total_queue_delay_ms += sum(delays)
+        self.max_queue_delay_ms = max(self.max_queue_delay_ms, max(delays))
+
+        try:
+            embeddings = await self.executor.run(
+                self.embed_function, [text for text, _, _ in mini_batch]
+            )
+        except Exception as e:
+            for _, future, _ in mini_batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), embedding in zip(mini_batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_observed_batch_size": self.max_observed_batch_size,
+            "mean_queue_delay_ms": (
+                self.total_queue_delay_ms / self.items if self.items else 0.0
+            ),
+            "max_queue_delay_ms": self.max_queue_delay_ms,
+        }
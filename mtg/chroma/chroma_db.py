@@ -1,15 +1,35 @@
+import re
+import uuid
+import fcntl
 import logging
 import time
+import threading
 from enum import Enum
-from typing import List
+from pathlib import Path
+from typing import Iterator, List, Optional
 from functools import cache
+from contextlib import contextmanager
 
-from chromadb import PersistentClient
-from chromadb.utils import embedding_functions
+from chromadb import Settings
+from chromadb.api.client import Client
+from chromadb.api import ClientAPI, ServerAPI
+from chromadb.config import System
+from chromadb.telemetry.product import ProductTelemetryClient
 from chromadb.api.models.Collection import Collection
+from chromadb.api.types import Embedding, Embeddings, QueryResult
+from chromadb.errors import InvalidCollectionException
 
 from .document import ChromaDocument
 from .config import ChromaConfig
+from .embedding import CachedEmbeddingFunction, EmbeddingProvider
+
+
+# collection metadata maps the configured collection names to versioned collections
+ALIASES_COLLECTION = "collection_aliases"
+# serializes alias changes of all processes
+ALIASES_LOCK_FILE = "aliases.lock"
+# rewritten in the chroma folder after a completed update, see ChromaDB.publish
+GENERATION_FILE = "generation"
 
 
 class CollectionType(Enum):
@@ -17,6 +37,32 @@ class CollectionType(Enum):
     CARDS = "Cards"
 
 
+class Connection:
+    """
+    A chroma client on its own system and the collection handles it opened.
+
+    Leases count the calls that use the handles, a retired connection stops
+    its system once the last lease is released.
+    """
+
+    def __init__(self, host: str):
+        settings = Settings()
+        settings.persist_directory = host
+        settings.is_persistent = True
+        self.system = System(settings)
+        self.system.instance(ProductTelemetryClient)
+        self.system.instance(ServerAPI)
+        self.system.start()
+        self.client = Client.from_system(self.system)
+        # collection type to the collection handle of this client
+        self.collections = {}
+        self.leases = 0
+        self.retired = False
+
+    def __repr__(self) -> str:
+        return f"Connection(leases:{self.leases}, retired:{self.retired})"
+
+
 class ChromaDB:
 
     def __init__(self, config: ChromaConfig):
@@ -24,16 +70,88 @@ class ChromaDB:
         self.port = config.port
         self.embedding_model = config.embedding_model
         self.embedding_device = config.embedding_device
+        self.embedding_provider = EmbeddingProvider(
+            self.embedding_model, device=self.embedding_device
+        )
+        self.embedding_function = CachedEmbeddingFunction(
+            self.embedding_provider, maxsize=config.embedding_cache_size
+        )
         self.collection_2_name = {
             CollectionType.DOCUMENTS: config.collection_name_documents,
             CollectionType.CARDS: config.collection_name_cards,
         }
-        self.collection_type_2_collection = {}
-        self.client = PersistentClient(self.host)
+        self._connection = Connection(self.host)
+        self._lock = threading.Lock()
+        # bumped on every write, cached search results of older generations are stale
+        self.generation = 0
 
     def __repr__(self):
         return f"ChromaDB(host:{self.host}, model:{self.embedding_model})"
 
+    @property
+    def client(self) -> ClientAPI:
+        return self._connection.client
+
+    @property
+    def collection_type_2_collection(self) -> dict:
+        return self._connection.collections
+
+    def reconnect(self) -> None:
+        """
+        Opens the persisted collections again to see writes of other processes.
+
+        The new client runs on a new system that loads the collections from
+        disk, the client and its collection handles are replaced together.
+        Calls that hold a lease on the old connection finish on it, its system
+        is stopped once the last of them is done, see use_collection.
+        """
+        connection = Connection(self.host)
+        with self._lock:
+            retired, self._connection = self._connection, connection
+            retired.retired = True
+            self.generation += 1
+        self._release(retired, leases=0)
+        logging.info(f"reconnected to {self.host}")
+
+    def _release(self, connection: Connection, leases: int = 1) -> None:
+        with self._lock:
+            connection.leases -= leases
+            stop = connection.retired and connection.leases == 0
+        if stop:
+            connection.system.stop()
+            logging.info(f"stopped the replaced chroma system of {self.host}")
+
+    @contextmanager
+    def use_collection(self, collection_type: CollectionType) -> Iterator[Collection]:
+        """
+        The collection handle for the duration of a call.
+
+        The system of the handle is not stopped by a reconnect until the
+        call is done, handles of get_collection are meant for scripts that
+        do not reconnect.
+        """
+        with self._lock:
+            connection = self._connection
+            connection.leases += 1
+        try:
+            yield self._get_collection(collection_type, connection)
+        finally:
+            self._release(connection)
+
+    def publish(self) -> None:
+        """tells other processes that the collections changed, called after a completed update"""
+        path = Path(self.host) / GENERATION_FILE
+        tmp_file = path.with_name(f"{path.name}.tmp")
+        tmp_file.write_text(uuid.uuid4().hex, encoding="utf-8")
+        tmp_file.replace(path)
+
+    def published_generation(self) -> Optional[str]:
+        """the generation of the last completed update, None if nothing was published"""
+        try:
+            return (Path(self.host) / GENERATION_FILE).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
     def get_collection(self, collection_type: CollectionType) -> Collection:
         """
         Retrieves or creates a ChromaDB collection.
@@ -43,28 +161,32 @@ class ChromaDB:
         Raises:
             Exception: If there's an error creating or retrieving the collection.
         """
+        return self._get_collection(collection_type, self._connection)
+
+    def _get_collection(
+        self, collection_type: CollectionType, connection: Connection
+    ) -> Collection:
         if not isinstance(collection_type, CollectionType):
             collection_type = CollectionType(collection_type)
 
         try:
-            # Create embedding function
-            collection = self.collection_type_2_collection.get(collection_type)
+            # a handle is only cached with the client it belongs to
+            collection = connection.collections.get(collection_type)
             if collection is not None:
                 return collection
 
-            ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-                self.embedding_model,
-                device=self.embedding_device,
-            )
-
-            # Get or create collection
-            collection_name = self.collection_2_name.get(collection_type)
-            collection = self.client.get_or_create_collection(
-                name=collection_name,
-                embedding_function=ef,
-                metadata={"hnsw:space": "cosine"},
-            )
-            self.collection_type_2_collection[collection_type] = collection
+            collection_name = self.get_physical_name(collection_type)
+            if collection_name == self.collection_2_name[collection_type]:
+                # Get or create collection
+                collection = self._get_or_create_collection(
+                    collection_name, client=connection.client
+                )
+            else:
+                # a missing version is an error, not a new empty collection
+                collection = connection.client.get_collection(
+                    collection_name, embedding_function=self.embedding_function
+                )
+            connection.collections[collection_type] = collection
 
             logging.info(
                 f"Successfully created collection {collection_name} with {collection.count()} documents"
@@ -76,6 +198,258 @@ class ChromaDB:
             logging.error(e, exc_info=True)
             raise
 
+    def _get_or_create_collection(
+        self, collection_name: str, client: Optional[ClientAPI] = None
+    ) -> Collection:
+        client = client if client is not None else self.client
+        return client.get_or_create_collection(
+            name=collection_name,
+            embedding_function=self.embedding_function,
+            metadata={"hnsw:space": "cosine"},
+        )
+
+    def _get_aliases(self) -> dict:
+        # read from the database every time, other processes may flip aliases
+        try:
+            aliases = self.client.get_collection(
+                ALIASES_COLLECTION, embedding_function=None
+            )
+        except (ValueError, InvalidCollectionException):
+            # no collection was rebuilt yet, reads do not create it
+            return {}
+        return dict(aliases.metadata or {})
+
+    def _set_alias(self, name: str, physical_name: str) -> None:
+        # rebuilds of other processes write the aliases too, e.g. the card
+        # update job and create_rules_db
+        with (Path(self.host) / ALIASES_LOCK_FILE).open("a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            aliases = self.client.get_or_create_collection(
+                ALIASES_COLLECTION, embedding_function=None
+            )
+            # modify replaces the whole metadata
+            metadata = {**(aliases.metadata or {}), name: physical_name}
+            aliases.modify(metadata=metadata)
+
+    def get_physical_name(self, collection_type: CollectionType) -> str:
+        """the versioned collection behind the collection type, the configured name if it has no alias"""
+        name = self.collection_2_name[collection_type]
+        return self._get_aliases().get(name, name)
+
+    def _get_versions(self, name: str) -> dict[str, int]:
+        """physical collection name to version, the unversioned collection is version 0"""
+        pattern = re.compile(rf"{re.escape(name)}_v(\d+)")
+        versions = {}
+        for collection in self.client.list_collections():
+            collection_name = getattr(collection, "name", collection)
+            if collection_name == name:
+                versions[collection_name] = 0
+            elif match := pattern.fullmatch(collection_name):
+                versions[collection_name] = int(match.group(1))
+        return versions
+
+    def rebuild_collection(
+        self,
+        collection_type: CollectionType,
+        documents: List[ChromaDocument],
+        smoke_query: Optional[str] = None,
+        batch_size: int = 100,
+        keep_versions: int = 0,
+    ) -> str:
+        """
+        Rebuilds a collection from scratch without downtime.
+
+        The documents are written to a new versioned shadow collection while
+        queries keep using the current one. The shadow collection is validated
+        by its count and a smoke query, then the alias of the collection type
+        is flipped to it and the old versions are deleted.
+
+        Args:
+            collection_type (CollectionType): The collection to be rebuilt.
+            documents (List[ChromaDocument]): All documents of the new collection.
+            smoke_query (str, optional): Query that has to return a result from the new collection.
+            batch_size (int): Number of documents embedded at once.
+            keep_versions (int): Number of previous versions that are kept, e.g. for other processes that still read them.
+
+        Returns:
+            str: Name of the new collection.
+
+        Raises:
+            ValueError: If the new collection fails validation, the alias is not changed.
+        """
+        name = self.collection_2_name[collection_type]
+        version = max(self._get_versions(name).values(), default=0) + 1
+        shadow_name = f"{name}_v{version}"
+        shadow = self._get_or_create_collection(shadow_name)
+        logging.info(f"rebuilding {name} in {shadow_name}")
+
+        try:
+            for idx in range(0, len(documents), batch_size):
+                mini_batch = documents[idx : idx + batch_size]
+                shadow.upsert(
+                    ids=[document.id for document in mini_batch],
+                    documents=[document.document for document in mini_batch],
+                    metadatas=[document.metadata for document in mini_batch],
+                )
+            self._validate_collection(
+                shadow,
+                num_documents=len({document.id for document in documents}),
+                smoke_query=smoke_query,
+            )
+        except Exception:
+            logging.exception(f"rebuild of {name} failed, keeping the current version")
+            self.client.delete_collection(shadow_name)
+            raise
+
+        self._set_alias(name, shadow_name)
+        self.collection_type_2_collection[collection_type] = shadow
+        self.generation += 1
+        logging.info(f"switched {name} to {shadow_name}")
+
+        self.delete_old_versions(collection_type, keep_versions=keep_versions)
+        return shadow_name
+
+    def _validate_collection(
+        self, collection: Collection, num_documents: int, smoke_query: Optional[str]
+    ) -> None:
+        count = collection.count()
+        if count != num_documents:
+            raise ValueError(
+                f"{collection.name} has {count} documents, expected {num_documents}"
+            )
+        if smoke_query is not None:
+            results = collection.query(
+                query_embeddings=self.embedding_function.embed_queries([smoke_query]),
+                n_results=1,
+            )
+            if not results["ids"][0]:
+                raise ValueError(f"{collection.name} has no result for {smoke_query}")
+
+    def delete_old_versions(
+        self, collection_type: CollectionType, keep_versions: int = 0
+    ) -> list[str]:
+        """
+        Deletes the versions of a collection that the alias does not point to.
+
+        Returns:
+            list[str]: Names of the deleted collections.
+        """
+        name = self.collection_2_name[collection_type]
+        current = self.get_physical_name(collection_type)
+        versions = self._get_versions(name)
+        current_version = versions.get(current, 0)
+        previous = sorted(
+            (version, collection_name)
+            for collection_name, version in versions.items()
+            if version < current_version
+        )
+        kept = {
+            collection_name
+            for _, collection_name in (
+                previous[-keep_versions:] if keep_versions else []
+            )
+        }
+
+        deleted = []
+        for collection_name in versions:
+            if collection_name != current and collection_name not in kept:
+                self.client.delete_collection(collection_name)
+                deleted.append(collection_name)
+        if deleted:
+            logging.info(f"deleted old versions {deleted}")
+        return deleted
+
+    def query(
+        self,
+        collection_type: CollectionType,
+        query_texts: Optional[List[str]] = None,
+        query_embeddings: Optional[Embeddings] = None,
+        **kwargs,
+    ) -> QueryResult:
+        """
+        Queries a collection by embedding, query embeddings are served from the cache if possible.
+
+        Args:
+            collection_type (CollectionType): The collection to be queried.
+            query_texts (List[str]): The texts to search for, embedded if no query_embeddings are given.
+            query_embeddings (Embeddings): Precomputed embeddings of the texts.
+            **kwargs: Passed on to Collection.query, e.g. n_results or where.
+        """
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function.embed_queries(query_texts)
+        with self.use_collection(collection_type) as collection:
+            return collection.query(query_embeddings=query_embeddings, **kwargs)
+
+    def get_embeddings(
+        self, collection_type: CollectionType, names: List[str], batch_size: int = 500
+    ) -> dict[str, Embedding]:
+        """
+        Retrieves the stored embeddings of documents by their name metadata.
+
+        Returns:
+            dict[str, Embedding]: name to embedding, missing names are left out.
+        """
+        name_2_embedding = {}
+        with self.use_collection(collection_type) as collection:
+            for idx in range(0, len(names), batch_size):
+                results = collection.get(
+                    where={"name": {"$in": names[idx : idx + batch_size]}},
+                    include=["embeddings", "metadatas"],
+                )
+                for metadata, embedding in zip(
+                    results["metadatas"], results["embeddings"]
+                ):
+                    name_2_embedding[metadata["name"]] = embedding
+        return name_2_embedding
+
+    def get_metadatas(
+        self, collection_type: CollectionType, batch_size: int = 5000
+    ) -> dict[str, dict]:
+        """
+        Retrieves the metadata of every document without its text and embedding.
+
+        Returns:
+            dict[str, dict]: id to metadata.
+        """
+        id_2_metadata = {}
+        with self.use_collection(collection_type) as collection:
+            for offset in range(0, collection.count(), batch_size):
+                results = collection.get(
+                    include=["metadatas"], limit=batch_size, offset=offset
+                )
+                id_2_metadata.update(zip(results["ids"], results["metadatas"]))
+        return id_2_metadata
+
+    def get_by_ids(
+        self,
+        collection_type: CollectionType,
+        ids: List[str],
+        include: List[str],
+        batch_size: int = 500,
+    ) -> dict[str, dict]:
+        """
+        Retrieves the included fields of documents by id.
+
+        Returns:
+            dict[str, dict]: id to the included fields, e.g. {"documents": ..., "embeddings": ...}.
+        """
+        id_2_fields = {}
+        with self.use_collection(collection_type) as collection:
+            for idx in range(0, len(ids), batch_size):
+                results = collection.get(
+                    ids=ids[idx : idx + batch_size], include=include
+                )
+                for row, document_id in enumerate(results["ids"]):
+                    id_2_fields[document_id] = {
+                        field: results[field][row] for field in include
+                    }
+        return id_2_fields
+
+    @property
+    def is_ready(self) -> bool:
+        """True once the embedding model is loaded"""
+        return self.embedding_provider.is_ready
+
     def update_last_successful_load(self, collection) -> None:
         """
         Updates the last successful load timestamp within the collection metadata.
@@ -99,7 +473,10 @@ class ChromaDB:
             raise
 
     def upsert_documents_to_collection(
-        self, documents: List[ChromaDocument], collection_type: CollectionType
+        self,
+        documents: List[ChromaDocument],
+        collection_type: CollectionType,
+        embeddings: Optional[Embeddings] = None,
     ) -> None:
         """
         Upserts documents into the ChromaDB collection.
@@ -107,6 +484,7 @@ class ChromaDB:
         Args:
             documents (List[ChromaDocument]): List of documents to be upserted.
             collection (Collection): The target ChromaDB collection.
+            embeddings (Embeddings, optional): Stored embeddings of the documents, embedded if not given.
 
         Raises:
             Exception: If there's an error during the upsertion process.
@@ -121,7 +499,9 @@ class ChromaDB:
                 ids=ids,
                 documents=[document.document for document in documents],
                 metadatas=[document.metadata for document in documents],
+                embeddings=embeddings,
             )
+            self.generation += 1
 
             logging.info(
                 f"Successfully upserted {len(ids)} documents to the collection: {collection.name}."
@@ -136,6 +516,32 @@ class ChromaDB:
             )
             raise
 
+    def update_metadatas(
+        self, documents: List[ChromaDocument], collection_type: CollectionType
+    ) -> None:
+        """
+        Replaces the metadata of documents without embedding them again.
+
+        Args:
+            documents (List[ChromaDocument]): Documents with the new metadata.
+            collection_type (CollectionType): The target collection.
+        """
+        collection = self.get_collection(collection_type)
+        try:
+            collection.update(
+                ids=[document.id for document in documents],
+                metadatas=[document.metadata for document in documents],
+            )
+            self.generation += 1
+            logging.info(
+                f"Successfully updated the metadata of {len(documents)} documents in the collection: {collection.name}."
+            )
+        except Exception as e:
+            logging.exception(
+                f"Error updating metadata in the collection: {collection.name}."
+            )
+            raise
+
     def delete_documents_from_collection(
         self, collection_type: CollectionType, ids: List[str] = []
     ) -> None:
@@ -152,6 +558,7 @@ class ChromaDB:
         collection = self.get_collection(collection_type)
         try:
             collection.delete(ids=ids)
+            self.generation += 1
             logging.info(
                 f"Successfully deleted {len(ids)} documents from the collection: {collection.name}."
             )
@@ -163,6 +570,8 @@ class ChromaDB:
 
     def delete_collection(self, collection_type: CollectionType):
 
-        collection_name = self.collection_2_name.get(collection_type)
+        collection_name = self.get_physical_name(collection_type)
         result = self.client.delete_collection(collection_name)
+        self.collection_type_2_collection.pop(collection_type, None)
+        self.generation += 1
         return result
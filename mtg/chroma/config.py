@@ -12,6 +12,7 @@ class ChromaConfig(BaseModel):
     port: int = Field(default=8000)
     embedding_model: str = Field(default="thenlper/gte-large")
     embedding_device: Literal["cpu", "gpu"] = Field(default="cpu")
+    embedding_cache_size: int = Field(default=1024)
     collection_name_documents: str = Field(default="documents")
     collection_name_cards: str = Field(default="cards")
 
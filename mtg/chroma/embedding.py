@@ -0,0 +1,140 @@
+import logging
+import threading
+from typing import Optional
+from collections import OrderedDict
+
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils import embedding_functions
+
+
+def normalize_query(text: str) -> str:
+    """collapses whitespace so trivially different queries share a cache entry"""
+    return " ".join(text.split())
+
+
+class EmbeddingProvider(EmbeddingFunction[Documents]):
+    """
+    Process wide sentence transformer shared by all collections.
+
+    The model is loaded on first use, is_ready tells whether it is loaded.
+    """
+
+    def __init__(self, model_name: str, device: str = "cpu"):
+        self.model_name = model_name
+        self.device = device
+        self._embedding_function = None
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"EmbeddingProvider({self.model_name}, ready:{self.is_ready})"
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self.load()(input)
+
+    @property
+    def is_ready(self) -> bool:
+        return self._embedding_function is not None
+
+    def load(self) -> EmbeddingFunction:
+        if self._embedding_function is None:
+            with self._lock:
+                if self._embedding_function is None:
+                    logging.info(f"loading embedding model {self.model_name}")
+                    self._embedding_function = (
+                        embedding_functions.SentenceTransformerEmbeddingFunction(
+                            self.model_name,
+                            device=self.device,
+                        )
+                    )
+        return self._embedding_function
+
+    def warm_up(self) -> None:
+        """loads the model and runs a first inference, so the first request is not slowed down"""
+        self.load()(["warm up"])
+
+
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """
+    Wraps an embedding function with a size bounded LRU cache for query embeddings.
+
+    Chroma calls the function directly when documents are upserted, these calls
+    are passed through so documents do not evict cached queries.
+    """
+
+    def __init__(self, embedding_function: EmbeddingFunction, maxsize: int = 1024):
+        self.embedding_function = embedding_function
+        self.maxsize = maxsize
+        self._cache: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self.embedding_function(input)
+
+    def get_cached(self, texts: list[str]) -> list[Optional[list[float]]]:
+        """cached embeddings of the texts, None for texts that are not cached"""
+        embeddings = []
+        with self._lock:
+            for text in texts:
+                key = normalize_query(text)
+                embedding = self._cache.get(key)
+                if embedding is not None:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                embeddings.append(embedding)
+        return embeddings
+
+    def embed_queries(self, texts: list[str]) -> Embeddings:
+        """
+        Embeds the query texts, only texts that are not cached are passed to the model.
+
+        Returns:
+            Embeddings: one embedding per text in the same order.
+        """
+        keys = [normalize_query(text) for text in texts]
+        embeddings = [None] * len(keys)
+        missing_keys = {}
+
+        with self._lock:
+            for idx, key in enumerate(keys):
+                embedding = self._cache.get(key)
+                if embedding is not None:
+                    self._cache.move_to_end(key)
+                    embeddings[idx] = embedding
+                    self.hits += 1
+                elif key in missing_keys:
+                    # duplicates within the batch share one embedding
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    missing_keys[key] = None
+
+        if missing_keys:
+            key_2_embedding = dict(
+                zip(missing_keys, self.embedding_function(list(missing_keys)))
+            )
+            with self._lock:
+                for key, embedding in key_2_embedding.items():
+                    self._cache[key] = embedding
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.maxsize:
+                    self._cache.popitem(last=False)
+                    self.evictions += 1
+            for idx, key in enumerate(keys):
+                if embeddings[idx] is None:
+                    embeddings[idx] = key_2_embedding[key]
+
+        return embeddings
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / requests if requests else 0.0,
+        }
@@ -1,15 +1,29 @@
 # %%
 import os
-import requests
 import json
-from uuid import uuid4
 from tqdm import tqdm
 from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
 from datetime import datetime
 
 from mtg.util import load_config
 from mtg.logging import get_logger
 from mtg.objects import Card, Document
+from mtg.card_snapshot import write_card_snapshot
+from mtg.etl.delta import (
+    CONTENT_HASH,
+    add_missing_content_hashes,
+    apply_delta_plan,
+    content_hash,
+    create_delta_plan,
+)
+from mtg.etl.scryfall import (
+    BulkDataState,
+    JsonArrayWriter,
+    RulingsIndex,
+    get_bulk_data_info,
+    stream_bulk_data,
+)
 
 # from mtg.etl.cards.categorizer import create_categorizer
 from mtg.chroma import ChromaDocument
@@ -33,65 +47,64 @@ NORMAL_CARD_TYPES = [
     "normal",
 ]
 DOUBLE_FACED = ["transform", "card_faces", "flip", "split"]
+SCRYFALL_BULK_DATA_URL = "https://api.scryfall.com/bulk-data"
+BULK_DATA_TYPES = ["oracle_cards", "rulings"]
 
 logger = get_logger()
 
 
-def batch(iterable, batch_size=1):
-    length = len(iterable)
-    for idx in range(0, length, batch_size):
-        yield iterable[idx : min(idx + batch_size, length)]
+def is_supported_card(card_data: dict) -> bool:
+    return (card_data.get("type_line") not in BLOCKED_CARD_TYPES) and (
+        (card_data.get("layout") in NORMAL_CARD_TYPES)
+        or (card_data.get("layout") in DOUBLE_FACED)
+    )
 
 
 def download_card_data(
-    lookup_url: str = "https://api.scryfall.com/bulk-data",
-) -> list[dict]:
-
-    # download info
-    bulk_requests_info = requests.get(lookup_url)
-    bulk_requests_info = bulk_requests_info.json()
-
-    # download cards data
-    oracl_card_info = [
-        info for info in bulk_requests_info["data"] if info["type"] == "oracle_cards"
-    ][0]
-    oracle_cards_url = oracl_card_info["download_uri"]
-    oracle_card_data = requests.get(oracle_cards_url)
-    oracle_card_data = oracle_card_data.json()
-
-    # download rulings
-    rulings_info = [
-        info for info in bulk_requests_info["data"] if info["type"] == "rulings"
-    ][0]
-    rulings_info_url = rulings_info["download_uri"]
-    rulings_data = requests.get(rulings_info_url)
-    rulings_data = rulings_data.json()
-
-    # combine
-    idx_2_card_data = {
-        card_data["oracle_id"]: card_data for card_data in oracle_card_data
-    }
-
-    for ruling in tqdm(rulings_data, desc="adding rulings to cards"):
-        oracle_id = ruling["oracle_id"]
-        if "rulings" not in idx_2_card_data[oracle_id]:
-            idx_2_card_data[oracle_id]["rulings"] = []
-        idx_2_card_data[oracle_id]["rulings"].append(ruling["comment"])
-
-    # clean card data
-
-    data = [
-        card
-        for card in idx_2_card_data.values()
-        if (card["type_line"] not in BLOCKED_CARD_TYPES)
-        and ((card["layout"] in NORMAL_CARD_TYPES) or (card["layout"] in DOUBLE_FACED))
-    ]
-
-    logger.info(f"saving {len(data)} raw card data")
-    return data
-
-
-def parse_card_data(data: list[dict], keywords: list[str]) -> list[Card]:
+    download_folder: Path,
+    bulk_data_info: dict[str, dict],
+    state: Optional[BulkDataState] = None,
+) -> Iterator[dict]:
+    """
+    Streams the scryfall oracle cards joined with their rulings.
+
+    Both bulk files are saved to the download folder and parsed while they
+    are downloaded. The rulings are indexed by oracle id first, after that
+    every card is joined with its rulings as soon as it is parsed, so only
+    the rulings index and the current card are held in memory.
+    With a state the downloads are conditional and its validators are updated.
+    """
+    rulings = RulingsIndex.from_rulings(
+        stream_bulk_data(
+            bulk_data_info["rulings"]["download_uri"],
+            download_folder / "rulings.json",
+            state=state.file("rulings") if state is not None else None,
+        )
+    )
+    logger.info(f"indexed rulings of {len(rulings)} cards")
+
+    seen_oracle_ids = set()
+    num_cards = 0
+    for card_data in stream_bulk_data(
+        bulk_data_info["oracle_cards"]["download_uri"],
+        download_folder / "oracle_cards.json",
+        state=state.file("oracle_cards") if state is not None else None,
+    ):
+        oracle_id = card_data.get("oracle_id")
+        if oracle_id in seen_oracle_ids or not is_supported_card(card_data):
+            continue
+        if oracle_id is not None:
+            seen_oracle_ids.add(oracle_id)
+        comments = rulings.get(oracle_id)
+        if comments:
+            card_data["rulings"] = comments
+        num_cards += 1
+        yield card_data
+
+    logger.info(f"downloaded {num_cards} raw card data")
+
+
+def parse_card_data(data: Iterable[dict], keywords: list[str]) -> list[Card]:
     cards = []
     for card_data in data:
         rules = card_data.get("rulings", [])
@@ -158,33 +171,105 @@ def parse_card_data(data: list[dict], keywords: list[str]) -> list[Card]:
     return cards
 
 
+def create_card_document(card: Card) -> ChromaDocument:
+    """the card as a chroma row with its stable id and the hash of the embedded text"""
+    text = f"""
+            {card.name}
+            {card.type}
+            {card.oracle}
+            """
+    return ChromaDocument(
+        id=card.id,
+        document=text,
+        metadata={**card.to_chroma(), CONTENT_HASH: content_hash(text)},
+    )
+
+
+def get_bulk_data_state_file(all_cards_file: Path) -> Path:
+    return all_cards_file.with_name(f"{all_cards_file.stem}.bulk_data.json")
+
+
+def check_bulk_data(
+    all_cards_file: Path,
+    lookup_url: str = SCRYFALL_BULK_DATA_URL,
+    force: bool = False,
+) -> tuple[Optional[dict[str, dict]], BulkDataState]:
+    """
+    The bulk data entries if the card data changed since the last update.
+
+    The lookup is a conditional request with the stored validators, the
+    entries are None if the lookup was not modified or the updated_at and
+    size of all bulk files are the same as in the last update.
+    """
+    state = BulkDataState()
+    if all_cards_file.is_file() and not force:
+        state = BulkDataState.load(get_bulk_data_state_file(all_cards_file))
+
+    bulk_data_info = get_bulk_data_info(lookup_url, state=state.lookup)
+    if bulk_data_info is None or state.is_current(bulk_data_info, BULK_DATA_TYPES):
+        return None, state
+    return bulk_data_info, state
+
+
 def update_cards(
     all_cards_file: Path,
     all_keywords_file: Path,
     processed_cards_folder: Path,
     db: ChromaDB,
-) -> bool:
-
-    ##################################
-    # 1. Extract: download card data #
-    ##################################
-
-    logger.info("starting extract")
-    data = download_card_data()
-    # save data
-    with all_cards_file.open("w", encoding="utf-8") as outfile:
-        json.dump(data, outfile, ensure_ascii=False)
-
-    ###################################
-    # 2. Transform: process card data #
-    ###################################
-    logger.info("starting transform")
+    card_snapshot_file: Optional[Path] = None,
+    lookup_url: str = SCRYFALL_BULK_DATA_URL,
+    force: bool = False,
+    rebuild: bool = False,
+    progress: Optional[Callable[[str], None]] = None,
+) -> Optional[int]:
+    """
+    Downloads the scryfall cards and loads the changes into the cards collection.
+
+    With rebuild the cards collection is rebuilt from scratch in a new
+    version and switched over once it is complete, instead of loading the
+    changes. The previous version is kept for processes that still read it.
+
+    Returns:
+        Optional[int]: number of changed rows in the collection, None if the
+            bulk data is unchanged and the update was skipped.
+    """
+
+    def report(stage: str) -> None:
+        logger.info(stage)
+        if progress is not None:
+            progress(stage)
+
+    report("checking bulk data")
+    bulk_data_info, state = check_bulk_data(
+        all_cards_file, lookup_url=lookup_url, force=force
+    )
+    if bulk_data_info is None:
+        logger.info("scryfall bulk data is unchanged, skipping update")
+        return None
+
+    #########################################
+    # 1. Extract: stream the card data      #
+    # 2. Transform: parse while downloading #
+    #########################################
+
+    report("starting extract and transform")
     with all_keywords_file.open("r", encoding="utf-8") as infile:
         keywords = json.load(infile)
 
     processed_card_ids = set([file.stem for file in processed_cards_folder.iterdir()])
 
-    cards = parse_card_data(data=data, keywords=keywords)
+    with JsonArrayWriter(all_cards_file) as writer:
+        data = download_card_data(
+            download_folder=all_cards_file.parent,
+            bulk_data_info=bulk_data_info,
+            state=state,
+        )
+        cards = parse_card_data(data=writer.tee(data), keywords=keywords)
+    logger.info(f"saved {writer.count} raw card data")
+    if not cards:
+        # an empty download would delete every card of the collection
+        raise ValueError(f"{all_cards_file} has 0 cards, expected at least 1")
+
     new_cards = [card for card in cards if card.id not in processed_card_ids]
     # chat = create_categorizer("gpt-4o")
     for card in tqdm(new_cards, desc="Transforming cards"):
@@ -204,45 +289,52 @@ def update_cards(
         ) as outfile:
             json.dump(card_data, outfile, ensure_ascii=False)
 
+    if card_snapshot_file is not None:
+        write_card_snapshot(cards, card_snapshot_file)
+
     ######################################
     # 3. Load: add to Chroma Collection ##
     ######################################
-    logger.info("starting load")
+    report("starting load")
+
+    documents = [create_card_document(card) for card in cards]
+    if rebuild:
+        report(f"rebuilding the cards collection with {len(documents)} cards")
+        db.rebuild_collection(
+            CollectionType.CARDS,
+            documents,
+            smoke_query=cards[0].name,
+            keep_versions=1,
+        )
+        num_changes = len(documents)
+    else:
+        existing = db.get_metadatas(CollectionType.CARDS)
+        add_missing_content_hashes(db, CollectionType.CARDS, existing)
+
+        plan = create_delta_plan(documents, existing)
+        report(f"loading {plan}")
+        apply_delta_plan(db, CollectionType.CARDS, plan)
+        num_changes = len(plan)
 
-    # search cards in db
     collection = db.get_collection(CollectionType.CARDS)
-    documents = collection.get()
-    cards_in_db = set([doc["name"] for doc in documents["metadatas"]])
-    new_cards = [card for card in cards if card.name not in cards_in_db]
-
-    batch_size = 100
-    batches = batch(new_cards, batch_size)
-    for mini_batch in tqdm(
-        batches, desc="uploading documents", total=len(new_cards) // batch_size
-    ):
+    collection.modify(metadata={"last_updated": str(datetime.now())})
+    # the server workers reload the cards once they see the new generation
+    db.publish()
 
-        documents = []
-        for card in mini_batch:
+    # only a completed update makes the downloaded data current
+    state.update(bulk_data_info, BULK_DATA_TYPES)
+    state.save(get_bulk_data_state_file(all_cards_file))
+    return num_changes
 
-            text = f"""
-            {card.name}
-            {card.type}
-            {card.oracle}
-            """
-            documents.append(
-                ChromaDocument(
-                    id=str(uuid4()),
-                    document=text,
-                    metadata=card.to_chroma(),
-                )
-            )
 
-        db.upsert_documents_to_collection(
-            documents=documents, collection_type=CollectionType.CARDS
-        )
-
-    collection.modify(metadata={"last_updated": str(datetime.now())})
-    return len(new_cards)
+def run_card_update(
+    chroma_config: ChromaConfig,
+    progress: Optional[Callable[[str], None]] = None,
+    **kwargs,
+) -> Optional[int]:
+    """update_cards with its own database connection, runs in the update job process"""
+    db = ChromaDB(chroma_config)
+    return update_cards(db=db, progress=progress, **kwargs)
 
 
 if __name__ == "__main__":
@@ -255,6 +347,7 @@ if __name__ == "__main__":
     ALL_CARDS_FILE = DATA_PATH / "etl/raw/cards/scryfall_all_cards_with_rulings.json"
     KEYWORD_FILE = DATA_PATH / "etl/raw/documents/keyword_list.json"
     OUTPUT_PATH = DATA_PATH / "etl/processed/cards/"
+    SNAPSHOT_FILE = DATA_PATH / "etl/processed/cards.snapshot"
 
     chroma_config = ChromaConfig(**config["CHROMA"])
     db = ChromaDB(chroma_config)
@@ -264,4 +357,5 @@ if __name__ == "__main__":
         all_keywords_file=KEYWORD_FILE,
         processed_cards_folder=OUTPUT_PATH,
         db=db,
+        card_snapshot_file=SNAPSHOT_FILE,
     )
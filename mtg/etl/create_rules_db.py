@@ -56,7 +56,6 @@ from mtg.chroma.config import ChromaConfig
 from mtg.chroma.chroma_db import ChromaDB, CollectionType
 from mtg.chroma import ChromaDocument
 
-from tqdm import tqdm
 from mtg.util import load_config
 from uuid import uuid4
 
@@ -72,59 +71,31 @@ len(documents)
 # %%
 
 
-def batch(iterable, batch_size=1):
-    length = len(iterable)
-    for idx in range(0, length, batch_size):
-        yield iterable[idx : min(idx + batch_size, length)]
-
-
 logger.info("starting load")
 config = load_config("configs/config.yaml")
 
 chroma_config = ChromaConfig(**config["CHROMA"])
 db = ChromaDB(chroma_config)
 
-batch_size = 100
-batches = batch(documents, batch_size)
-for mini_batch in tqdm(
-    batches, desc="uploading documents", total=len(documents) // batch_size
-):
-
-    documents = []
-    for doc in mini_batch:
-        metadata = {
-            key: value for key, value in doc.to_chroma().items() if value is not None
-        }
-        documents.append(
-            ChromaDocument(
-                id=str(uuid4()),
-                document=doc.text,
-                metadata=metadata,
-            )
+chroma_documents = []
+for doc in documents:
+    metadata = {
+        key: value for key, value in doc.to_chroma().items() if value is not None
+    }
+    chroma_documents.append(
+        ChromaDocument(
+            id=str(uuid4()),
+            document=doc.text,
+            metadata=metadata,
         )
-
-    db.upsert_documents_to_collection(
-        documents=documents, collection_type=CollectionType.DOCUMENTS
     )
 
-
-# %%
-
-while True:
-    mini_batch = next(batches)
-    documents = []
-    for doc in mini_batch:
-        metadata = {
-            key: value for key, value in doc.to_chroma().items() if value is not None
-        }
-        documents.append(
-            ChromaDocument(
-                id=str(uuid4()),
-                document=doc.text,
-                metadata=metadata,
-            )
-        )
-
-    db.upsert_documents_to_collection(
-        documents=documents, collection_type=CollectionType.DOCUMENTS
-    )
+# queries keep using the current documents until the new version is complete
+db.rebuild_collection(
+    CollectionType.DOCUMENTS,
+    chroma_documents,
+    smoke_query=documents[0].text,
+    keep_versions=1,
+)
+# the server workers reconnect to the new version once they see the new generation
+db.publish()
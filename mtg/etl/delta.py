@@ -0,0 +1,167 @@
+import hashlib
+from collections import defaultdict
+
+from pydantic import BaseModel, Field
+from tqdm import tqdm
+
+from mtg.logging import get_logger
+from mtg.chroma import ChromaDocument
+from mtg.chroma.chroma_db import ChromaDB, CollectionType
+
+logger = get_logger()
+
+# metadata key of the hash of the embedded text
+CONTENT_HASH = "content_hash"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class DeltaPlan(BaseModel):
+    """
+    The changes that bring a collection to a new set of documents.
+
+    Only inserts and reembeds are embedded, moves reuse the embedding of a
+    deleted row with the same text under the new id.
+    """
+
+    inserts: list[ChromaDocument] = Field(default_factory=list)
+    reembeds: list[ChromaDocument] = Field(default_factory=list)
+    # (old id, document with the new id)
+    moves: list[tuple[str, ChromaDocument]] = Field(default_factory=list)
+    metadata_updates: list[ChromaDocument] = Field(default_factory=list)
+    deletes: list[str] = Field(default_factory=list)
+
+    def __repr__(self) -> str:
+        return (
+            f"DeltaPlan(inserts:{len(self.inserts)}, reembeds:{len(self.reembeds)}, "
+            f"moves:{len(self.moves)}, metadata_updates:{len(self.metadata_updates)}, "
+            f"deletes:{len(self.deletes)})"
+        )
+
+    __str__ = __repr__
+
+    def __len__(self) -> int:
+        return (
+            len(self.inserts)
+            + len(self.reembeds)
+            + len(self.moves)
+            + len(self.metadata_updates)
+            + len(self.deletes)
+        )
+
+
+def create_delta_plan(
+    documents: list[ChromaDocument], existing: dict[str, dict]
+) -> DeltaPlan:
+    """
+    Compares new documents with the stored metadata by id.
+
+    Args:
+        documents (list[ChromaDocument]): The new documents, their metadata includes the content hash.
+        existing (dict[str, dict]): id to metadata of the stored rows.
+
+    Returns:
+        DeltaPlan: new ids are inserted, changed texts reembedded, changed
+            metadata updated and ids that are gone deleted.
+    """
+    plan = DeltaPlan()
+    new_ids = set()
+    for document in documents:
+        new_ids.add(document.id)
+        metadata = existing.get(document.id)
+        if metadata is None:
+            plan.inserts.append(document)
+        elif metadata.get(CONTENT_HASH) != document.metadata[CONTENT_HASH]:
+            plan.reembeds.append(document)
+        elif metadata != document.metadata:
+            plan.metadata_updates.append(document)
+    plan.deletes = [
+        document_id for document_id in existing if document_id not in new_ids
+    ]
+
+    # inserted texts that are already embedded in a deleted row
+    hash_2_deleted_ids = defaultdict(list)
+    for document_id in plan.deletes:
+        if existing[document_id].get(CONTENT_HASH) is not None:
+            hash_2_deleted_ids[existing[document_id][CONTENT_HASH]].append(document_id)
+    inserts = []
+    for document in plan.inserts:
+        deleted_ids = hash_2_deleted_ids.get(document.metadata[CONTENT_HASH])
+        if deleted_ids:
+            plan.moves.append((deleted_ids.pop(), document))
+        else:
+            inserts.append(document)
+    plan.inserts = inserts
+
+    return plan
+
+
+def add_missing_content_hashes(
+    db: ChromaDB, collection_type: CollectionType, existing: dict[str, dict]
+) -> None:
+    """hashes the stored text of rows that were loaded without a content hash"""
+    missing_ids = [
+        document_id
+        for document_id, metadata in existing.items()
+        if CONTENT_HASH not in metadata
+    ]
+    if not missing_ids:
+        return
+    logger.info(f"hashing the stored text of {len(missing_ids)} documents")
+    id_2_fields = db.get_by_ids(collection_type, missing_ids, include=["documents"])
+    for document_id, fields in id_2_fields.items():
+        existing[document_id] = {
+            **existing[document_id],
+            CONTENT_HASH: content_hash(fields["documents"]),
+        }
+
+
+def apply_delta_plan(
+    db: ChromaDB,
+    collection_type: CollectionType,
+    plan: DeltaPlan,
+    batch_size: int = 100,
+) -> None:
+    """writes the plan to the collection, rows are deleted last"""
+    documents = plan.inserts + plan.reembeds
+    for idx in tqdm(range(0, len(documents), batch_size), desc="embedding documents"):
+        db.upsert_documents_to_collection(
+            documents=documents[idx : idx + batch_size],
+            collection_type=collection_type,
+        )
+
+    for idx in range(0, len(plan.moves), batch_size):
+        moves = plan.moves[idx : idx + batch_size]
+        id_2_fields = db.get_by_ids(
+            collection_type,
+            [old_id for old_id, _ in moves],
+            include=["embeddings"],
+        )
+        moved = [
+            (old_id, document) for old_id, document in moves if old_id in id_2_fields
+        ]
+        if moved:
+            db.upsert_documents_to_collection(
+                documents=[document for _, document in moved],
+                collection_type=collection_type,
+                embeddings=[id_2_fields[old_id]["embeddings"] for old_id, _ in moved],
+            )
+        # rows that disappeared in the meantime are embedded again
+        lost = [document for old_id, document in moves if old_id not in id_2_fields]
+        if lost:
+            db.upsert_documents_to_collection(
+                documents=lost, collection_type=collection_type
+            )
+
+    for idx in range(0, len(plan.metadata_updates), batch_size):
+        db.update_metadatas(
+            plan.metadata_updates[idx : idx + batch_size],
+            collection_type=collection_type,
+        )
+
+    for idx in range(0, len(plan.deletes), batch_size):
+        db.delete_documents_from_collection(
+            collection_type, ids=plan.deletes[idx : idx + batch_size]
+        )
@@ -0,0 +1,95 @@
+# %%
+import uuid
+from pathlib import Path
+from tqdm import tqdm
+
+from mtg.logging import get_logger
+from mtg.util import load_config
+from mtg.chroma.config import ChromaConfig
+from mtg.chroma.chroma_db import ChromaDB, CollectionType
+from mtg.objects.card import COLORS, FORMATS, encode_flags, encode_keywords
+
+logger = get_logger()
+
+
+def is_legacy_metadata(metadata: dict) -> bool:
+    return not isinstance(metadata.get("legalities"), int)
+
+
+def migrated_id(document_id: str) -> str:
+    """the id of a migrated row, derived from the legacy id so reruns write the same row"""
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, f"compact-metadata:{document_id}"))
+
+
+def to_compact_metadata(metadata: dict) -> dict:
+    """converts the metadata with one boolean key per keyword, color and format"""
+    keywords, colors, legalities = [], [], []
+    for key in metadata:
+        if key.startswith("keyword_"):
+            keywords.append(key.removeprefix("keyword_"))
+        elif key.startswith("color_identity_"):
+            colors.append(key.removeprefix("color_identity_"))
+        elif key.endswith("_legal"):
+            legalities.append(key.removesuffix("_legal"))
+
+    return {
+        "name": metadata["name"],
+        "power": metadata.get("power", "None"),
+        "toughness": metadata.get("toughness", "None"),
+        "color_identity": encode_flags(colors, COLORS),
+        "legalities": encode_flags(legalities, FORMATS),
+        "keywords": encode_keywords(keywords),
+    }
+
+
+def migrate_card_metadata(db: ChromaDB, batch_size: int = 500) -> int:
+    """
+    Rewrites legacy card metadata in the cards collection to the compact encoding.
+
+    Chroma merges metadata on update, so legacy rows are written under a new
+    id with their stored embeddings and deleted afterwards. Cards are never
+    missing from the collection and nothing is embedded again.
+
+    Returns:
+        int: number of migrated documents.
+    """
+    collection = db.get_collection(CollectionType.CARDS)
+    ids = collection.get(include=[])["ids"]
+
+    num_migrated = 0
+    for idx in tqdm(range(0, len(ids), batch_size), desc="migrating card metadata"):
+        records = collection.get(
+            ids=ids[idx : idx + batch_size],
+            include=["embeddings", "documents", "metadatas"],
+        )
+        legacy = [
+            record_idx
+            for record_idx, metadata in enumerate(records["metadatas"])
+            if is_legacy_metadata(metadata)
+        ]
+        if not legacy:
+            continue
+
+        legacy_ids = [records["ids"][record_idx] for record_idx in legacy]
+        collection.upsert(
+            ids=[migrated_id(document_id) for document_id in legacy_ids],
+            embeddings=[records["embeddings"][record_idx] for record_idx in legacy],
+            documents=[records["documents"][record_idx] for record_idx in legacy],
+            metadatas=[
+                to_compact_metadata(records["metadatas"][record_idx])
+                for record_idx in legacy
+            ],
+        )
+        collection.delete(ids=legacy_ids)
+        num_migrated += len(legacy)
+
+    logger.info(f"migrated metadata of {num_migrated} cards")
+    return num_migrated
+
+
+if __name__ == "__main__":
+    config = load_config(Path("configs/config.yaml"))
+    chroma_config = ChromaConfig(**config["CHROMA"])
+    db = ChromaDB(chroma_config)
+
+    migrate_card_metadata(db)
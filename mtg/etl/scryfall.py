@@ -0,0 +1,329 @@
+import re
+import json
+import uuid
+import codecs
+import queue
+import threading
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Mapping, Optional
+
+import requests
+from pydantic import BaseModel, Field
+
+from mtg.logging import get_logger
+
+logger = get_logger()
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+CHUNK_SIZE = 1 << 20
+
+
+class BulkFileState(BaseModel):
+    """the version of a downloaded file as reported by the server"""
+
+    updated_at: Optional[str] = None
+    size: Optional[int] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def conditional_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def set_validators(self, headers: Mapping[str, str]) -> None:
+        self.etag = headers.get("ETag")
+        self.last_modified = headers.get("Last-Modified")
+
+
+class BulkDataState(BaseModel):
+    """
+    Freshness of the downloaded scryfall bulk data.
+
+    Stores the validators of the bulk data lookup and the updated_at, size
+    and validators of every bulk file of the last successful update.
+    """
+
+    lookup: BulkFileState = Field(default_factory=BulkFileState)
+    files: dict[str, BulkFileState] = Field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Path) -> "BulkDataState":
+        """the stored state, an empty state if there is none"""
+        path = Path(path)
+        if not path.is_file():
+            return cls()
+        try:
+            return cls.model_validate_json(path.read_bytes())
+        except ValueError:
+            logger.warning(f"ignoring invalid bulk data state {path}")
+            return cls()
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = path.with_name(f"{path.name}.tmp")
+        tmp_file.write_text(self.model_dump_json(indent=2), encoding="utf-8")
+        tmp_file.replace(path)
+
+    def file(self, bulk_data_type: str) -> BulkFileState:
+        return self.files.setdefault(bulk_data_type, BulkFileState())
+
+    def is_current(self, bulk_data_info: dict[str, dict], types: list[str]) -> bool:
+        """True if all bulk files have the same updated_at and size as stored"""
+        for bulk_data_type in types:
+            state = self.files.get(bulk_data_type)
+            info = bulk_data_info[bulk_data_type]
+            if state is None or (state.updated_at, state.size) != (
+                info.get("updated_at"),
+                info.get("size"),
+            ):
+                return False
+        return True
+
+    def update(self, bulk_data_info: dict[str, dict], types: list[str]) -> None:
+        for bulk_data_type in types:
+            state = self.file(bulk_data_type)
+            state.updated_at = bulk_data_info[bulk_data_type].get("updated_at")
+            state.size = bulk_data_info[bulk_data_type].get("size")
+
+
+def get_bulk_data_info(
+    lookup_url: str, state: Optional[BulkFileState] = None
+) -> Optional[dict[str, dict]]:
+    """
+    The bulk data entries of the scryfall api by type.
+
+    With a state the request is conditional, None is returned if the
+    entries were not modified since then.
+    """
+    headers = state.conditional_headers() if state is not None else {}
+    response = requests.get(lookup_url, headers=headers, timeout=60)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    if state is not None:
+        state.set_validators(response.headers)
+    return {info["type"]: info for info in response.json()["data"]}
+
+
+def read_chunks(path: Path, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    with Path(path).open("rb") as infile:
+        while chunk := infile.read(chunk_size):
+            yield chunk
+
+
+def stream_download(
+    url: str,
+    path: Path,
+    chunk_size: int = CHUNK_SIZE,
+    state: Optional[BulkFileState] = None,
+) -> Iterator[bytes]:
+    """
+    Downloads the url to the path and yields the chunks while they are written.
+
+    The file is written to a temporary path and only moved into place once
+    the download is complete. With a state and an existing file the request
+    is conditional, if the file was not modified the local copy is read instead.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    headers = (
+        state.conditional_headers() if state is not None and path.is_file() else {}
+    )
+    tmp_file = path.with_name(f"{path.name}.tmp")
+    with requests.get(url, headers=headers, stream=True, timeout=60) as response:
+        if response.status_code == 304:
+            logger.info(f"{url} not modified, reading {path}")
+            yield from read_chunks(path, chunk_size)
+            return
+        response.raise_for_status()
+        with tmp_file.open("wb") as outfile:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                outfile.write(chunk)
+                yield chunk
+        tmp_file.replace(path)
+        if state is not None:
+            state.set_validators(response.headers)
+
+
+_DONE = object()
+
+
+def prefetch(iterable: Iterable, maxsize: int = 16) -> Iterator:
+    """
+    Iterates the iterable in a background thread, at most maxsize items ahead.
+
+    Used to keep downloading while the previous chunks are parsed, errors of
+    the background thread are raised in the consumer.
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_DONE, None))
+        except Exception as error:
+            put((None, error))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Parses the elements of a json array from a stream of byte chunks.
+
+    Only the current element and the unparsed rest of the last chunk are
+    kept in memory, so files of any size are parsed with bounded memory.
+
+    Raises:
+        ValueError: If the stream is not a complete json array.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer, pos, started = "", 0, False
+    chunks = iter(chunks)
+    final = False
+    while not final:
+        chunk = next(chunks, None)
+        final = chunk is None
+        buffer = buffer[pos:] + text_decoder.decode(chunk or b"", final=final)
+        pos = 0
+        while True:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("expected a json array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                # finish the stream, a download is only complete at its end
+                for _ in chunks:
+                    pass
+                return
+            if buffer[pos] == ",":
+                pos += 1
+                continue
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise ValueError(f"invalid json array element at {pos}")
+                # the element continues in the next chunk
+                break
+            if end == len(buffer) and not final:
+                # a number could continue in the next chunk
+                break
+            yield item
+            pos = end
+    raise ValueError("unexpected end of json array")
+
+
+class RulingsIndex:
+    """
+    Ruling comments by oracle id.
+
+    Oracle ids are stored as 16 byte uuids instead of 36 character strings,
+    the index is built once from the rulings stream and joined to the cards
+    while they are parsed.
+    """
+
+    def __init__(self):
+        self._oracle_id_2_comments: dict[bytes, list[str]] = {}
+
+    def __repr__(self) -> str:
+        return f"RulingsIndex(cards:{len(self)})"
+
+    def __len__(self) -> int:
+        return len(self._oracle_id_2_comments)
+
+    @staticmethod
+    def _key(oracle_id: str) -> bytes:
+        return uuid.UUID(oracle_id).bytes
+
+    @classmethod
+    def from_rulings(cls, rulings: Iterable[dict]) -> "RulingsIndex":
+        index = cls()
+        for ruling in rulings:
+            index.add(ruling["oracle_id"], ruling["comment"])
+        return index
+
+    def add(self, oracle_id: str, comment: str) -> None:
+        self._oracle_id_2_comments.setdefault(self._key(oracle_id), []).append(comment)
+
+    def get(self, oracle_id: Optional[str]) -> list[str]:
+        if oracle_id is None:
+            return []
+        return self._oracle_id_2_comments.get(self._key(oracle_id), [])
+
+
+def stream_bulk_data(
+    url: str, path: Path, state: Optional[BulkFileState] = None
+) -> Iterator[dict]:
+    """downloads a bulk data file to the path and parses it while downloading"""
+    logger.info(f"downloading {url} to {path}")
+    return iter_json_array(prefetch(stream_download(url, path, state=state)))
+
+
+class JsonArrayWriter:
+    """writes a json array to a file one element at a time"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.tmp_file = self.path.with_name(f"{self.path.name}.tmp")
+        self.count = 0
+
+    def __enter__(self) -> "JsonArrayWriter":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._outfile = self.tmp_file.open("w", encoding="utf-8")
+        self._outfile.write("[")
+        return self
+
+    def write(self, item: Any) -> None:
+        if self.count:
+            self._outfile.write(", ")
+        json.dump(item, self._outfile, ensure_ascii=False)
+        self.count += 1
+
+    def tee(self, items: Iterable) -> Iterator:
+        """writes every item while passing it on"""
+        for item in items:
+            self.write(item)
+            yield item
+
+    def __exit__(self, exc_type, exc, tb):
+        self._outfile.write("]")
+        self._outfile.close()
+        if exc_type is None:
+            self.tmp_file.replace(self.path)
+        else:
+            self.tmp_file.unlink(missing_ok=True)
@@ -0,0 +1,37 @@
+import os
+import asyncio
+import logging
+import functools
+from typing import Callable, Optional, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+
+T = TypeVar("T")
+
+
+class SearchExecutor:
+    """
+    Thread pool for blocking search work like model inference and collection queries.
+
+    Running this work off the event loop keeps cheap requests responsive
+    while slow searches are in flight. Model inference and hnswlib release
+    the GIL, so the threads run in parallel.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="search"
+        )
+        logging.info(f"started search executor with {self.max_workers} threads")
+
+    def __repr__(self) -> str:
+        return f"SearchExecutor(max_workers:{self.max_workers})"
+
+    async def run(self, function: Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(function, *args, **kwargs)
+        )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
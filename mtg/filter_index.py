@@ -0,0 +1,293 @@
+import math
+import logging
+import threading
+from typing import Callable, Optional
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from mtg.objects.card import COLORS, FORMATS, encode_flags
+
+
+class CardFilter(BaseModel):
+    """Resolved card filters: any of the keywords, any of the colors and legal in the format."""
+
+    keywords: list[str] = Field(default_factory=list)
+    color_identity: list[str] = Field(default_factory=list)
+    legality: Optional[str] = None
+
+    def is_empty(self) -> bool:
+        return not (self.keywords or self.color_identity or self.legality)
+
+    def color_mask(self) -> int:
+        return encode_flags(self.color_identity, COLORS)
+
+    def legality_mask(self) -> int:
+        return encode_flags([self.legality], FORMATS)
+
+
+# (distances, card names) per query
+SearchResult = tuple[list[float], list[str]]
+
+
+class CardFilterIndex:
+    """
+    One packed bitset per keyword plus color identity and legality bitmasks per card,
+    formats that are missing in FORMATS get a packed bitset like keywords.
+
+    The allowed cards of a filter are computed with vectorized AND/OR over the
+    bitsets and masks. Small sets are searched exactly with a dot product over the card
+    embeddings, large sets with an over-fetching ANN search that is filtered
+    against the bitset.
+    """
+
+    def __init__(self, summaries: list[dict]):
+        self.card_names: list[str] = []
+        self.name_2_row: dict[str, int] = {}
+        for summary in summaries:
+            if summary["name"] not in self.name_2_row:
+                self.name_2_row[summary["name"]] = len(self.card_names)
+                self.card_names.append(summary["name"])
+
+        # same encoding as the chroma metadata of the cards
+        self.keyword_2_bits = self._create_bitsets(summaries, "keywords")
+        # formats without a bit in the chroma metadata get their own bitset
+        self.format_2_bits = {
+            legality: bits
+            for legality, bits in self._create_bitsets(summaries, "legalities").items()
+            if legality not in FORMATS
+        }
+        self.color_masks = np.zeros(len(self.card_names), dtype=np.uint8)
+        self.legality_masks = np.zeros(len(self.card_names), dtype=np.uint64)
+        for summary in summaries:
+            row = self.name_2_row[summary["name"]]
+            self.color_masks[row] = encode_flags(summary["color_identity"], COLORS)
+            self.legality_masks[row] = encode_flags(summary["legalities"], FORMATS)
+
+        # card embeddings for exact search, rows are fetched on first use
+        self._embeddings: Optional[np.ndarray] = None
+        self._loaded = np.zeros(len(self.card_names), dtype=bool)
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return (
+            f"CardFilterIndex(cards:{len(self)}, keywords:{len(self.keyword_2_bits)})"
+        )
+
+    def __len__(self) -> int:
+        return len(self.card_names)
+
+    def _create_bitsets(self, summaries: list[dict], field: str) -> dict:
+        value_2_bits = {}
+        for summary in summaries:
+            row = self.name_2_row[summary["name"]]
+            for value in summary[field]:
+                if value not in value_2_bits:
+                    value_2_bits[value] = np.zeros(len(self.card_names), dtype=bool)
+                value_2_bits[value][row] = True
+        return {value: np.packbits(bits) for value, bits in value_2_bits.items()}
+
+    def select(self, card_filter: CardFilter) -> Optional[np.ndarray]:
+        """rows of the cards matching the filter, None if the filter is empty"""
+        if card_filter.is_empty():
+            return None
+
+        allowed = np.ones(len(self.card_names), dtype=bool)
+        if card_filter.keywords:
+            empty = np.zeros((len(self.card_names) + 7) // 8, dtype=np.uint8)
+            bits = np.bitwise_or.reduce(
+                [
+                    self.keyword_2_bits.get(keyword, empty)
+                    for keyword in card_filter.keywords
+                ]
+            )
+            allowed &= np.unpackbits(bits, count=len(self.card_names)).astype(bool)
+        if card_filter.color_identity:
+            allowed &= (self.color_masks & np.uint8(card_filter.color_mask())) != 0
+        if card_filter.legality in self.format_2_bits:
+            allowed &= np.unpackbits(
+                self.format_2_bits[card_filter.legality], count=len(self.card_names)
+            ).astype(bool)
+        elif card_filter.legality is not None:
+            allowed &= (
+                self.legality_masks & np.uint64(card_filter.legality_mask())
+            ) != 0
+
+        return np.flatnonzero(allowed)
+
+    def allows(self, card_filter: CardFilter, card_name: str) -> bool:
+        """checks a single card against the filter without building the full set"""
+        row = self.name_2_row.get(card_name)
+        if row is None:
+            return False
+        if card_filter.keywords and not any(
+            self.keyword_2_bits[keyword][row >> 3] & (0x80 >> (row & 7))
+            for keyword in card_filter.keywords
+            if keyword in self.keyword_2_bits
+        ):
+            return False
+        if card_filter.color_identity and not (
+            int(self.color_masks[row]) & card_filter.color_mask()
+        ):
+            return False
+        if card_filter.legality in self.format_2_bits:
+            bits = self.format_2_bits[card_filter.legality]
+            if not bits[row >> 3] & (0x80 >> (row & 7)):
+                return False
+        elif card_filter.legality is not None and not (
+            int(self.legality_masks[row]) & card_filter.legality_mask()
+        ):
+            return False
+        return True
+
+    def exact_search(
+        self,
+        query_embeddings: list,
+        rows: np.ndarray,
+        n_results: int,
+        fetch_embeddings: Callable[[list[str]], dict[str, list[float]]],
+    ) -> list[SearchResult]:
+        """cosine distance to every allowed card"""
+        missing = rows[~self._loaded[rows]]
+        if len(missing):
+            name_2_embedding = fetch_embeddings(
+                [self.card_names[row] for row in missing]
+            )
+            # the array is allocated once, rows are marked loaded after they are written
+            with self._lock:
+                for row in missing:
+                    embedding = name_2_embedding.get(self.card_names[row])
+                    if embedding is None:
+                        continue
+                    if self._embeddings is None:
+                        # zero pages are only committed once rows are written
+                        self._embeddings = np.zeros(
+                            (len(self.card_names), len(embedding)), dtype=np.float32
+                        )
+                    self._embeddings[row] = embedding
+                    self._loaded[row] = True
+
+        rows = rows[self._loaded[rows]]
+        if len(rows) == 0:
+            return [([], []) for _ in query_embeddings]
+
+        embeddings = self._embeddings[rows]
+        embeddings = normalize(embeddings)
+        queries = normalize(np.array(query_embeddings, dtype=np.float32))
+        distances = 1 - queries @ embeddings.T
+
+        results = []
+        n_results = min(n_results, len(rows))
+        for query_distances in distances:
+            best = np.argpartition(query_distances, n_results - 1)[:n_results]
+            best = best[np.argsort(query_distances[best])]
+            results.append(
+                (
+                    query_distances[best].tolist(),
+                    [self.card_names[rows[idx]] for idx in best],
+                )
+            )
+        return results
+
+    def search(
+        self,
+        query_embeddings: list,
+        card_filter: CardFilter,
+        n_results: int,
+        query: Callable[..., dict],
+        fetch_embeddings: Callable[[list[str]], dict[str, list[float]]],
+        exact_search_limit: int = 2000,
+        max_candidates: int = 1000,
+        threshold: Optional[float] = None,
+        exact_fallback_limit: int = 10000,
+    ) -> list[SearchResult]:
+        """
+        Vector search over the cards allowed by the filter.
+
+        Large allowed sets are searched with an ANN query that over-fetches
+        proportionally to the selectivity of the filter. The number of
+        candidates is doubled until every query has n_results allowed cards,
+        ran out of candidates or only finds candidates beyond the threshold.
+
+        Args:
+            query_embeddings (list): One embedding per query.
+            card_filter (CardFilter): The resolved filter.
+            n_results (int): Number of results per query.
+            query (Callable): Queries the cards collection, takes the arguments of Collection.query.
+            fetch_embeddings (Callable): Returns the stored embeddings of the given card names.
+            exact_search_limit (int): Allowed sets up to this size are searched exactly.
+            max_candidates (int): Maximum number of ANN candidates fetched for post filtering.
+            threshold (float, optional): Results beyond this distance are not needed.
+            exact_fallback_limit (int): Allowed sets up to this size are searched exactly if
+                the ANN candidates are not enough, larger sets return the partial ANN results.
+
+        Returns:
+            list[SearchResult]: distances and card names per query, closest first.
+        """
+        rows = self.select(card_filter)
+        if rows is None:
+            results = query(query_embeddings=query_embeddings, n_results=n_results)
+            return [
+                (distances, [metadata["name"] for metadata in metadatas])
+                for distances, metadatas in zip(
+                    results["distances"], results["metadatas"]
+                )
+            ]
+        if len(rows) == 0:
+            return [([], []) for _ in query_embeddings]
+        if len(rows) <= exact_search_limit:
+            return self.exact_search(
+                query_embeddings, rows, n_results, fetch_embeddings=fetch_embeddings
+            )
+
+        # over-fetch proportionally to the selectivity and drop disallowed cards
+        allowed = np.zeros(len(self.card_names), dtype=bool)
+        allowed[rows] = True
+        selectivity = len(rows) / len(self.card_names)
+        n_candidates = min(
+            max(math.ceil(n_results / selectivity * 1.5), n_results),
+            max_candidates,
+            len(self.card_names),
+        )
+        while True:
+            results = query(query_embeddings=query_embeddings, n_results=n_candidates)
+
+            filtered_results, complete = [], True
+            for distances, metadatas in zip(results["distances"], results["metadatas"]):
+                filtered_distances, card_names = [], []
+                for distance, metadata in zip(distances, metadatas):
+                    row = self.name_2_row.get(metadata["name"])
+                    if row is not None and allowed[row]:
+                        filtered_distances.append(distance)
+                        card_names.append(metadata["name"])
+                        if len(card_names) == n_results:
+                            break
+                filtered_results.append((filtered_distances, card_names))
+                # more candidates are only further away
+                complete &= (
+                    len(card_names) == n_results
+                    or len(distances) < n_candidates
+                    or (threshold is not None and distances[-1] > threshold)
+                )
+
+            if complete:
+                return filtered_results
+            if n_candidates >= min(max_candidates, len(self.card_names)):
+                break
+            n_candidates = min(n_candidates * 2, max_candidates, len(self.card_names))
+            logging.info(f"expanding to {n_candidates} candidates for {card_filter}")
+
+        if len(rows) > exact_fallback_limit:
+            logging.info(f"returning partial ANN results for {card_filter}")
+            return filtered_results
+
+        # not enough candidates survived, search all allowed cards exactly
+        logging.info(f"falling back to exact search for {card_filter}")
+        return self.exact_search(
+            query_embeddings, rows, n_results, fetch_embeddings=fetch_embeddings
+        )
+
+
+def normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.where(norms == 0, 1, norms)
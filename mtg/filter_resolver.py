@@ -0,0 +1,122 @@
+import difflib
+import logging
+from typing import Iterable, Optional
+from functools import lru_cache
+
+from mtg.name_index import normalize_name
+from mtg.filter_index import CardFilter
+from mtg.objects.card import COLORS
+
+
+COLOR_ALIASES = {
+    "white": "W",
+    "blue": "U",
+    "black": "B",
+    "red": "R",
+    "green": "G",
+}
+FORMAT_ALIASES = {
+    "edh": "commander",
+    "cedh": "commander",
+    "pdh": "paupercommander",
+    "pauper edh": "paupercommander",
+    "pauper commander": "paupercommander",
+    "standard brawl": "standardbrawl",
+    "old school": "oldschool",
+    "pre modern": "premodern",
+    "penny dreadful": "penny",
+}
+
+
+class FilterResolver:
+    """
+    Resolves requested keywords, formats and colors to the values of the card data.
+
+    Normalized names and aliases are looked up in dicts, only unknown terms
+    are fuzzy matched and the results of fuzzy matching are memoized.
+    """
+
+    def __init__(
+        self,
+        keywords: Iterable[str],
+        legalities: Iterable[str],
+        memo_size: int = 4096,
+    ):
+        self.key_2_keyword = {normalize_name(keyword): keyword for keyword in keywords}
+        self.key_2_legality = {
+            normalize_name(legality): legality for legality in legalities
+        }
+        for alias, legality in FORMAT_ALIASES.items():
+            if legality in self.key_2_legality.values():
+                self.key_2_legality.setdefault(alias, legality)
+
+        self.key_2_color = {color.lower(): color for color in COLORS}
+        self.key_2_color.update(COLOR_ALIASES)
+
+        self._match_keyword = lru_cache(maxsize=memo_size)(self._match_keyword)
+        self._match_legality = lru_cache(maxsize=memo_size)(self._match_legality)
+
+    def __repr__(self) -> str:
+        return f"FilterResolver(keywords:{len(self.key_2_keyword)}, legalities:{len(self.key_2_legality)})"
+
+    def _match_keyword(self, key: str) -> Optional[str]:
+        matches = difflib.get_close_matches(key, self.key_2_keyword, n=1, cutoff=0.8)
+        return self.key_2_keyword[matches[0]] if matches else None
+
+    def _match_legality(self, key: str) -> Optional[str]:
+        matches = difflib.get_close_matches(key, self.key_2_legality, n=1)
+        return self.key_2_legality[matches[0]] if matches else None
+
+    def resolve_keyword(self, keyword: str) -> Optional[str]:
+        key = normalize_name(keyword)
+        if key in self.key_2_keyword:
+            return self.key_2_keyword[key]
+        return self._match_keyword(key)
+
+    def resolve_legality(self, legality: str) -> Optional[str]:
+        key = normalize_name(legality)
+        if key in self.key_2_legality:
+            return self.key_2_legality[key]
+        return self._match_legality(key)
+
+    def resolve_color(self, color: str) -> Optional[str]:
+        return self.key_2_color.get(color.strip().lower())
+
+    def resolve(
+        self,
+        keywords: list[str],
+        color_identity: list[str],
+        legality: Optional[str] = None,
+    ) -> CardFilter:
+        """card filter with the resolved values, unknown values are dropped"""
+        resolved_keywords = []
+        for keyword in keywords:
+            resolved = self.resolve_keyword(keyword)
+            if resolved is None:
+                logging.info(f"did not find keyword: {keyword}")
+            elif resolved not in resolved_keywords:
+                resolved_keywords.append(resolved)
+
+        resolved_legality = None
+        if legality is not None:
+            resolved_legality = self.resolve_legality(legality)
+            if resolved_legality is None:
+                logging.info(f"did not find legality: {legality}")
+
+        colors = []
+        for color in color_identity:
+            resolved = self.resolve_color(color)
+            if resolved is not None and resolved not in colors:
+                colors.append(resolved)
+
+        return CardFilter(
+            keywords=resolved_keywords,
+            color_identity=colors,
+            legality=resolved_legality,
+        )
+
+    def memo_stats(self) -> dict:
+        return {
+            "keywords": self._match_keyword.cache_info()._asdict(),
+            "legalities": self._match_legality.cache_info()._asdict(),
+        }
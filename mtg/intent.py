@@ -0,0 +1,90 @@
+import threading
+from enum import Enum
+from typing import Callable, Optional
+
+import numpy as np
+
+
+class Intent(Enum):
+    DECKBUILDING = "deckbuilding"
+    RULES = "rules"
+    CONVERSATION = "conversation"
+
+
+# same classes as in notebooks/evaluation_intent_classification.ipynb
+INTENT_EXAMPLES = {
+    Intent.DECKBUILDING: [
+        "What cards can i add to my commander deck?",
+        "Which creatures work well in a sacrifice deck?",
+        "Suggest cheap removal spells in black and red",
+        "What is a good strategy for my elf tribal deck?",
+        "Give me some card draw for a blue control deck",
+        "Which cards combo with this commander?",
+    ],
+    Intent.RULES: [
+        "What happens if a creature with deathtouch blocks a creature with trample?",
+        "How does the stack work when both players cast spells?",
+        "Can I respond to a triggered ability?",
+        "When do I get priority during combat?",
+        "Does first strike damage happen before regular combat damage?",
+        "What happens to a token when it leaves the battlefield?",
+    ],
+    Intent.CONVERSATION: [
+        "Hello, how are you?",
+        "Thank you for your help!",
+        "Who are you?",
+        "Good morning",
+        "That was helpful, bye",
+        "What can you do?",
+    ],
+}
+
+
+class IntentRouter:
+    """
+    Lightweight intent classifier on top of the query embedding.
+
+    Every intent is represented by the mean embedding of a few example
+    questions, a query is assigned to the intent with the most similar
+    centroid. The examples are embedded once on first use.
+    """
+
+    def __init__(
+        self,
+        embed_function: Callable[[list[str]], list],
+        min_margin: float = 0.02,
+        examples: dict[Intent, list[str]] = INTENT_EXAMPLES,
+    ):
+        self.embed_function = embed_function
+        self.min_margin = min_margin
+        self.examples = examples
+        self._intents: list[Intent] = list(examples)
+        self._centroids: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def _fit(self) -> np.ndarray:
+        if self._centroids is None:
+            with self._lock:
+                if self._centroids is None:
+                    centroids = []
+                    for intent in self._intents:
+                        embeddings = normalize(
+                            np.array(self.embed_function(self.examples[intent]))
+                        )
+                        centroids.append(embeddings.mean(axis=0))
+                    self._centroids = normalize(np.array(centroids))
+        return self._centroids
+
+    def classify(self, embedding) -> Optional[Intent]:
+        """the most similar intent, None if the query is not clearly closer to one intent"""
+        centroids = self._fit()
+        similarities = centroids @ normalize(np.array(embedding, dtype=np.float32))
+        first, second = np.argsort(-similarities)[:2]
+        if similarities[first] - similarities[second] < self.min_margin:
+            return None
+        return self._intents[first]
+
+
+def normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.where(norms == 0, 1, norms)
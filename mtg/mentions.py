@@ -0,0 +1,128 @@
+import re
+from typing import Iterator, NamedTuple, Optional
+
+from mtg.name_index import normalize_name
+from mtg.aho_corasick import TokenAutomaton, tokenize
+
+# "Gandalf the White" -> "Gandalf"
+EPITHET_PATTERN = re.compile(r"^(\S+) the \S+")
+
+# words that can accompany a card name in a query that only asks for the card
+FILLER_WORDS = {"a", "an", "the", "card", "cards", "show", "me", "find", "get"}
+
+# short names that are also everyday words, e.g. Will for Will, Scion of Peace
+COMMON_WORDS = frozenset(
+    """
+    a about after again all also always am an and any are as at away back bad
+    be because been before best big bill both but by call can card cards cast
+    change come could day did do does down each end even every fall few find
+    first for free from get give go gold good grace great had has have help
+    her here high him his hold hope how i if in into is it its just keep kind
+    know last leave let life light like little long look lose make man many
+    may me mean merry might mind more most much must my need never new next
+    no not now of off old on once one only or other our out over own part
+    play point power pray put rest right rose run same see set shall she
+    should show so some start still such take than that the their them then
+    there these they thing think this those through time to too turn two up
+    us use very want was way we well were what when where which while who
+    why will win with without work would year yes yet you young your
+    """.split()
+)
+
+
+class Mentions(NamedTuple):
+    card_names: list[str]
+    # the query consists of card names only
+    name_only: bool
+
+
+def create_aliases(card_name: str, legendary: bool) -> Iterator[str]:
+    """short names a card is referred to by, e.g. Chatterfang for Chatterfang, Squirrel General"""
+    if not legendary:
+        return
+    if ", " in card_name:
+        yield card_name.split(", ")[0]
+    if card_name.startswith("The "):
+        yield card_name[len("The ") :]
+    match = EPITHET_PATTERN.match(card_name)
+    if match is not None:
+        yield match.group(1)
+
+
+def is_sentence_start(text: str, start: int) -> bool:
+    """True if the character at start begins the text, a sentence or a line"""
+    prefix = text[:start].rstrip(" \t\"'(*")
+    return not prefix or prefix[-1] in ".!?:\n"
+
+
+def create_patterns(summaries: list[dict]) -> Iterator[tuple[str, tuple[str, bool]]]:
+    """full card names and the aliases of legendary cards with (card name, is alias)"""
+    full_names = set()
+    for summary in summaries:
+        full_names.add(normalize_name(summary["name"]))
+        yield summary["name"], (summary["name"], False)
+
+    for summary in summaries:
+        for alias in create_aliases(summary["name"], summary.get("legendary", False)):
+            # a card with exactly that name wins over the alias
+            if normalize_name(alias) not in full_names:
+                yield alias, (summary["name"], True)
+
+
+def create_name_automaton(summaries: list[dict]) -> TokenAutomaton[tuple[str, bool]]:
+    """one automaton over all card names, shared by the mention detector and the card linker"""
+    return TokenAutomaton(create_patterns(summaries))
+
+
+class MentionDetector:
+    """
+    Finds cards that are mentioned by name in a query.
+
+    Full card names and the short names of legendary cards are matched with an
+    Aho-Corasick automaton. Single word card names like "Shock" are only taken
+    as mentions if they are capitalized within a sentence or the query consists
+    of nothing else, so "Flash creatures for my deck" does not mention Flash.
+    Single word short names of legendary cards are also mentions in lowercase,
+    unless they are common words like "will" in "What will happen?".
+    """
+
+    def __init__(
+        self,
+        summaries: list[dict],
+        automaton: Optional[TokenAutomaton[tuple[str, bool]]] = None,
+    ):
+        self.summaries = summaries
+        self.automaton = (
+            automaton if automaton is not None else create_name_automaton(summaries)
+        )
+
+    def __repr__(self) -> str:
+        return f"MentionDetector(cards:{len(self.summaries)})"
+
+    def detect(self, text: str) -> Mentions:
+        tokens = tokenize(text)
+        matches = self.automaton.find_longest(tokens)
+
+        covered = set()
+        for match in matches:
+            covered.update(range(match.start, match.end))
+        name_only = bool(matches) and all(
+            idx in covered or token.key in FILLER_WORDS
+            for idx, token in enumerate(tokens)
+        )
+
+        card_names = []
+        for match in matches:
+            single_word = match.end - match.start == 1
+            start = tokens[match.start].start
+            # the first word of a sentence is capitalized anyway
+            capitalized = text[start].isupper() and not is_sentence_start(text, start)
+            key = tokens[match.start].key
+            common_word = key in COMMON_WORDS or key.removesuffix("s") in COMMON_WORDS
+            for card_name, is_alias in match.values:
+                distinctive_alias = is_alias and not common_word
+                if single_word and not (distinctive_alias or capitalized or name_only):
+                    continue
+                if card_name not in card_names:
+                    card_names.append(card_name)
+        return Mentions(card_names=card_names, name_only=name_only)
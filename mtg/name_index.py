@@ -0,0 +1,197 @@
+import re
+import difflib
+import unicodedata
+from typing import Iterable, Optional
+from collections import defaultdict
+
+import numpy as np
+
+
+NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(name: str) -> str:
+    """lowercase, strip accents and replace punctuation with single spaces"""
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char))
+    return NON_ALPHANUMERIC.sub(" ", name.lower()).strip()
+
+
+def create_ngrams(key: str, ngram_size: int = 3) -> set[str]:
+    padded = f" {key} "
+    return {
+        padded[idx : idx + ngram_size]
+        for idx in range(max(len(padded) - ngram_size + 1, 1))
+    }
+
+
+class CardNameIndex:
+    """
+    Fuzzy index over card names.
+
+    Names are normalized for case, accents and punctuation. Misses are
+    resolved by collecting candidates that share character ngrams with the
+    query and reranking only the best candidates with difflib.
+    """
+
+    def __init__(
+        self,
+        names: Iterable[str],
+        ngram_size: int = 3,
+        max_candidates: int = 25,
+    ):
+        self.ngram_size = ngram_size
+        self.max_candidates = max_candidates
+
+        key_2_names: dict[str, list[str]] = defaultdict(list)
+        for name in names:
+            key_2_names[normalize_name(name)].append(name)
+        self.key_2_names = dict(key_2_names)
+        self.keys = list(self.key_2_names)
+
+        ngram_2_postings = defaultdict(list)
+        ngram_counts = []
+        for key_idx, key in enumerate(self.keys):
+            ngrams = create_ngrams(key, ngram_size)
+            ngram_counts.append(len(ngrams))
+            for ngram in ngrams:
+                ngram_2_postings[ngram].append(key_idx)
+
+        self.ngram_counts = np.array(ngram_counts, dtype=np.int32)
+        self.ngram_2_postings = {
+            ngram: np.array(postings, dtype=np.int32)
+            for ngram, postings in ngram_2_postings.items()
+        }
+
+    def __repr__(self) -> str:
+        return f"CardNameIndex(names:{len(self.keys)})"
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def get_close_matches(
+        self, name: str, n: int = 1, cutoff: float = 0.6
+    ) -> list[str]:
+        """
+        Finds the card names closest to name.
+
+        Works like difflib.get_close_matches but only compares against
+        candidates sharing character ngrams with the query.
+
+        Returns:
+            list[str]: up to n card names with a similarity of at least cutoff, best first.
+        """
+        key = normalize_name(name)
+        exact = self.key_2_names.get(key)
+        if exact is not None:
+            return exact[:n]
+
+        ngrams = create_ngrams(key, self.ngram_size)
+        postings = [
+            self.ngram_2_postings[ngram]
+            for ngram in ngrams
+            if ngram in self.ngram_2_postings
+        ]
+        if not postings:
+            return []
+
+        # jaccard similarity of the ngram sets for every key sharing an ngram
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.keys))
+        candidates = np.flatnonzero(shared)
+        jaccard = shared[candidates] / (
+            self.ngram_counts[candidates] + len(ngrams) - shared[candidates]
+        )
+        return self._rerank(key, candidates, jaccard, n=n, cutoff=cutoff)
+
+    def _rerank(
+        self,
+        key: str,
+        candidates: np.ndarray,
+        jaccard: np.ndarray,
+        n: int,
+        cutoff: float,
+    ) -> list[str]:
+        """difflib similarity for the candidates with the highest ngram overlap"""
+        if len(candidates) > self.max_candidates:
+            best = np.argpartition(-jaccard, self.max_candidates)[: self.max_candidates]
+            candidates = candidates[best]
+
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(key)
+        scored = []
+        for key_idx in candidates:
+            candidate = self.keys[key_idx]
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                score = matcher.ratio()
+                if score >= cutoff:
+                    scored.append((score, candidate))
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        matches = []
+        for _, candidate in scored:
+            matches.extend(self.key_2_names[candidate])
+            if len(matches) >= n:
+                break
+        return matches[:n]
+
+    def lookup(self, name: str, cutoff: float = 0.6) -> Optional[str]:
+        """best matching card name or None"""
+        matches = self.get_close_matches(name, n=1, cutoff=cutoff)
+        return matches[0] if matches else None
+
+    def lookup_many(self, names: list[str], cutoff: float = 0.6) -> list[Optional[str]]:
+        """
+        Best matching card name for every name, None if there is no match.
+
+        The ngram overlap of all names without a normalized exact match is
+        counted in one vectorized pass before the candidates of every name
+        are reranked.
+        """
+        keys = [normalize_name(name) for name in names]
+        matches: list[Optional[str]] = [None] * len(names)
+
+        misses, miss_ngram_counts, query_ids, postings = [], [], [], []
+        for idx, key in enumerate(keys):
+            exact = self.key_2_names.get(key)
+            if exact is not None:
+                matches[idx] = exact[0]
+                continue
+            ngrams = create_ngrams(key, self.ngram_size)
+            for ngram in ngrams:
+                if ngram in self.ngram_2_postings:
+                    postings.append(self.ngram_2_postings[ngram])
+                    query_ids.append(
+                        np.full(len(postings[-1]), len(misses), dtype=np.int64)
+                    )
+            misses.append(idx)
+            miss_ngram_counts.append(len(ngrams))
+        if not postings:
+            return matches
+
+        # shared ngrams of every (name, key) pair
+        pairs, shared = np.unique(
+            np.concatenate(query_ids) * len(self.keys) + np.concatenate(postings),
+            return_counts=True,
+        )
+        miss_idxs, candidates = np.divmod(pairs, len(self.keys))
+        jaccard = shared / (
+            self.ngram_counts[candidates]
+            + np.array(miss_ngram_counts)[miss_idxs]
+            - shared
+        )
+
+        bounds = np.searchsorted(miss_idxs, np.arange(len(misses) + 1))
+        for miss_idx, idx in enumerate(misses):
+            start, end = bounds[miss_idx], bounds[miss_idx + 1]
+            if start == end:
+                continue
+            found = self._rerank(
+                keys[idx],
+                candidates[start:end],
+                jaccard[start:end],
+                n=1,
+                cutoff=cutoff,
+            )
+            matches[idx] = found[0] if found else None
+        return matches
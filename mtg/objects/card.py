@@ -1,13 +1,67 @@
 from pathlib import Path
+from typing import Union
 from pydantic import BaseModel, Field
 from uuid import uuid4
 from .document import Document
 
 
+# bit positions of the compact chroma metadata, only append new values
+COLORS = ["W", "U", "B", "R", "G"]
+FORMATS = [
+    "standard",
+    "future",
+    "historic",
+    "timeless",
+    "gladiator",
+    "pioneer",
+    "explorer",
+    "modern",
+    "legacy",
+    "pauper",
+    "vintage",
+    "penny",
+    "commander",
+    "oathbreaker",
+    "standardbrawl",
+    "brawl",
+    "alchemy",
+    "paupercommander",
+    "duel",
+    "oldschool",
+    "premodern",
+    "predh",
+]
+KEYWORD_SEPARATOR = "|"
+
+
 def create_id():
     return str(uuid4())
 
 
+def encode_flags(values: list[str], vocabulary: list[str]) -> int:
+    """bitmask with one bit per value in the vocabulary, unknown values are ignored"""
+    mask = 0
+    for value in values:
+        if value in vocabulary:
+            mask |= 1 << vocabulary.index(value)
+    return mask
+
+
+def decode_flags(mask: int, vocabulary: list[str]) -> list[str]:
+    return [value for idx, value in enumerate(vocabulary) if mask & (1 << idx)]
+
+
+def encode_keywords(keywords: list[str]) -> str:
+    """keywords joined with a separator on both ends, e.g. |Flying|Trample|"""
+    if not keywords:
+        return ""
+    return KEYWORD_SEPARATOR + KEYWORD_SEPARATOR.join(keywords) + KEYWORD_SEPARATOR
+
+
+def decode_keywords(keywords: str) -> list[str]:
+    return [keyword for keyword in keywords.split(KEYWORD_SEPARATOR) if keyword]
+
+
 class Card(BaseModel):
     name: str
     mana_cost: str
@@ -29,30 +83,30 @@ class Card(BaseModel):
         return f"Card({self.name})"
 
     def to_dict(self) -> dict:
-        data = self.__dict__
+        data = dict(self.__dict__)
         data["rulings"] = [
             ruling.__dict__ if not isinstance(ruling, dict) else ruling
             for ruling in self.rulings
         ]
         return data
 
-    def to_chroma(self) -> dict[str, str]:
-        data = {
+    def to_chroma(self) -> dict[str, Union[str, int]]:
+        """compact metadata: color identity and legalities as bitmasks, keywords as one string"""
+        return {
             "name": self.name,
             "power": self.power,
             "toughness": self.toughness,
+            "color_identity": encode_flags(self.color_identity, COLORS),
+            "legalities": encode_flags(
+                [
+                    legality
+                    for legality, status in self.legalities.items()
+                    if status == "legal"
+                ],
+                FORMATS,
+            ),
+            "keywords": encode_keywords(self.keywords),
         }
-        for color_identity in self.color_identity:
-            data[f"color_identity_{color_identity}"] = True
-
-        for keyword in self.keywords:
-            data[f"keyword_{keyword}"] = True
-
-        for legality in self.legalities:
-            if self.legalities[legality] == "legal":
-                data[f"{legality}_legal"] = True
-
-        return data
 
     def to_text(self, include_price: bool = True):
         """parse card data to text format"""
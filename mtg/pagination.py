@@ -0,0 +1,103 @@
+import base64
+import hashlib
+from typing import Iterable, NamedTuple, Optional, Sequence
+
+import orjson
+
+from mtg.chroma.embedding import normalize_query
+
+
+# chroma returns slightly different distances for the same result depending
+# on n_results, distances closer than this are the same position
+DISTANCE_TOLERANCE = 1e-6
+
+
+class Cursor(NamedTuple):
+    """position after the last result of a page"""
+
+    # number of results on the previous pages
+    offset: int
+    # distance of the last result of the previous page
+    distance: float
+    # names of the results already returned at that distance
+    names: tuple[str, ...]
+
+    def after(self, distance: float, name: str) -> bool:
+        if abs(distance - self.distance) <= DISTANCE_TOLERANCE:
+            return name not in self.names
+        return distance > self.distance
+
+
+def select_page(
+    results: Iterable[tuple[float, str]],
+    k: int,
+    threshold: float,
+    cursor: Optional[Cursor] = None,
+    pinned_names: Sequence[str] = (),
+) -> list[tuple[float, str]]:
+    """
+    The (distance, name) results of a page, ordered by distance and name.
+
+    Pinned results like the cards mentioned in a query come first with
+    distance 0 on the first page and are left out of the search results.
+    Later pages start after the cursor, results beyond the threshold are cut.
+    """
+    results = sorted(result for result in results if result[1] not in pinned_names)
+    if cursor is None:
+        results = [(0.0, name) for name in pinned_names] + results
+    else:
+        results = [result for result in results if cursor.after(*result)]
+    return [result for result in results[:k] if result[0] <= threshold]
+
+
+def next_cursor(
+    cursor: Optional[Cursor], offset: int, page: list[tuple[float, str]]
+) -> Cursor:
+    """the cursor after the (distance, name) results of a full page"""
+    distance = page[-1][0]
+    names = [
+        name
+        for result_distance, name in page
+        if abs(result_distance - distance) <= DISTANCE_TOLERANCE
+    ]
+    if cursor is not None and abs(cursor.distance - distance) <= DISTANCE_TOLERANCE:
+        # the distance continues from the previous page
+        names = [*cursor.names, *names]
+    return Cursor(offset=offset, distance=distance, names=tuple(dict.fromkeys(names)))
+
+
+def query_fingerprint(text: str) -> str:
+    return hashlib.sha1(normalize_query(text).encode("utf-8")).hexdigest()[:8]
+
+
+def encode_cursor(text: str, cursor: Cursor) -> str:
+    """opaque cursor string, only valid for the same query text"""
+    data = orjson.dumps(
+        [cursor.offset, cursor.distance, cursor.names, query_fingerprint(text)]
+    )
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def decode_cursor(text: str, cursor: Optional[str]) -> Optional[Cursor]:
+    """
+    The cursor of the cursor string, None for the first page.
+
+    Raises:
+        ValueError: If the cursor is malformed or belongs to another query.
+    """
+    if not cursor:
+        return None
+    try:
+        offset, distance, names, fingerprint = orjson.loads(
+            base64.urlsafe_b64decode(cursor.encode("ascii"))
+        )
+        decoded = Cursor(
+            offset=int(offset),
+            distance=float(distance),
+            names=tuple(str(name) for name in names),
+        )
+    except Exception:
+        raise ValueError(f"invalid cursor: {cursor}")
+    if fingerprint != query_fingerprint(text) or decoded.offset < 0:
+        raise ValueError(f"cursor does not belong to the query: {cursor}")
+    return decoded
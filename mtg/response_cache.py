@@ -0,0 +1,85 @@
+import time
+import threading
+from typing import Any, Hashable, Optional
+from collections import OrderedDict, defaultdict
+
+
+class ResponseCache:
+    """
+    Size bounded LRU cache with a time to live for final search responses.
+
+    Keys are prefixed with a namespace per endpoint and the generation of the
+    data the response was computed from. Once the data changes, entries of
+    older generations are never hit again and age out of the cache.
+    invalidate drops all entries and bumps the generation of the cache itself,
+    so responses that were computed before are not stored as current.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._cache: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits: dict[str, int] = defaultdict(int)
+        self.misses: dict[str, int] = defaultdict(int)
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.generation = 0
+
+    def __repr__(self) -> str:
+        return f"ResponseCache(maxsize:{self.maxsize}, ttl_seconds:{self.ttl_seconds})"
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def get(self, namespace: str, generation: Hashable, key: Hashable) -> Optional[Any]:
+        """the cached response, None if it is missing or expired"""
+        cache_key = (namespace, generation, key)
+        with self._lock:
+            entry = self._cache.get(cache_key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._cache[cache_key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses[namespace] += 1
+                return None
+            self._cache.move_to_end(cache_key)
+            self.hits[namespace] += 1
+            return entry[1]
+
+    def put(self, namespace: str, generation: Hashable, key: Hashable, response: Any):
+        cache_key = (namespace, generation, key)
+        with self._lock:
+            self._cache[cache_key] = (time.monotonic() + self.ttl_seconds, response)
+            self._cache.move_to_end(cache_key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        namespaces = {}
+        for namespace in sorted(set(self.hits) | set(self.misses)):
+            requests = self.hits[namespace] + self.misses[namespace]
+            namespaces[namespace] = {
+                "hits": self.hits[namespace],
+                "misses": self.misses[namespace],
+                "hit_rate": self.hits[namespace] / requests if requests else 0.0,
+            }
+        return {
+            "generation": self.generation,
+            "size": len(self._cache),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl_seconds,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "namespaces": namespaces,
+        }
@@ -0,0 +1,220 @@
+from enum import Enum
+from datetime import datetime
+from typing import (
+    Any,
+    Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+    Literal,
+    NamedTuple,
+    Optional,
+)
+
+import orjson
+from pydantic import BaseModel
+
+from mtg.objects import Card
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, responses fall back to json
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+CardField = Literal[tuple(Card.model_fields)]
+
+
+class CardRef(NamedTuple):
+    """placeholder for a card in a response, replaced by the encoded card"""
+
+    card_name: str
+    # only these fields of the card are encoded, None for all fields
+    fields: Optional[tuple[str, ...]] = None
+
+
+def select_card_fields(
+    fields: Optional[list[str]] = None, exclude: Optional[list[str]] = None
+) -> Optional[tuple[str, ...]]:
+    """the projected card fields in model order, None if all fields are included"""
+    if fields is None and not exclude:
+        return None
+    return tuple(
+        field
+        for field in Card.model_fields
+        if (fields is None or field in fields) and field not in (exclude or [])
+    )
+
+
+def project_cards(content: list[dict], fields: Optional[tuple[str, ...]]) -> list[dict]:
+    """projects the CardRefs of a list of {"card": CardRef, ...} results"""
+    if fields is None:
+        return content
+    return [
+        {**item, "card": CardRef(item["card"].card_name, fields=fields)}
+        for item in content
+    ]
+
+
+def negotiate_media_type(accept: Optional[str], streaming: bool = False) -> str:
+    """
+    msgpack if the client accepts it and msgpack is installed, otherwise json.
+    Endpoints returning lists can be streamed as newline delimited json.
+    """
+    if streaming and accept and NDJSON_MEDIA_TYPE in accept:
+        return NDJSON_MEDIA_TYPE
+    if msgpack is not None and accept:
+        for media_type in MSGPACK_MEDIA_TYPES:
+            if media_type in accept:
+                return media_type
+    return JSON_MEDIA_TYPE
+
+
+def to_builtins(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"can not encode {type(obj)}")
+
+
+class CardEncoder:
+    """
+    Encodes responses with cards by splicing memoized bytes of every card.
+
+    A card is encoded once on first use, after that responses are joined
+    from the cached bytes instead of validating and serializing the card
+    model, including its rulings, on every request.
+    Up to max_cards encoded cards per media type and max_projected projected
+    cards per field selection are memoized, a full memo is dropped.
+    """
+
+    def __init__(
+        self,
+        load_card_json: Callable[[str], bytes],
+        max_cards: int = 10_000,
+        max_projected: int = 100_000,
+    ):
+        self.load_card_json = load_card_json
+        self.max_cards = max_cards
+        self.max_projected = max_projected
+        self._card_name_2_json: dict[str, bytes] = {}
+        self._card_name_2_msgpack: dict[str, bytes] = {}
+        self._projected_json: dict[tuple, bytes] = {}
+        self._projected_msgpack: dict[tuple, bytes] = {}
+
+    def __repr__(self) -> str:
+        return f"CardEncoder(cached:{len(self._card_name_2_json)})"
+
+    def card_json(self, card_name: str) -> bytes:
+        data = self._card_name_2_json.get(card_name)
+        if data is None:
+            data = self.load_card_json(card_name)
+            self._memoize(self._card_name_2_json, card_name, data, self.max_cards)
+        return data
+
+    def card_msgpack(self, card_name: str) -> bytes:
+        data = self._card_name_2_msgpack.get(card_name)
+        if data is None:
+            data = msgpack.packb(orjson.loads(self.card_json(card_name)))
+            self._memoize(self._card_name_2_msgpack, card_name, data, self.max_cards)
+        return data
+
+    def _project(self, card_ref: CardRef) -> dict:
+        card = orjson.loads(self.card_json(card_ref.card_name))
+        return {field: card[field] for field in card_ref.fields if field in card}
+
+    @staticmethod
+    def _memoize(memo: dict, key: Hashable, data: bytes, maxsize: int) -> None:
+        if len(memo) >= maxsize:
+            memo.clear()
+        memo[key] = data
+
+    def encode_card(self, card_ref: CardRef, media_type: str) -> bytes:
+        if card_ref.fields is None:
+            if media_type == JSON_MEDIA_TYPE:
+                return self.card_json(card_ref.card_name)
+            return self.card_msgpack(card_ref.card_name)
+
+        memo = (
+            self._projected_json
+            if media_type == JSON_MEDIA_TYPE
+            else self._projected_msgpack
+        )
+        data = memo.get(card_ref)
+        if data is None:
+            if media_type == JSON_MEDIA_TYPE:
+                data = orjson.dumps(self._project(card_ref))
+            else:
+                data = msgpack.packb(self._project(card_ref))
+            self._memoize(memo, card_ref, data, self.max_projected)
+        return data
+
+    def encode(self, content: Any, media_type: str = JSON_MEDIA_TYPE) -> bytes:
+        """
+        Encodes dicts, lists, pydantic models and plain values, CardRefs are
+        replaced by the encoded card.
+        """
+        if media_type == JSON_MEDIA_TYPE:
+            return self._encode_json(content)
+        return self._encode_msgpack(content)
+
+    def iter_ndjson(self, items: Iterable, chunk_size: int = 65536) -> Iterator[bytes]:
+        """
+        Encodes the items lazily as one json line each.
+
+        The first line is sent on its own to keep the time to first byte low,
+        after that lines are grouped into chunks of about chunk_size bytes.
+        """
+        chunk, size = [], 0
+        for idx, item in enumerate(items):
+            line = self._encode_json(item) + b"\n"
+            if idx == 0:
+                yield line
+                continue
+            chunk.append(line)
+            size += len(line)
+            if size >= chunk_size:
+                yield b"".join(chunk)
+                chunk, size = [], 0
+        if chunk:
+            yield b"".join(chunk)
+
+    def _encode_json(self, obj: Any) -> bytes:
+        if isinstance(obj, CardRef):
+            return self.encode_card(obj, JSON_MEDIA_TYPE)
+        if isinstance(obj, dict):
+            return (
+                b"{"
+                + b",".join(
+                    orjson.dumps(str(key)) + b":" + self._encode_json(value)
+                    for key, value in obj.items()
+                )
+                + b"}"
+            )
+        if isinstance(obj, (list, tuple)):
+            return b"[" + b",".join(self._encode_json(value) for value in obj) + b"]"
+        if isinstance(obj, BaseModel):
+            return obj.model_dump_json().encode()
+        return orjson.dumps(obj)
+
+    def _encode_msgpack(self, obj: Any) -> bytes:
+        if isinstance(obj, CardRef):
+            return self.encode_card(obj, MSGPACK_MEDIA_TYPES[0])
+        if isinstance(obj, dict):
+            packer = msgpack.Packer()
+            return packer.pack_map_header(len(obj)) + b"".join(
+                packer.pack(str(key)) + self._encode_msgpack(value)
+                for key, value in obj.items()
+            )
+        if isinstance(obj, (list, tuple)):
+            packer = msgpack.Packer()
+            return packer.pack_array_header(len(obj)) + b"".join(
+                self._encode_msgpack(value) for value in obj
+            )
+        return msgpack.packb(obj, default=to_builtins)
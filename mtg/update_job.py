@@ -0,0 +1,267 @@
+import uuid
+import time
+import fcntl
+import queue
+import logging
+import threading
+import traceback
+import multiprocessing
+from enum import Enum
+from pathlib import Path
+from datetime import datetime
+from collections import OrderedDict
+from typing import IO, Any, Callable, Optional
+
+from pydantic import BaseModel, Field
+
+LOCK_FILE = "job.lock"
+
+
+class JobStartingError(RuntimeError):
+    """another worker holds the job lock but has not stored its job yet, retry shortly"""
+
+
+class JobStatus(str, Enum):
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job(BaseModel):
+    id: str
+    status: JobStatus = JobStatus.RUNNING
+    stage: str = "starting"
+    started_at: datetime = Field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+
+
+def _run_job(target: Callable, kwargs: dict, messages: multiprocessing.Queue) -> None:
+    """entry point of the job process, progress and the result are sent through the queue"""
+
+    def progress(stage: str) -> None:
+        messages.put(("progress", stage))
+
+    try:
+        messages.put(("succeeded", target(**kwargs, progress=progress)))
+    except BaseException:
+        messages.put(("failed", traceback.format_exc()))
+
+
+class JobRunner:
+    """
+    Runs a job in a separate process, one at a time.
+
+    The target runs in a spawned process, so downloading, parsing and
+    embedding do not compete with request handling for the GIL. It gets a
+    progress callback for its current stage. A monitor thread follows the
+    process and calls on_success with the result in the serving process.
+    Starting a job while another one is running returns the running job.
+
+    With a jobs folder the runners of all server workers share their jobs:
+    the worker that starts a job holds a file lock until it is finished and
+    every job is stored as json, so any worker can report it. A running job
+    whose lock is free was interrupted and is reported as failed.
+    """
+
+    def __init__(
+        self,
+        target: Callable[..., Any],
+        on_success: Optional[Callable[[Any], None]] = None,
+        max_jobs: int = 20,
+        jobs_folder: Optional[Path] = None,
+    ):
+        self.target = target
+        self.on_success = on_success
+        self.max_jobs = max_jobs
+        self.jobs_folder = Path(jobs_folder) if jobs_folder is not None else None
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._running: Optional[Job] = None
+        self._lock_file: Optional[IO] = None
+        self._lock = threading.Lock()
+        self._context = multiprocessing.get_context("spawn")
+        if self.jobs_folder is not None:
+            self.jobs_folder.mkdir(parents=True, exist_ok=True)
+
+    def __repr__(self) -> str:
+        return f"JobRunner(target:{self.target.__name__}, jobs:{len(self._jobs)})"
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job.model_copy()
+        return self._load(job_id)
+
+    def start(self, **kwargs) -> tuple[Job, bool]:
+        """
+        Starts the target with the keyword arguments in a new process.
+
+        Returns:
+            tuple[Job, bool]: the job and whether it was started, False if
+                a job was already running in this or another worker.
+
+        Raises:
+            JobStartingError: If another worker is starting a job right now.
+        """
+        with self._lock:
+            if self._running is not None:
+                return self._running.model_copy(), False
+            if self.jobs_folder is not None:
+                self._lock_file = self._acquire()
+                if self._lock_file is None:
+                    running_job = self._get_running_job()
+                    if running_job is None:
+                        raise JobStartingError("a job is starting in another worker")
+                    return running_job, False
+            job = Job(id=uuid.uuid4().hex)
+            self._running = job
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+            self._save(job)
+            if self._lock_file is not None:
+                # other workers read the id of the running job from the lock file
+                self._lock_file.truncate(0)
+                self._lock_file.write(job.id)
+                self._lock_file.flush()
+
+        try:
+            messages = self._context.Queue()
+            process = self._context.Process(
+                target=_run_job,
+                args=(self.target, kwargs, messages),
+                name=f"job-{job.id}",
+                daemon=True,
+            )
+            process.start()
+        except Exception:
+            self._finish(job, JobStatus.FAILED, error=traceback.format_exc())
+            raise
+
+        logging.info(f"started job {job.id} in process {process.pid}")
+        threading.Thread(
+            target=self._monitor,
+            args=(job, process, messages),
+            name=f"job-monitor-{job.id}",
+            daemon=True,
+        ).start()
+        with self._lock:
+            return job.model_copy(), True
+
+    def _monitor(self, job: Job, process, messages) -> None:
+        status, result, error = JobStatus.FAILED, None, None
+        while True:
+            # a process that exited before the wait has flushed all its messages
+            alive = process.is_alive()
+            try:
+                kind, value = messages.get(timeout=1.0)
+            except queue.Empty:
+                if not alive:
+                    error = f"job process exited with code {process.exitcode}"
+                    break
+                continue
+            if kind == "progress":
+                self._set_stage(job, value)
+            elif kind == "succeeded":
+                status, result = JobStatus.SUCCEEDED, value
+                break
+            else:
+                error = value
+                break
+        process.join()
+
+        if status == JobStatus.SUCCEEDED and self.on_success is not None:
+            self._set_stage(job, "activating")
+            try:
+                self.on_success(result)
+            except Exception:
+                status, error = JobStatus.FAILED, traceback.format_exc()
+        self._finish(job, status, result=result, error=error)
+
+    def _set_stage(self, job: Job, stage: str) -> None:
+        with self._lock:
+            job.stage = stage
+            self._save(job)
+
+    def _finish(
+        self,
+        job: Job,
+        status: JobStatus,
+        result: Any = None,
+        error: Optional[str] = None,
+    ) -> None:
+        with self._lock:
+            job.status = status
+            job.stage = status.value
+            job.result = result
+            job.error = error
+            job.finished_at = datetime.now()
+            self._save(job)
+            self._running = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+        if error is not None:
+            logging.error(f"job {job.id} failed: {error}")
+        else:
+            logging.info(f"job {job.id} {status.value}")
+
+    def _acquire(self) -> Optional[IO]:
+        """the locked lock file of the jobs folder, None if another worker holds the lock"""
+        lock_file = (self.jobs_folder / LOCK_FILE).open("a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _get_running_job(self, timeout: float = 1.0) -> Optional[Job]:
+        """the job of the worker that holds the lock, waits until it is written"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job_id = (self.jobs_folder / LOCK_FILE).read_text().strip()
+            job = self._load(job_id) if job_id else None
+            if job is not None and job.status == JobStatus.RUNNING:
+                return job
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(0.05)
+
+    def _job_file(self, job_id: str) -> Path:
+        return self.jobs_folder / f"{job_id}.json"
+
+    def _save(self, job: Job) -> None:
+        if self.jobs_folder is None:
+            return
+        job_file = self._job_file(job.id)
+        tmp_file = job_file.with_name(f"{job_file.name}.tmp")
+        tmp_file.write_text(job.model_dump_json(), encoding="utf-8")
+        tmp_file.replace(job_file)
+
+        job_files = sorted(
+            self.jobs_folder.glob("*.json"), key=lambda path: path.stat().st_mtime
+        )
+        for job_file in job_files[: -self.max_jobs]:
+            job_file.unlink(missing_ok=True)
+
+    def _load(self, job_id: str) -> Optional[Job]:
+        if self.jobs_folder is None or not job_id.isalnum():
+            return None
+        try:
+            job = Job.model_validate_json(self._job_file(job_id).read_bytes())
+        except FileNotFoundError:
+            return None
+        if job.status == JobStatus.RUNNING:
+            lock_file = self._acquire()
+            if lock_file is not None:
+                # no worker holds the lock, the worker running the job stopped
+                job.status = JobStatus.FAILED
+                job.stage = job.status.value
+                job.error = "job was interrupted"
+                job.finished_at = datetime.now()
+                self._save(job)
+                lock_file.close()
+        return job
@@ -1,19 +1,93 @@
 import re
 import logging
+from typing import Mapping, Optional
 
 from mtg.objects import Card
+from mtg.name_index import CardNameIndex
+from mtg.aho_corasick import TokenAutomaton, tokenize
 
+MARKER_PATTERN = re.compile(r"<<([^<>]+)>>")
 
-def parse_card_names(text: str, card_name_2_card: dict[str, Card]) -> str:
 
-    pattern = r"<<([^<>]+)>>"
-    matches = re.findall(pattern, text)
+class CardLinker:
+    """
+    Rewrites card names in a text to markdown links in a single pass.
 
-    for match in list(set(matches)):
-        card = card_name_2_card.get(match, None)
-        if card is not None:
-            logging.info(f"parsing card name: {card.name}")
-            text = text.replace(f"<<{match}>>", f"[{card.name}]({card.url})")
-        else:
-            text = text.replace(f"<<{match}>>", match)
-    return text
+    Names in <<markers>> are resolved exactly or through the fuzzy name index,
+    markers that do not resolve to a card are replaced by their plain text.
+    Optionally capitalized card names without markers are found with an
+    Aho-Corasick automaton over all card names, usually the one of the mention
+    detector. Values are (card name, is alias), only full names are linked.
+    """
+
+    def __init__(
+        self,
+        card_name_2_card: Mapping[str, Card],
+        name_index: Optional[CardNameIndex] = None,
+        automaton: Optional[TokenAutomaton[tuple[str, bool]]] = None,
+    ):
+        self.card_name_2_card = card_name_2_card
+        self.name_index = name_index
+        if automaton is None:
+            automaton = TokenAutomaton(
+                (card_name, (card_name, False)) for card_name in card_name_2_card
+            )
+        self.automaton = automaton
+
+    def resolve(self, card_name: str) -> Optional[Card]:
+        card = self.card_name_2_card.get(card_name, None)
+        if card is None and self.name_index is not None:
+            match = self.name_index.lookup(card_name)
+            if match is not None:
+                card = self.card_name_2_card.get(match, None)
+        return card
+
+    def link(self, text: str, detect_names: bool = False) -> str:
+        pieces = []
+        position = 0
+        for marker in MARKER_PATTERN.finditer(text):
+            segment = text[position : marker.start()]
+            pieces.append(self._link_bare_names(segment) if detect_names else segment)
+
+            card = self.resolve(marker.group(1))
+            if card is not None:
+                logging.info(f"parsing card name: {card.name}")
+                pieces.append(f"[{card.name}]({card.url})")
+            else:
+                pieces.append(marker.group(1))
+            position = marker.end()
+
+        segment = text[position:]
+        pieces.append(self._link_bare_names(segment) if detect_names else segment)
+        return "".join(pieces)
+
+    def _link_bare_names(self, text: str) -> str:
+        tokens = tokenize(text)
+        if not tokens:
+            return text
+
+        pieces = []
+        position = 0
+        for match in self.automaton.find_longest(tokens):
+            start = tokens[match.start].start
+            end = tokens[match.end - 1].end
+            # card names are capitalized, this skips common words like "shock"
+            if not text[start].isupper():
+                continue
+            card_names = [name for name, is_alias in match.values if not is_alias]
+            card = self.card_name_2_card.get(card_names[0]) if card_names else None
+            if card is None:
+                continue
+            pieces.append(text[position:start])
+            pieces.append(f"[{card.name}]({card.url})")
+            position = end
+        pieces.append(text[position:])
+        return "".join(pieces)
+
+
+def parse_card_names(
+    text: str,
+    card_name_2_card: dict[str, Card],
+    name_index: Optional[CardNameIndex] = None,
+) -> str:
+    return CardLinker(card_name_2_card, name_index=name_index).link(text)
@@ -0,0 +1,68 @@
+import time
+import random
+import difflib
+from pathlib import Path
+
+from mtg.util import load_config
+from mtg.card_db import CardDB
+
+
+def create_typos(name: str, rng: random.Random) -> str:
+    """drops, swaps or duplicates one character of the name"""
+    chars = list(name)
+    idx = rng.randrange(len(chars))
+    operation = rng.choice(["drop", "swap", "duplicate"])
+    if operation == "drop" and len(chars) > 1:
+        del chars[idx]
+    elif operation == "swap" and idx < len(chars) - 1:
+        chars[idx], chars[idx + 1] = chars[idx + 1], chars[idx]
+    else:
+        chars.insert(idx, chars[idx])
+    return "".join(chars)
+
+
+def benchmark_name_index(card_db: CardDB, num_queries: int = 200, seed: int = 42):
+    rng = random.Random(seed)
+    names = rng.sample(card_db.all_card_names, num_queries)
+    queries = [create_typos(name, rng) for name in names]
+
+    start = time.perf_counter()
+    difflib_matches = [
+        difflib.get_close_matches(query, card_db.all_card_names, n=1)
+        for query in queries
+    ]
+    difflib_runtime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index_matches = [card_db.name_index.get_close_matches(query) for query in queries]
+    index_runtime = time.perf_counter() - start
+
+    difflib_hits = sum(
+        [
+            bool(matches) and matches[0] == name
+            for matches, name in zip(difflib_matches, names)
+        ]
+    )
+    index_hits = sum(
+        [
+            bool(matches) and matches[0] == name
+            for matches, name in zip(index_matches, names)
+        ]
+    )
+
+    print(f"queries: {num_queries} over {len(card_db.all_card_names)} card names")
+    print(
+        f"difflib:    {difflib_runtime / num_queries * 1000:.2f} ms/query - recovered {difflib_hits}"
+    )
+    print(
+        f"name index: {index_runtime / num_queries * 1000:.2f} ms/query - recovered {index_hits}"
+    )
+
+
+if __name__ == "__main__":
+    config = load_config(Path("configs/config.yaml"))
+    card_db = CardDB.load(
+        cards_folder=Path(config.get("cards_folder")),
+        snapshot_file=Path(config.get("card_snapshot_file")),
+    )
+    benchmark_name_index(card_db)
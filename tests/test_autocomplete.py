@@ -0,0 +1,51 @@
+import pytest
+from mtg.autocomplete import PrefixIndex
+
+
+SUMMARIES = [
+    {"name": "Lightning Bolt", "price": 1.5},
+    {"name": "Lightning Greaves", "price": 3.0},
+    {"name": "Chain Lightning", "price": 10.0},
+    {"name": "Lim-Dûl's Vault", "price": 0.5},
+    {"name": "Bolt Bend", "price": 0.2},
+]
+
+
+@pytest.fixture
+def prefix_index():
+    return PrefixIndex(SUMMARIES)
+
+
+@pytest.mark.parametrize(
+    "prefix,expected_card_names",
+    [
+        # names starting with the prefix come first, then by price
+        ("light", ["Lightning Greaves", "Lightning Bolt", "Chain Lightning"]),
+        ("Lightning B", ["Lightning Bolt"]),
+        ("bolt", ["Bolt Bend", "Lightning Bolt"]),
+        ("lim dul", ["Lim-Dûl's Vault"]),
+        ("xyz", []),
+        ("", []),
+    ],
+)
+def test_complete(prefix, expected_card_names, prefix_index):
+    assert prefix_index.complete(prefix) == expected_card_names
+
+
+def test_complete_limit(prefix_index):
+    assert prefix_index.complete("l", n=2) == ["Lightning Greaves", "Lightning Bolt"]
+
+
+def test_complete_names_matching_with_several_words():
+    # every word of the first card starts with the prefix and outranks the second card
+    prefix_index = PrefixIndex(
+        [
+            {"name": "Sliver Sliver Sliver Sliver Sliver", "price": 10.0},
+            {"name": "Crystalline Sliver", "price": 0.1},
+        ]
+    )
+
+    assert prefix_index.complete("sliver", n=2) == [
+        "Sliver Sliver Sliver Sliver Sliver",
+        "Crystalline Sliver",
+    ]
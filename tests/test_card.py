@@ -0,0 +1,73 @@
+import pytest
+from mtg.objects import Card
+from mtg.objects.card import (
+    COLORS,
+    FORMATS,
+    decode_flags,
+    decode_keywords,
+    encode_flags,
+    encode_keywords,
+)
+
+
+@pytest.mark.parametrize(
+    "values,vocabulary,expected_mask",
+    [
+        ([], COLORS, 0),
+        (["W"], COLORS, 0b1),
+        (["G", "W", "U"], COLORS, 0b10011),
+        (["standard", "commander"], FORMATS, (1 << 0) | (1 << 12)),
+        # unknown values have no bit
+        (["X", "B"], COLORS, 0b100),
+    ],
+)
+def test_encode_flags(values, vocabulary, expected_mask):
+    mask = encode_flags(values, vocabulary)
+
+    assert mask == expected_mask
+    assert decode_flags(mask, vocabulary) == [
+        value for value in vocabulary if value in values
+    ]
+
+
+def test_all_formats_fit_into_the_metadata():
+    # chroma stores ints as signed 64 bit
+    assert encode_flags(FORMATS, FORMATS) < 2**63
+
+
+def test_encode_keywords():
+    assert encode_keywords([]) == ""
+    assert encode_keywords(["Flying", "First strike"]) == "|Flying|First strike|"
+    assert decode_keywords(encode_keywords(["Flying", "First strike"])) == [
+        "Flying",
+        "First strike",
+    ]
+
+
+def test_to_chroma():
+    card = Card(
+        name="Baneslayer Angel",
+        mana_cost="{3}{W}{W}",
+        type="Creature — Angel",
+        oracle="Flying, first strike, lifelink",
+        price=5.0,
+        url="https://scryfall.com/card/m10/1",
+        power="5",
+        toughness="5",
+        color_identity=["W"],
+        keywords=["Flying", "First strike", "Lifelink"],
+        legalities={"commander": "legal", "modern": "legal", "standard": "not_legal"},
+    )
+
+    metadata = card.to_chroma()
+
+    assert metadata == {
+        "name": "Baneslayer Angel",
+        "power": "5",
+        "toughness": "5",
+        "color_identity": 0b1,
+        "legalities": (1 << FORMATS.index("commander"))
+        | (1 << FORMATS.index("modern")),
+        "keywords": "|Flying|First strike|Lifelink|",
+    }
+    assert all(isinstance(value, (str, int)) for value in metadata.values())
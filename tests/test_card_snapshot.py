@@ -0,0 +1,64 @@
+import pytest
+from mtg.objects import Card
+from mtg.card_snapshot import CardSnapshot, summarize_card, write_card_snapshot
+
+
+def create_card(name: str, type: str = "Creature — Elf") -> Card:
+    return Card(
+        name=name,
+        mana_cost="{G}",
+        type=type,
+        oracle="{T}: Add {G}.",
+        price=0.25,
+        url=f"https://scryfall.com/{name}",
+        color_identity=["G"],
+        keywords=["Flash"],
+        legalities={"commander": "legal", "standard": "not_legal"},
+    )
+
+
+@pytest.fixture
+def cards():
+    return [
+        create_card("Llanowar Elves"),
+        create_card("Fyndhorn Elves"),
+        create_card("Marwyn, the Nurturer", type="Legendary Creature — Elf Druid"),
+    ]
+
+
+def test_snapshot_round_trip(cards, tmp_path):
+    snapshot_file = tmp_path / "cards.snapshot"
+    assert write_card_snapshot(cards, snapshot_file) == len(cards)
+
+    snapshot = CardSnapshot(snapshot_file)
+    assert list(snapshot) == [card.name for card in cards]
+    for card in cards:
+        assert snapshot[card.name] == card
+        assert Card.model_validate_json(snapshot.card_json(card.name)) == card
+    for entry, card in zip(snapshot.entries, cards):
+        assert {key: entry[key] for key in summarize_card(card)} == summarize_card(card)
+    assert [entry["legendary"] for entry in snapshot.entries] == [False, False, True]
+    snapshot.close()
+
+
+def test_snapshot_cache_is_bounded(cards, tmp_path):
+    snapshot_file = tmp_path / "cards.snapshot"
+    write_card_snapshot(cards, snapshot_file)
+
+    snapshot = CardSnapshot(snapshot_file, maxsize=2)
+    for card in cards:
+        assert snapshot[card.name] == card
+    assert list(snapshot._name_2_card) == ["Fyndhorn Elves", "Marwyn, the Nurturer"]
+    snapshot["Fyndhorn Elves"]
+    assert list(snapshot._name_2_card) == ["Marwyn, the Nurturer", "Fyndhorn Elves"]
+    snapshot.close()
+
+
+def test_snapshot_version_mismatch(cards, tmp_path, monkeypatch):
+    snapshot_file = tmp_path / "cards.snapshot"
+    monkeypatch.setattr("mtg.card_snapshot.SNAPSHOT_VERSION", 1)
+    write_card_snapshot(cards, snapshot_file)
+    monkeypatch.undo()
+
+    with pytest.raises(ValueError):
+        CardSnapshot(snapshot_file)
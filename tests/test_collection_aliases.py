@@ -0,0 +1,151 @@
+import threading
+
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from chromadb.errors import InvalidCollectionException
+
+from mtg.chroma import ChromaConfig, ChromaDB, ChromaDocument
+from mtg.chroma.chroma_db import CollectionType
+
+
+@pytest.fixture
+def db(tmp_path):
+    return ChromaDB(ChromaConfig(host=str(tmp_path / "chromadb")))
+
+
+def create_documents(texts: list[str]) -> list[ChromaDocument]:
+    return [
+        ChromaDocument(id=f"doc-{idx}", document=text, metadata={"name": text})
+        for idx, text in enumerate(texts)
+    ]
+
+
+def test_rebuild_collection(db):
+    db.upsert_documents_to_collection(
+        create_documents(["deathtouch"]), CollectionType.DOCUMENTS
+    )
+
+    name = db.rebuild_collection(
+        CollectionType.DOCUMENTS,
+        create_documents(["trample", "flying"]),
+        smoke_query="flying",
+    )
+
+    assert name == "documents_v1"
+    assert db.get_physical_name(CollectionType.DOCUMENTS) == "documents_v1"
+    assert db.get_collection(CollectionType.DOCUMENTS).count() == 2
+    assert [c.name for c in db.client.list_collections() if c.name == "documents"] == []
+
+    db.rebuild_collection(
+        CollectionType.DOCUMENTS, create_documents(["haste"]), keep_versions=1
+    )
+    db.rebuild_collection(
+        CollectionType.DOCUMENTS, create_documents(["haste"]), keep_versions=1
+    )
+    names = sorted(c.name for c in db.client.list_collections())
+    assert names == ["collection_aliases", "documents_v2", "documents_v3"]
+
+
+def test_failed_rebuild_keeps_alias(db):
+    db.rebuild_collection(CollectionType.DOCUMENTS, create_documents(["trample"]))
+
+    with pytest.raises(ValueError):
+        db.rebuild_collection(CollectionType.DOCUMENTS, [], smoke_query="trample")
+
+    assert db.get_physical_name(CollectionType.DOCUMENTS) == "documents_v1"
+    assert db.get_collection(CollectionType.DOCUMENTS).count() == 1
+    assert "documents_v2" not in [c.name for c in db.client.list_collections()]
+
+
+def test_reconnect_sees_writes_of_other_clients(db, tmp_path):
+    db.upsert_documents_to_collection(
+        create_documents(["deathtouch"]), CollectionType.DOCUMENTS
+    )
+    collection = db.get_collection(CollectionType.DOCUMENTS)
+    other_db = ChromaDB(ChromaConfig(host=str(tmp_path / "other")))
+    other_collection = other_db.get_collection(CollectionType.DOCUMENTS)
+    assert db.published_generation() is None
+
+    db.publish()
+    generation = db.published_generation()
+    db.reconnect()
+
+    assert generation is not None
+    assert db.published_generation() == generation
+    assert db.get_collection(CollectionType.DOCUMENTS) is not collection
+    # handles of the old client and of other paths keep working
+    assert collection.count() == 1
+    assert other_collection.count() == 0
+    db.publish()
+    assert db.published_generation() != generation
+
+
+def test_handle_survives_rebuild(db, tmp_path):
+    db.rebuild_collection(CollectionType.DOCUMENTS, create_documents(["trample"]))
+    # a server worker opened the collection before the etl script rebuilt it
+    server_db = ChromaDB(ChromaConfig(host=str(tmp_path / "chromadb")))
+    collection = server_db.get_collection(CollectionType.DOCUMENTS)
+    generation = server_db.published_generation()
+
+    db.rebuild_collection(
+        CollectionType.DOCUMENTS, create_documents(["flying", "haste"]), keep_versions=1
+    )
+    db.publish()
+
+    assert collection.query(query_texts=["trample"], n_results=1)["ids"] == [["doc-0"]]
+    assert server_db.published_generation() != generation
+    server_db.reconnect()
+    assert server_db.get_collection(CollectionType.DOCUMENTS).count() == 2
+
+
+def test_reading_aliases_does_not_create_them(db):
+    assert db.get_physical_name(CollectionType.DOCUMENTS) == "documents"
+    assert "collection_aliases" not in [c.name for c in db.client.list_collections()]
+
+
+def test_reconnect_stops_the_replaced_system(db, monkeypatch):
+    system = db._connection.system
+    stopped = []
+    monkeypatch.setattr(system, "stop", lambda: stopped.append(system))
+
+    with db.use_collection(CollectionType.DOCUMENTS) as collection:
+        db.reconnect()
+        # the call in flight finishes on the old system
+        assert stopped == []
+        assert collection.count() == 0
+
+    assert stopped == [system]
+    db.reconnect()
+    assert len(stopped) == 1
+
+
+def test_concurrent_alias_changes(db, tmp_path):
+    # the card update job and create_rules_db rebuild at the same time
+    other_db = ChromaDB(ChromaConfig(host=str(tmp_path / "chromadb")))
+
+    def set_aliases(chroma_db, prefix):
+        for idx in range(20):
+            chroma_db._set_alias(f"{prefix}{idx}", f"{prefix}{idx}_v1")
+
+    threads = [
+        threading.Thread(target=set_aliases, args=(chroma_db, prefix))
+        for chroma_db, prefix in [(db, "cards"), (other_db, "documents")]
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(db._get_aliases()) == 40
+
+
+def test_missing_version_is_not_recreated(db):
+    db.rebuild_collection(CollectionType.DOCUMENTS, create_documents(["trample"]))
+    db.client.delete_collection("documents_v1")
+    db.reconnect()
+
+    with pytest.raises((ValueError, InvalidCollectionException), match="documents_v1"):
+        db.get_collection(CollectionType.DOCUMENTS)
+    assert "documents_v1" not in [c.name for c in db.client.list_collections()]
@@ -0,0 +1,65 @@
+import gzip
+import asyncio
+
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import StreamingResponse
+
+from mtg.serialization import JSON_MEDIA_TYPE, NDJSON_MEDIA_TYPE
+
+CHUNKS = [b'{"name": "Serra Angel"}\n' * 100, b'{"name": "Shivan Dragon"}\n' * 100]
+
+
+def create_app(media_type: str, produced: list, headers: dict):
+    async def iter_chunks():
+        for idx, chunk in enumerate(CHUNKS):
+            produced.append(idx)
+            yield chunk
+
+    return StreamingResponse(iter_chunks(), media_type=media_type, headers=headers)
+
+
+def call(media_type: str, headers: dict) -> tuple[list[dict], list[int]]:
+    produced, messages, produced_at_send = [], [], []
+
+    async def send(message):
+        messages.append(message)
+        produced_at_send.append(len(produced))
+
+    async def receive():
+        # never disconnects, the response ends when the stream is done
+        await asyncio.sleep(60)
+
+    middleware = GZipMiddleware(
+        create_app(media_type, produced, headers), minimum_size=100
+    )
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(b"accept-encoding", b"gzip")],
+    }
+    asyncio.run(middleware(scope, receive, send))
+    return messages, produced_at_send
+
+
+def test_ndjson_streams_are_not_buffered():
+    # the headers encode_response sets on streamed ndjson
+    messages, produced_at_send = call(
+        NDJSON_MEDIA_TYPE, headers={"Content-Encoding": "identity"}
+    )
+
+    headers = dict(messages[0]["headers"])
+    assert headers[b"content-encoding"] == b"identity"
+    # every chunk is sent unchanged as soon as it is produced
+    bodies = [message.get("body") for message in messages[1:]]
+    assert bodies[: len(CHUNKS)] == CHUNKS
+    assert produced_at_send[1 : len(CHUNKS) + 1] == [1, 2]
+
+
+def test_other_responses_are_compressed():
+    messages, _ = call(JSON_MEDIA_TYPE, headers={})
+
+    headers = dict(messages[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    assert gzip.decompress(body) == b"".join(CHUNKS)
@@ -0,0 +1,46 @@
+from mtg.chroma import ChromaDocument
+from mtg.etl.delta import CONTENT_HASH, content_hash, create_delta_plan
+
+
+def create_document(document_id: str, text: str, **metadata) -> ChromaDocument:
+    return ChromaDocument(
+        id=document_id,
+        document=text,
+        metadata={"name": text, **metadata, CONTENT_HASH: content_hash(text)},
+    )
+
+
+def test_delta_plan():
+    stored = [
+        create_document("bolt", "Lightning Bolt"),
+        create_document("angel", "Serra Angel", legalities=1),
+        create_document("elves", "Llanowar Elves"),
+        create_document("old-id", "Shivan Dragon"),
+        create_document("removed", "Ancestral Recall"),
+    ]
+    existing = {document.id: document.metadata for document in stored}
+    documents = [
+        create_document("bolt", "Lightning Bolt"),
+        create_document("angel", "Serra Angel", legalities=3),
+        create_document("elves", "Llanowar Elves errata"),
+        create_document("dragon", "Shivan Dragon"),
+        create_document("new", "Sol Ring"),
+    ]
+
+    plan = create_delta_plan(documents, existing)
+
+    assert [document.id for document in plan.inserts] == ["new"]
+    assert [document.id for document in plan.reembeds] == ["elves"]
+    assert [(old_id, document.id) for old_id, document in plan.moves] == [
+        ("old-id", "dragon")
+    ]
+    assert [document.id for document in plan.metadata_updates] == ["angel"]
+    assert plan.deletes == ["old-id", "removed"]
+    assert len(plan) == 6
+
+
+def test_delta_plan_unchanged():
+    documents = [create_document("bolt", "Lightning Bolt")]
+    existing = {document.id: document.metadata for document in documents}
+
+    assert len(create_delta_plan(documents, existing)) == 0
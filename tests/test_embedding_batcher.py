@@ -0,0 +1,75 @@
+import asyncio
+
+from mtg.executor import SearchExecutor
+from mtg.chroma.batching import EmbeddingBatcher
+
+
+def test_concurrent_queries_are_embedded_in_one_batch():
+    # arrange
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    batcher = EmbeddingBatcher(
+        embed, executor=SearchExecutor(max_workers=1), max_batch_size=8
+    )
+    texts = [f"query {'x' * idx}" for idx in range(5)]
+
+    # act
+    async def run():
+        return await asyncio.gather(*[batcher.embed(text) for text in texts])
+
+    embeddings = asyncio.run(run())
+
+    # assert
+    assert embeddings == [[float(len(text))] for text in texts]
+    assert calls == [texts]
+    assert batcher.stats()["mean_batch_size"] == 5
+
+
+def test_full_batches_are_sent_without_waiting():
+    calls = []
+
+    def embed(texts):
+        calls.append(len(texts))
+        return [[0.0] for _ in texts]
+
+    batcher = EmbeddingBatcher(
+        embed,
+        executor=SearchExecutor(max_workers=1),
+        max_batch_size=2,
+        max_wait_ms=10_000,
+    )
+
+    async def run():
+        return await asyncio.wait_for(
+            batcher.embed_many(["a", "b", "c", "d"]), timeout=5
+        )
+
+    embeddings = asyncio.run(run())
+
+    assert len(embeddings) == 4
+    assert calls == [2, 2]
+
+
+def test_batch_tasks_are_released_when_done():
+    batcher = EmbeddingBatcher(
+        lambda texts: [[0.0] for _ in texts],
+        executor=SearchExecutor(max_workers=1),
+        max_batch_size=2,
+    )
+
+    async def run():
+        embed = asyncio.ensure_future(batcher.embed_many(["a", "b", "c"]))
+        await asyncio.sleep(0)
+        running = len(batcher._tasks)
+        await embed
+        await asyncio.sleep(0)
+        return running
+
+    running = asyncio.run(run())
+
+    assert running == 2
+    assert not batcher._tasks
@@ -0,0 +1,83 @@
+from mtg.chroma import embedding
+from mtg.chroma.embedding import CachedEmbeddingFunction, EmbeddingProvider
+
+
+class CountingEmbeddingFunction:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, input):
+        self.calls.append(list(input))
+        return [[float(len(text)), 1.0] for text in input]
+
+
+def test_embedding_cache_hits_and_evictions():
+    # arrange
+    model = CountingEmbeddingFunction()
+    ef = CachedEmbeddingFunction(model, maxsize=2)
+
+    # act
+    first = ef.embed_queries(["explain deathtouch", "explain  deathtouch "])
+    second = ef.embed_queries(["explain deathtouch"])
+    ef.embed_queries(["what is trample", "how does the stack work"])
+
+    # assert
+    assert first[0] == first[1] == second[0]
+    assert model.calls[0] == ["explain deathtouch"]
+    assert len(model.calls) == 2
+    stats = ef.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 3
+    assert stats["evictions"] == 1
+    assert stats["size"] == 2
+
+
+def test_embedding_cache_passes_documents_through():
+    model = CountingEmbeddingFunction()
+    ef = CachedEmbeddingFunction(model)
+
+    ef(["Lightning Bolt deals 3 damage to any target."])
+
+    assert ef.stats()["size"] == 0
+    assert len(model.calls) == 1
+
+
+def test_embedding_provider_loads_model_once(monkeypatch):
+    # arrange
+    loaded = []
+
+    def load_model(model_name, device):
+        loaded.append(model_name)
+        return CountingEmbeddingFunction()
+
+    monkeypatch.setattr(
+        embedding.embedding_functions,
+        "SentenceTransformerEmbeddingFunction",
+        load_model,
+    )
+    provider = EmbeddingProvider("thenlper/gte-large")
+
+    # act
+    ready_before = provider.is_ready
+    provider(["flying"])
+    provider(["trample"])
+
+    # assert
+    assert not ready_before
+    assert provider.is_ready
+    assert loaded == ["thenlper/gte-large"]
+
+
+def test_embedding_provider_warm_up(monkeypatch):
+    model = CountingEmbeddingFunction()
+    monkeypatch.setattr(
+        embedding.embedding_functions,
+        "SentenceTransformerEmbeddingFunction",
+        lambda model_name, device: model,
+    )
+    provider = EmbeddingProvider("thenlper/gte-large")
+
+    provider.warm_up()
+
+    assert provider.is_ready
+    assert len(model.calls) == 1
@@ -0,0 +1,48 @@
+import time
+import asyncio
+
+import pytest
+from mtg.executor import SearchExecutor
+
+
+def test_blocking_work_does_not_block_the_event_loop():
+    # arrange
+    executor = SearchExecutor(max_workers=2)
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    # act
+    async def run():
+        ticker = asyncio.create_task(tick())
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            executor.run(time.sleep, 0.2), executor.run(time.sleep, 0.2)
+        )
+        elapsed = time.perf_counter() - start
+        ticker.cancel()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(run())
+    executor.shutdown()
+
+    # assert
+    assert results == [None, None]
+    # both searches ran in parallel while the loop kept serving other work
+    assert elapsed < 0.35
+    assert len(ticks) >= 5
+
+
+def test_errors_are_raised_in_the_caller():
+    executor = SearchExecutor(max_workers=1)
+
+    def fail(message):
+        raise ValueError(message)
+
+    with pytest.raises(ValueError, match="no results"):
+        asyncio.run(executor.run(fail, "no results"))
+    assert asyncio.run(executor.run(sum, [1, 2], start=3)) == 6
+    executor.shutdown()
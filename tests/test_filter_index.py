@@ -0,0 +1,271 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from mtg.filter_index import CardFilter, CardFilterIndex
+
+
+SUMMARIES = [
+    {
+        "name": "Serra Angel",
+        "keywords": ["Flying", "Vigilance"],
+        "color_identity": ["W"],
+        "legalities": ["modern", "commander"],
+    },
+    {
+        "name": "Llanowar Elves",
+        "keywords": [],
+        "color_identity": ["G"],
+        "legalities": ["modern", "commander", "standard"],
+    },
+    {
+        "name": "Baneslayer Angel",
+        "keywords": ["Flying", "First strike", "Lifelink"],
+        "color_identity": ["W"],
+        "legalities": ["commander"],
+    },
+    {
+        "name": "Colossal Dreadmaw",
+        "keywords": ["Trample"],
+        "color_identity": ["G"],
+        "legalities": ["commander", "standard"],
+    },
+]
+
+EMBEDDINGS = {
+    "Serra Angel": [1.0, 0.0],
+    "Llanowar Elves": [0.0, 1.0],
+    "Baneslayer Angel": [0.9, 0.1],
+    "Colossal Dreadmaw": [0.2, 1.0],
+}
+
+
+@pytest.fixture
+def filter_index():
+    return CardFilterIndex(SUMMARIES)
+
+
+@pytest.mark.parametrize(
+    "card_filter,expected_card_names",
+    [
+        (CardFilter(), None),
+        (CardFilter(keywords=["Flying"]), {"Serra Angel", "Baneslayer Angel"}),
+        (
+            CardFilter(keywords=["Lifelink", "Trample"]),
+            {"Baneslayer Angel", "Colossal Dreadmaw"},
+        ),
+        (CardFilter(keywords=["Flying"], legality="modern"), {"Serra Angel"}),
+        (
+            CardFilter(color_identity=["G"], legality="standard"),
+            {"Llanowar Elves", "Colossal Dreadmaw"},
+        ),
+        (CardFilter(keywords=["Deathtouch"]), set()),
+    ],
+)
+def test_select(card_filter, expected_card_names, filter_index):
+    rows = filter_index.select(card_filter)
+
+    if expected_card_names is None:
+        assert rows is None
+    else:
+        assert {filter_index.card_names[row] for row in rows} == expected_card_names
+        assert {
+            card_name
+            for card_name in filter_index.card_names
+            if filter_index.allows(card_filter, card_name)
+        } == expected_card_names
+
+
+def test_exact_search_only_returns_allowed_cards(filter_index):
+    # arrange
+    fetched = []
+
+    def fetch_embeddings(names):
+        fetched.extend(names)
+        return {name: EMBEDDINGS[name] for name in names}
+
+    def query(**kwargs):
+        raise AssertionError("small sets should not hit the vector index")
+
+    # act
+    results = filter_index.search(
+        [[1.0, 0.0]],
+        card_filter=CardFilter(color_identity=["G"]),
+        n_results=5,
+        query=query,
+        fetch_embeddings=fetch_embeddings,
+    )
+    filter_index.search(
+        [[1.0, 0.0]],
+        card_filter=CardFilter(color_identity=["G"]),
+        n_results=1,
+        query=query,
+        fetch_embeddings=fetch_embeddings,
+    )
+
+    # assert
+    distances, card_names = results[0]
+    assert card_names == ["Colossal Dreadmaw", "Llanowar Elves"]
+    assert distances == sorted(distances)
+    assert sorted(fetched) == ["Colossal Dreadmaw", "Llanowar Elves"]
+
+
+@pytest.fixture
+def large_filter_index():
+    # two green cards among eight
+    summaries = [
+        {
+            "name": f"Card {idx}",
+            "keywords": [],
+            "color_identity": ["G"] if idx >= 6 else ["W"],
+            "legalities": ["commander"],
+        }
+        for idx in range(8)
+    ]
+    return CardFilterIndex(summaries)
+
+
+def create_query(n_candidates: list[int]):
+    def query(query_embeddings, n_results):
+        n_candidates.append(n_results)
+        metadatas = [{"name": f"Card {idx}"} for idx in range(n_results)]
+        distances = [idx / 10 for idx in range(n_results)]
+        return {"distances": [distances], "metadatas": [metadatas]}
+
+    return query
+
+
+def test_search_expands_candidates_until_enough_allowed_cards(large_filter_index):
+    # arrange
+    n_candidates = []
+
+    def fetch_embeddings(names):
+        raise AssertionError("the ANN candidates should be enough")
+
+    # act
+    results = large_filter_index.search(
+        [[0.0, 1.0]],
+        card_filter=CardFilter(color_identity=["G"]),
+        n_results=1,
+        query=create_query(n_candidates),
+        fetch_embeddings=fetch_embeddings,
+        exact_search_limit=0,
+        max_candidates=8,
+    )
+
+    # assert
+    assert n_candidates == [6, 8]
+    assert results[0] == ([0.6], ["Card 6"])
+
+
+def test_search_stops_at_threshold(large_filter_index):
+    n_candidates = []
+
+    results = large_filter_index.search(
+        [[0.0, 1.0]],
+        card_filter=CardFilter(color_identity=["G"]),
+        n_results=1,
+        query=create_query(n_candidates),
+        fetch_embeddings=lambda names: {},
+        exact_search_limit=0,
+        max_candidates=8,
+        threshold=0.4,
+    )
+
+    # candidates beyond the threshold can not be followed by closer ones
+    assert n_candidates == [6]
+    assert results[0] == ([], [])
+
+
+def test_batch_search_matches_single_queries(filter_index):
+    # arrange
+    query_embeddings = [[1.0, 0.0], [0.0, 1.0], [0.5, 0.5]]
+    card_filter = CardFilter(legality="commander")
+
+    def fetch_embeddings(names):
+        return {name: EMBEDDINGS[name] for name in names}
+
+    def search(query_embeddings):
+        return filter_index.search(
+            query_embeddings,
+            card_filter=card_filter,
+            n_results=2,
+            query=None,
+            fetch_embeddings=fetch_embeddings,
+        )
+
+    # act
+    batch_results = search(query_embeddings)
+
+    # assert
+    assert len(batch_results) == len(query_embeddings)
+    assert batch_results == [search([embedding])[0] for embedding in query_embeddings]
+    assert batch_results[0][1] == ["Serra Angel", "Baneslayer Angel"]
+    assert batch_results[1][1] == ["Llanowar Elves", "Colossal Dreadmaw"]
+
+
+def test_concurrent_exact_searches_load_all_rows(filter_index):
+    # arrange
+    barrier = threading.Barrier(4)
+
+    def fetch_embeddings(names):
+        # every thread fetches before any of them writes
+        barrier.wait(timeout=5)
+        return {name: EMBEDDINGS[name] for name in names}
+
+    def search():
+        return filter_index.search(
+            [[1.0, 0.0]],
+            card_filter=CardFilter(legality="commander"),
+            n_results=4,
+            query=None,
+            fetch_embeddings=fetch_embeddings,
+        )
+
+    # act
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: search(), range(4)))
+
+    # assert
+    assert filter_index._loaded.all()
+    for distances, card_names in (result[0] for result in results):
+        assert len(card_names) == 4
+        assert not np.isnan(distances).any()
+
+
+def test_search_returns_partial_results_above_the_fallback_limit(large_filter_index):
+    def fetch_embeddings(names):
+        raise AssertionError("the allowed set is too large for an exact search")
+
+    results = large_filter_index.search(
+        [[0.0, 1.0]],
+        card_filter=CardFilter(color_identity=["G"]),
+        n_results=3,
+        query=create_query([]),
+        fetch_embeddings=fetch_embeddings,
+        exact_search_limit=0,
+        max_candidates=8,
+        exact_fallback_limit=1,
+    )
+
+    assert results[0] == ([0.6, 0.7], ["Card 6", "Card 7"])
+
+
+def test_select_format_without_legality_bit():
+    summaries = SUMMARIES + [
+        {
+            "name": "Grizzly Bears",
+            "keywords": [],
+            "color_identity": ["G"],
+            "legalities": ["commander", "newformat"],
+        }
+    ]
+    filter_index = CardFilterIndex(summaries)
+    card_filter = CardFilter(legality="newformat")
+
+    rows = filter_index.select(card_filter)
+
+    assert [filter_index.card_names[row] for row in rows] == ["Grizzly Bears"]
+    assert filter_index.allows(card_filter, "Grizzly Bears")
+    assert not filter_index.allows(card_filter, "Llanowar Elves")
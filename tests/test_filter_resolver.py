@@ -0,0 +1,82 @@
+import pytest
+from mtg.filter_index import CardFilter
+from mtg.filter_resolver import FilterResolver
+
+
+KEYWORDS = ["Flying", "First strike", "Lifelink", "Trample", "Landfall"]
+LEGALITIES = ["standard", "modern", "commander", "paupercommander", "oldschool"]
+
+
+@pytest.fixture
+def resolver():
+    return FilterResolver(KEYWORDS, LEGALITIES)
+
+
+@pytest.mark.parametrize(
+    "keyword,expected",
+    [
+        ("Flying", "Flying"),
+        ("flying", "Flying"),
+        ("first strike", "First strike"),
+        ("FIRST STRIKE", "First strike"),
+        ("lifelnk", "Lifelink"),
+        ("trampel", "Trample"),
+        ("deathtouch", None),
+        ("fly", None),
+    ],
+)
+def test_resolve_keyword(keyword, expected, resolver):
+    assert resolver.resolve_keyword(keyword) == expected
+
+
+@pytest.mark.parametrize(
+    "legality,expected",
+    [
+        ("Commander", "commander"),
+        ("edh", "commander"),
+        ("cEDH", "commander"),
+        ("pauper commander", "paupercommander"),
+        ("pdh", "paupercommander"),
+        ("old school", "oldschool"),
+        ("moder", "modern"),
+        ("vintage", None),
+    ],
+)
+def test_resolve_legality(legality, expected, resolver):
+    assert resolver.resolve_legality(legality) == expected
+
+
+def test_aliases_of_missing_formats_are_not_resolved():
+    resolver = FilterResolver(KEYWORDS, ["standard"])
+
+    assert resolver.resolve_legality("edh") is None
+    assert resolver.resolve_legality("pre modern") is None
+
+
+@pytest.mark.parametrize(
+    "color,expected",
+    [("W", "W"), ("u", "U"), (" green ", "G"), ("Black", "B"), ("purple", None)],
+)
+def test_resolve_color(color, expected, resolver):
+    assert resolver.resolve_color(color) == expected
+
+
+def test_resolve_drops_unknown_values(resolver):
+    card_filter = resolver.resolve(
+        keywords=["flying", "Flying", "banding", "lifelnk"],
+        color_identity=["white", "W", "purple"],
+        legality="vintage",
+    )
+
+    assert card_filter == CardFilter(
+        keywords=["Flying", "Lifelink"], color_identity=["W"], legality=None
+    )
+
+
+def test_fuzzy_matches_are_memoized(resolver):
+    resolver.resolve_keyword("lifelnk")
+    resolver.resolve_keyword("lifelnk")
+    resolver.resolve_keyword("Lifelink")
+
+    stats = resolver.memo_stats()["keywords"]
+    assert (stats["hits"], stats["misses"]) == (1, 1)
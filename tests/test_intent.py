@@ -0,0 +1,81 @@
+import pytest
+from mtg.intent import INTENT_EXAMPLES, Intent, IntentRouter
+
+# held out questions, none of them is an example of the router
+LABELED_QUERIES = [
+    ("Which green ramp cards fit into my landfall deck?", Intent.DECKBUILDING),
+    ("Recommend a finisher for my mono red burn deck", Intent.DECKBUILDING),
+    ("What are good lands for a three color commander deck?", Intent.DECKBUILDING),
+    ("Can I counter a spell that can't be countered?", Intent.RULES),
+    ("Does a creature with hexproof get hit by a board wipe?", Intent.RULES),
+    ("What happens when two replacement effects apply at once?", Intent.RULES),
+    ("Hi there!", Intent.CONVERSATION),
+    ("Thanks, that answers my question", Intent.CONVERSATION),
+    ("Are you a bot?", Intent.CONVERSATION),
+]
+
+WORDS = ["deck", "cards", "stack", "damage", "hello", "thank"]
+
+
+def embed_words(texts):
+    """toy embedding that counts a few words"""
+    return [[text.lower().count(word) for word in WORDS] for text in texts]
+
+
+def test_classify_toy_embeddings():
+    # arrange
+    examples = {
+        Intent.DECKBUILDING: ["cards for my deck", "deck cards"],
+        Intent.RULES: ["how does the stack work", "damage on the stack"],
+        Intent.CONVERSATION: ["hello", "thank you"],
+    }
+    router = IntentRouter(embed_words, examples=examples)
+
+    # act
+    intents = [
+        router.classify(embedding)
+        for embedding in embed_words(
+            ["what cards fit my deck", "combat damage", "hello again", "whatever"]
+        )
+    ]
+
+    # assert
+    # a query without any signal is not routed
+    assert intents == [Intent.DECKBUILDING, Intent.RULES, Intent.CONVERSATION, None]
+
+
+def test_examples_are_embedded_once():
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return embed_words(texts)
+
+    router = IntentRouter(embed)
+    router.classify(embed_words(["my deck"])[0])
+    router.classify(embed_words(["the stack"])[0])
+
+    assert len(calls) == len(INTENT_EXAMPLES)
+
+
+def test_labeled_queries(model):
+    # arrange
+    router = IntentRouter(lambda texts: model.encode(texts))
+
+    # act
+    embeddings = model.encode([query for query, _ in LABELED_QUERIES])
+    predictions = [router.classify(embedding) for embedding in embeddings]
+
+    # assert
+    correct = sum(
+        prediction == intent
+        for prediction, (_, intent) in zip(predictions, LABELED_QUERIES)
+    )
+    wrong = [
+        (query, prediction)
+        for prediction, (query, intent) in zip(predictions, LABELED_QUERIES)
+        if prediction is not None and prediction != intent
+    ]
+    # unsure queries search both collections, confidently wrong routes lose results
+    assert correct >= 7
+    assert len(wrong) <= 1, wrong
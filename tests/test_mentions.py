@@ -0,0 +1,125 @@
+import pytest
+from mtg.mentions import MentionDetector, create_name_automaton, is_sentence_start
+from mtg.objects import Card
+from mtg.url_parsing import CardLinker
+
+
+CARD_NAMES = [
+    ("Chatterfang, Squirrel General", True),
+    ("Gandalf the White", True),
+    ("Gandalf the Grey", True),
+    ("The Locust God", True),
+    ("Anje Falkenrath", True),
+    ("Hunt the Weak", False),
+    ("Shock", False),
+    ("Forest", False),
+    ("Flash", False),
+    ("Sacrifice", False),
+    ("Will, Scion of Peace", True),
+    ("Merry, Esquire of Rohan", True),
+    ("Bill the Pony", True),
+    ("Dance, Pathetic Marionette", False),
+]
+
+
+@pytest.fixture(scope="module")
+def mention_detector():
+    return MentionDetector(
+        [{"name": name, "legendary": legendary} for name, legendary in CARD_NAMES]
+    )
+
+
+@pytest.mark.parametrize(
+    "text,expected_card_names",
+    [
+        (
+            "What Cards can i add to my chatterfang deck?",
+            ["Chatterfang, Squirrel General"],
+        ),
+        ("How does Anje Falkenraths ability work?", ["Anje Falkenrath"]),
+        ("strategy for my gandalf the white deck?", ["Gandalf the White"]),
+        ("cards for my gandalf deck", ["Gandalf the White", "Gandalf the Grey"]),
+        ("my locust god cedh deck", ["The Locust God"]),
+        # only legendary cards get short names, lowercase single words are no names
+        ("hunt creatures with shock effects", []),
+        ("Is Shock good?", ["Shock"]),
+        # the first word of a sentence is capitalized anyway
+        ("Forest lands that tap for two mana", []),
+        ("Flash creatures for my deck", []),
+        ("I play aristocrats. Sacrifice outlets?", []),
+        ("Sacrifice outlets with Shock", ["Shock"]),
+        # short names that are common words need a capital letter within a sentence
+        ("What will happen if I cast flash spells?", []),
+        ("Will this work with a merry band of hobbits?", []),
+        ("Bill pays the bill", []),
+        ("How does Will work with Bill?", ["Will, Scion of Peace", "Bill the Pony"]),
+        # cards that are not legendary have no short names
+        ("cards for a dance deck", []),
+    ],
+)
+def test_detect(text, expected_card_names, mention_detector):
+    mentions = mention_detector.detect(text)
+
+    assert mentions.card_names == expected_card_names
+    assert not mentions.name_only
+
+
+@pytest.mark.parametrize(
+    "text,expected_card_names",
+    [
+        ("shock", ["Shock"]),
+        ("Chatterfang, Squirrel General", ["Chatterfang, Squirrel General"]),
+        ("show me the locust god card", ["The Locust God"]),
+    ],
+)
+def test_detect_name_only(text, expected_card_names, mention_detector):
+    mentions = mention_detector.detect(text)
+
+    assert mentions.card_names == expected_card_names
+    assert mentions.name_only
+
+
+@pytest.mark.parametrize(
+    "text,start,expected",
+    [
+        ("Forest", 0, True),
+        ("  Forest", 2, True),
+        ("I like it. Forest", 11, True),
+        ('He said: "Forest', 10, True),
+        ("first line\nForest", 11, True),
+        ("I like Forest", 7, False),
+    ],
+)
+def test_is_sentence_start(text, start, expected):
+    assert is_sentence_start(text, start) == expected
+
+
+def test_card_linker_shares_the_automaton():
+    # arrange
+    summaries = [
+        {"name": name, "legendary": legendary} for name, legendary in CARD_NAMES
+    ]
+    automaton = create_name_automaton(summaries)
+    card_name_2_card = {
+        name: Card(
+            name=name,
+            mana_cost="",
+            type="",
+            oracle="",
+            price=0.0,
+            url=f"https://cards/{name.split(',')[0]}",
+        )
+        for name, _ in CARD_NAMES
+    }
+    mention_detector = MentionDetector(summaries, automaton=automaton)
+    card_linker = CardLinker(card_name_2_card, automaton=automaton)
+
+    # act
+    mentions = mention_detector.detect("Chatterfang or Anje Falkenrath?")
+    linked = card_linker.link("Chatterfang or Anje Falkenrath?", detect_names=True)
+
+    # assert
+    assert mention_detector.automaton is card_linker.automaton
+    assert mentions.card_names == ["Chatterfang, Squirrel General", "Anje Falkenrath"]
+    # short names are mentions but are not linked
+    assert linked == "Chatterfang or [Anje Falkenrath](https://cards/Anje Falkenrath)?"
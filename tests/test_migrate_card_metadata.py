@@ -0,0 +1,77 @@
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from mtg.chroma import ChromaConfig, ChromaDB
+from mtg.chroma.chroma_db import CollectionType
+from mtg.objects.card import COLORS, FORMATS, encode_flags
+from mtg.etl.migrate_card_metadata import (
+    is_legacy_metadata,
+    migrate_card_metadata,
+    migrated_id,
+    to_compact_metadata,
+)
+
+LEGACY_METADATA = {
+    "name": "Serra Angel",
+    "power": "4",
+    "toughness": "4",
+    "keyword_Flying": True,
+    "keyword_Vigilance": True,
+    "color_identity_W": True,
+    "modern_legal": True,
+    "commander_legal": True,
+}
+
+
+def test_to_compact_metadata():
+    metadata = to_compact_metadata(LEGACY_METADATA)
+
+    assert is_legacy_metadata(LEGACY_METADATA)
+    assert not is_legacy_metadata(metadata)
+    assert metadata == {
+        "name": "Serra Angel",
+        "power": "4",
+        "toughness": "4",
+        "color_identity": encode_flags(["W"], COLORS),
+        "legalities": encode_flags(["modern", "commander"], FORMATS),
+        "keywords": "|Flying|Vigilance|",
+    }
+
+
+def test_migrate_card_metadata(tmp_path):
+    # arrange
+    db = ChromaDB(ChromaConfig(host=str(tmp_path / "chromadb")))
+    collection = db.get_collection(CollectionType.CARDS)
+    collection.add(
+        ids=["legacy", "compact"],
+        embeddings=[[1.0, 0.0], [0.0, 1.0]],
+        documents=["Serra Angel", "Llanowar Elves"],
+        metadatas=[
+            LEGACY_METADATA,
+            {"name": "Llanowar Elves", "legalities": 1, "keywords": ""},
+        ],
+    )
+
+    # act
+    num_migrated = migrate_card_metadata(db, batch_size=1)
+    num_migrated_again = migrate_card_metadata(db)
+
+    # assert
+    assert (num_migrated, num_migrated_again) == (1, 0)
+    records = collection.get(include=["embeddings", "documents", "metadatas"])
+    id_2_record = {
+        document_id: (list(embedding), document, metadata)
+        for document_id, embedding, document, metadata in zip(
+            records["ids"],
+            records["embeddings"],
+            records["documents"],
+            records["metadatas"],
+        )
+    }
+    assert set(id_2_record) == {"compact", migrated_id("legacy")}
+    assert id_2_record[migrated_id("legacy")] == (
+        [1.0, 0.0],
+        "Serra Angel",
+        to_compact_metadata(LEGACY_METADATA),
+    )
@@ -0,0 +1,55 @@
+import pytest
+from mtg.name_index import CardNameIndex, normalize_name
+
+
+CARD_NAMES = [
+    "Chatterfang, Squirrel General",
+    "Elesh Norn, Mother of Machines",
+    "Anje Falkenrath",
+    "Gandalf the White",
+    "Gandalf the Grey",
+    "The Locust God",
+    "Lim-Dûl's Vault",
+    "Jötun Grunt",
+]
+
+
+@pytest.fixture(scope="module")
+def name_index():
+    return CardNameIndex(CARD_NAMES)
+
+
+def test_normalize_name():
+    assert normalize_name("Lim-Dûl's Vault") == "lim dul s vault"
+    assert normalize_name("  Jötun   GRUNT ") == "jotun grunt"
+
+
+@pytest.mark.parametrize(
+    "query,expected_card_name",
+    [
+        # case, punctuation and accents
+        ("elesh norn mother of machines", "Elesh Norn, Mother of Machines"),
+        ("lim dul's vault", "Lim-Dûl's Vault"),
+        ("Jotun Grunt", "Jötun Grunt"),
+        # typos
+        ("Anje Falkenrth", "Anje Falkenrath"),
+        ("Gandalf the Whtie", "Gandalf the White"),
+        ("The Locus God", "The Locust God"),
+    ],
+)
+def test_name_index_lookup(query, expected_card_name, name_index):
+    assert name_index.lookup(query) == expected_card_name
+
+
+def test_name_index_no_match(name_index):
+    assert name_index.lookup("Island") is None
+    assert name_index.get_close_matches("") == []
+
+
+def test_name_index_lookup_many(name_index):
+    queries = ["Anje Falkenrth", "Island", "Jötun Grunt", "The Locus God", ""]
+
+    matches = name_index.lookup_many(queries)
+
+    assert matches == [name_index.lookup(query) for query in queries]
+    assert matches == ["Anje Falkenrath", None, "Jötun Grunt", "The Locust God", None]
@@ -0,0 +1,131 @@
+import pytest
+from mtg.pagination import (
+    Cursor,
+    decode_cursor,
+    encode_cursor,
+    next_cursor,
+    select_page,
+)
+
+# distance of every card of the fixture, some cards share a distance
+CARD_DISTANCES = {
+    "Lightning Bolt": 0.2,
+    "Shock": 0.25,
+    "Flash": 0.3,
+    "Counterspell": 0.3,
+    "Brainstorm": 0.3,
+    "Serra Angel": 0.4,
+    "Shivan Dragon": 0.5,
+    "Llanowar Elves": 0.6,
+    "Sol Ring": 0.7,
+    "Dark Ritual": 0.8,
+}
+
+
+def search(n_results: int, allowed=None) -> list[tuple[float, str]]:
+    """the n nearest cards, chroma returns slightly different distances for every n_results"""
+    results = sorted(
+        (distance, name)
+        for name, distance in CARD_DISTANCES.items()
+        if allowed is None or name in allowed
+    )[:n_results]
+    return [
+        (distance + (n_results % 3 - 1) * 1e-9 * (idx % 2), name)
+        for idx, (distance, name) in enumerate(results)
+    ]
+
+
+def walk(k: int, threshold: float = 1.0, allowed=None, mentioned=()) -> list[list[str]]:
+    """the names of every page, requested like the /cards endpoint does"""
+    pages, cursor = [], None
+    while True:
+        n_results = (cursor.offset if cursor is not None else 0) + k
+        page = select_page(
+            search(n_results, allowed),
+            k=k,
+            threshold=threshold,
+            cursor=cursor,
+            pinned_names=mentioned,
+        )
+        pages.append([name for _, name in page])
+        if len(page) < k:
+            return pages
+        cursor = decode_cursor(
+            "mana", encode_cursor("mana", next_cursor(cursor, n_results, page))
+        )
+
+
+def test_cursor_roundtrip():
+    cursor = Cursor(offset=20, distance=0.25, names=("Serra Angel",))
+
+    encoded = encode_cursor("flying  angels", cursor)
+
+    assert decode_cursor("flying angels", encoded) == cursor
+    assert decode_cursor("flying angels", None) is None
+
+
+def test_cursor_of_other_query():
+    encoded = encode_cursor("flying angels", Cursor(20, 0.25, ("Serra Angel",)))
+
+    with pytest.raises(ValueError):
+        decode_cursor("green elves", encoded)
+    with pytest.raises(ValueError):
+        decode_cursor("flying angels", "not a cursor")
+
+
+def test_cursor_after():
+    cursor = Cursor(offset=2, distance=0.25, names=("Serra Angel",))
+
+    assert cursor.after(0.3, "Baneslayer Angel")
+    assert cursor.after(0.25, "Shivan Dragon")
+    # the same distance returned by a query with another n_results
+    assert not cursor.after(0.25 + 1e-9, "Serra Angel")
+    assert cursor.after(0.25 - 1e-9, "Baneslayer Angel")
+    assert not cursor.after(0.1, "Shivan Dragon")
+
+
+def test_next_cursor_keeps_the_names_at_the_distance():
+    cursor = next_cursor(None, 2, [(0.25, "Shock"), (0.3, "Brainstorm")])
+    assert cursor == Cursor(offset=2, distance=0.3, names=("Brainstorm",))
+
+    cursor = next_cursor(cursor, 4, [(0.3 + 1e-9, "Counterspell"), (0.3, "Flash")])
+    assert cursor.names == ("Brainstorm", "Counterspell", "Flash")
+
+
+@pytest.mark.parametrize("k", [1, 2, 3, 4])
+def test_pages(k):
+    pages = walk(k)
+
+    # every card once, the order of cards at the same distance may change
+    names = [name for page in pages for name in page]
+    assert sorted(names) == sorted(CARD_DISTANCES)
+    assert len(names) == len(set(names))
+    assert [CARD_DISTANCES[name] for name in names] == sorted(CARD_DISTANCES.values())
+
+
+def test_pages_with_filter():
+    allowed = {"Flash", "Brainstorm", "Counterspell", "Sol Ring", "Shock"}
+
+    pages = walk(2, allowed=allowed)
+
+    assert pages == [["Shock", "Brainstorm"], ["Counterspell", "Flash"], ["Sol Ring"]]
+
+
+def test_pages_with_mentions():
+    pages = walk(3, mentioned=["Sol Ring", "Flash"])
+
+    names = [name for page in pages for name in page]
+    assert pages[0] == ["Sol Ring", "Flash", "Lightning Bolt"]
+    assert sorted(names) == sorted(CARD_DISTANCES)
+    assert len(names) == len(set(names))
+
+
+def test_pages_within_threshold():
+    pages = walk(2, threshold=0.35)
+
+    # the page with the last result within the threshold is not full
+    assert pages == [
+        ["Lightning Bolt", "Shock"],
+        ["Brainstorm", "Counterspell"],
+        ["Flash"],
+    ]
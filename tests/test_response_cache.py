@@ -0,0 +1,44 @@
+from mtg import response_cache
+from mtg.response_cache import ResponseCache
+
+
+def test_response_cache_hit_and_generation():
+    cache = ResponseCache(maxsize=2)
+    cache.put("cards", 0, "deathtouch", ["Typhoid Rats"])
+
+    assert cache.get("cards", 0, "deathtouch") == ["Typhoid Rats"]
+    # other endpoints and newer data generations do not share entries
+    assert cache.get("rules", 0, "deathtouch") is None
+    assert cache.get("cards", 1, "deathtouch") is None
+
+    stats = cache.stats()
+    assert stats["namespaces"]["cards"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_response_cache_eviction_and_invalidation():
+    cache = ResponseCache(maxsize=2)
+    cache.put("rules", 0, "a", 1)
+    cache.put("rules", 0, "b", 2)
+    cache.get("rules", 0, "a")
+    cache.put("rules", 0, "c", 3)
+
+    # b was the least recently used entry
+    assert cache.get("rules", 0, "b") is None
+    assert cache.get("rules", 0, "a") == 1
+
+    cache.invalidate()
+    assert len(cache) == 0
+    assert cache.generation == 1
+
+
+def test_response_cache_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(ttl_seconds=10)
+    cache.put("cards", 0, "stack", "response")
+
+    now[0] += 5
+    assert cache.get("cards", 0, "stack") == "response"
+    now[0] += 6
+    assert cache.get("cards", 0, "stack") is None
+    assert cache.stats()["expirations"] == 1
@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from mtg.etl.scryfall import (
+    BulkFileState,
+    RulingsIndex,
+    iter_json_array,
+    prefetch,
+    stream_download,
+)
+from mtg.etl.create_card_db import (
+    BULK_DATA_TYPES,
+    check_bulk_data,
+    download_card_data,
+    get_bulk_data_state_file,
+    update_cards,
+)
+
+ORACLE_ID = "b34bb2dc-c1af-4d77-b0b3-a0fb342a5fc6"
+
+
+def chunked(data: bytes, size: int):
+    return [data[idx : idx + size] for idx in range(0, len(data), size)]
+
+
+def test_iter_json_array():
+    items = [{"name": "Æther Vial", "cmc": 1}, {"name": "Lightning Bolt"}, 12345, []]
+    data = json.dumps(items, ensure_ascii=False, indent=2).encode("utf-8")
+
+    for size in [1, 3, 7, len(data)]:
+        assert list(iter_json_array(chunked(data, size))) == items
+    assert list(iter_json_array([b"[]"])) == []
+
+
+def test_iter_json_array_incomplete():
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunked(b'[{"name": "Lightning', 4)))
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'{"name": "Lightning Bolt"}']))
+
+
+def test_prefetch():
+    def failing():
+        yield 1
+        raise RuntimeError("connection lost")
+
+    assert list(prefetch(range(100), maxsize=2)) == list(range(100))
+    with pytest.raises(RuntimeError):
+        list(prefetch(failing()))
+
+
+def test_rulings_index():
+    index = RulingsIndex.from_rulings(
+        [
+            {"oracle_id": ORACLE_ID, "comment": "first"},
+            {"oracle_id": ORACLE_ID, "comment": "second"},
+        ]
+    )
+
+    assert len(index) == 1
+    assert index.get(ORACLE_ID) == ["first", "second"]
+    assert index.get("00000000-0000-0000-0000-000000000000") == []
+    assert index.get(None) == []
+
+
+def write_bulk_data(server_folder, url, updated_at, age=0):
+    bulk_data_file = server_folder / "bulk-data"
+    bulk_data_file.write_text(
+        json.dumps(
+            {
+                "data": [
+                    {
+                        "type": name,
+                        "download_uri": f"{url}/{name}.json",
+                        "updated_at": updated_at,
+                        "size": (server_folder / f"{name}.json").stat().st_size,
+                    }
+                    for name in BULK_DATA_TYPES
+                ]
+            }
+        )
+    )
+    # last modified has a resolution of seconds
+    mtime = time.time() - age
+    os.utime(bulk_data_file, (mtime, mtime))
+
+
+@pytest.fixture
+def bulk_data_server(tmp_path):
+    """local stand-in for the scryfall bulk data api"""
+    server_folder = tmp_path / "server"
+    server_folder.mkdir()
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0),
+        partial(SimpleHTTPRequestHandler, directory=str(server_folder)),
+    )
+    url = f"http://127.0.0.1:{server.server_port}"
+    cards = [
+        {
+            "oracle_id": ORACLE_ID,
+            "name": "Lightning Bolt",
+            "type_line": "Instant",
+            "layout": "normal",
+        },
+        {"oracle_id": None, "name": "Sticker", "type_line": "Stickers"},
+    ]
+    rulings = [{"oracle_id": ORACLE_ID, "comment": "deals 3 damage"}]
+    (server_folder / "oracle_cards.json").write_text(json.dumps(cards))
+    (server_folder / "rulings.json").write_text(json.dumps(rulings))
+    write_bulk_data(server_folder, url, updated_at="2024-10-01T09:00:00+00:00", age=60)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"{url}/bulk-data", server_folder
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_card_data(bulk_data_server, tmp_path):
+    lookup_url, _ = bulk_data_server
+    download_folder = tmp_path / "raw"
+    bulk_data_info, state = check_bulk_data(
+        download_folder / "all_cards.json", lookup_url=lookup_url
+    )
+
+    data = list(download_card_data(download_folder, bulk_data_info, state=state))
+
+    assert [card["name"] for card in data] == ["Lightning Bolt"]
+    assert data[0]["rulings"] == ["deals 3 damage"]
+    assert (download_folder / "oracle_cards.json").is_file()
+    assert (download_folder / "rulings.json").is_file()
+    assert state.file("rulings").last_modified is not None
+
+
+def test_check_bulk_data(bulk_data_server, tmp_path):
+    lookup_url, server_folder = bulk_data_server
+    all_cards_file = tmp_path / "all_cards.json"
+    bulk_data_info, state = check_bulk_data(all_cards_file, lookup_url=lookup_url)
+    assert bulk_data_info is not None
+
+    # a completed update
+    all_cards_file.write_text("[]")
+    state.update(bulk_data_info, BULK_DATA_TYPES)
+    state.save(get_bulk_data_state_file(all_cards_file))
+
+    # not modified
+    assert check_bulk_data(all_cards_file, lookup_url=lookup_url)[0] is None
+    assert check_bulk_data(all_cards_file, lookup_url=lookup_url, force=True)[0]
+
+    # modified lookup with the same bulk files
+    write_bulk_data(server_folder, lookup_url, updated_at="2024-10-01T09:00:00+00:00")
+    assert check_bulk_data(all_cards_file, lookup_url=lookup_url)[0] is None
+
+    # new bulk files
+    write_bulk_data(server_folder, lookup_url, updated_at="2024-10-02T09:00:00+00:00")
+    assert check_bulk_data(all_cards_file, lookup_url=lookup_url)[0] is not None
+
+
+def test_conditional_download(bulk_data_server, tmp_path):
+    lookup_url, _ = bulk_data_server
+    url = lookup_url.replace("bulk-data", "rulings.json")
+    path = tmp_path / "rulings.json"
+    state = BulkFileState()
+
+    downloaded = b"".join(stream_download(url, path, state=state))
+    assert downloaded == path.read_bytes()
+    assert state.conditional_headers()
+
+    # not modified, the local copy is read
+    path.write_bytes(b"[]")
+    assert b"".join(stream_download(url, path, state=state)) == b"[]"
+
+
+def test_update_without_cards(bulk_data_server, tmp_path):
+    lookup_url, server_folder = bulk_data_server
+    (server_folder / "oracle_cards.json").write_text("[]")
+    url = lookup_url.removesuffix("/bulk-data")
+    write_bulk_data(server_folder, url, updated_at="2024-10-02T09:00:00+00:00")
+    keywords_file = tmp_path / "keywords.json"
+    keywords_file.write_text("[]")
+    cards_folder = tmp_path / "cards"
+    cards_folder.mkdir()
+
+    # nothing is written to the collection
+    with pytest.raises(ValueError, match="has 0 cards"):
+        update_cards(
+            all_cards_file=tmp_path / "raw" / "all_cards.json",
+            all_keywords_file=keywords_file,
+            processed_cards_folder=cards_folder,
+            db=None,
+            lookup_url=lookup_url,
+            rebuild=True,
+        )
@@ -0,0 +1,125 @@
+import orjson
+import pytest
+from mtg.objects import Card, Document
+from mtg.serialization import (
+    CardEncoder,
+    CardRef,
+    negotiate_media_type,
+    project_cards,
+    select_card_fields,
+)
+
+
+CARD = Card(
+    name="Serra Angel",
+    mana_cost="{3}{W}{W}",
+    type="Creature — Angel",
+    oracle="Flying, vigilance",
+    price=0.25,
+    url="https://cards/serra_angel",
+    keywords=["Flying", "Vigilance"],
+    rulings=[Document(name="Ruling", text="Vigilance means ...", url="")],
+)
+
+
+@pytest.fixture
+def card_encoder():
+    loaded = []
+
+    def load_card_json(card_name):
+        loaded.append(card_name)
+        return CARD.model_dump_json().encode()
+
+    card_encoder = CardEncoder(load_card_json)
+    card_encoder.loaded = loaded
+    return card_encoder
+
+
+def test_encode_json(card_encoder):
+    content = [
+        {"card": CardRef("Serra Angel"), "distance": 0.1},
+        {"card": CardRef("Serra Angel"), "distance": 0.2},
+    ]
+
+    encoded = card_encoder.encode(content)
+
+    assert orjson.loads(encoded) == [
+        {"card": CARD.model_dump(mode="json"), "distance": 0.1},
+        {"card": CARD.model_dump(mode="json"), "distance": 0.2},
+    ]
+    # the card is serialized once
+    assert card_encoder.loaded == ["Serra Angel"]
+
+
+def test_encode_msgpack(card_encoder):
+    msgpack = pytest.importorskip("msgpack")
+    content = {"cards": [{"card": CardRef("Serra Angel"), "distance": 0.1}]}
+
+    encoded = card_encoder.encode(content, "application/msgpack")
+
+    assert msgpack.unpackb(encoded) == orjson.loads(card_encoder.encode(content))
+
+
+def test_negotiate_media_type():
+    assert negotiate_media_type(None) == "application/json"
+    assert negotiate_media_type("text/html, */*") == "application/json"
+
+
+def test_encode_projected_cards(card_encoder):
+    fields = select_card_fields(["url", "name", "type"])
+    content = project_cards(
+        [{"card": CardRef("Serra Angel"), "distance": 0.1}], fields=fields
+    )
+
+    encoded = orjson.loads(card_encoder.encode(content))
+
+    assert encoded == [
+        {
+            "card": {"name": CARD.name, "type": CARD.type, "url": CARD.url},
+            "distance": 0.1,
+        }
+    ]
+
+
+def test_select_card_fields():
+    assert select_card_fields() is None
+    assert "rulings" not in select_card_fields(exclude=["rulings"])
+    assert select_card_fields(["name", "oracle"], exclude=["oracle"]) == ("name",)
+
+
+def test_iter_ndjson(card_encoder):
+    items = [{"card": CardRef("Serra Angel"), "distance": idx / 10} for idx in range(5)]
+
+    chunks = list(card_encoder.iter_ndjson(items, chunk_size=1))
+    lines = b"".join(chunks).splitlines()
+
+    # the first line is sent on its own
+    assert chunks[0].count(b"\n") == 1
+    assert [orjson.loads(line) for line in lines] == orjson.loads(
+        card_encoder.encode(items)
+    )
+    assert negotiate_media_type("application/x-ndjson") == "application/json"
+    assert (
+        negotiate_media_type("application/x-ndjson", streaming=True)
+        == "application/x-ndjson"
+    )
+
+
+def test_card_memo_is_bounded():
+    loaded = []
+
+    def load_card_json(card_name):
+        loaded.append(card_name)
+        return CARD.model_copy(update={"name": card_name}).model_dump_json().encode()
+
+    card_encoder = CardEncoder(load_card_json, max_cards=2)
+    for card_name in [
+        "Serra Angel",
+        "Baneslayer Angel",
+        "Serra Angel",
+        "Shivan Dragon",
+    ]:
+        card_encoder.card_json(card_name)
+
+    assert len(card_encoder._card_name_2_json) <= 2
+    assert loaded == ["Serra Angel", "Baneslayer Angel", "Shivan Dragon"]
@@ -0,0 +1,96 @@
+import time
+import fcntl
+
+import pytest
+from mtg.update_job import LOCK_FILE, Job, JobRunner, JobStartingError, JobStatus
+
+
+def update(seconds: float, progress=None) -> int:
+    progress("updating")
+    time.sleep(seconds)
+    return 3
+
+
+def failing_update(progress=None) -> int:
+    raise ValueError("bulk data not found")
+
+
+def wait(runner: JobRunner, job_id: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = runner.get(job_id)
+        if job.status != JobStatus.RUNNING:
+            return job
+        time.sleep(0.05)
+    pytest.fail(f"job {job_id} did not finish")
+
+
+def test_job_runner():
+    results = []
+    runner = JobRunner(update, on_success=results.append)
+
+    job, started = runner.start(seconds=1.0)
+    running_job, started_again = runner.start(seconds=1.0)
+
+    assert started and not started_again
+    assert running_job.id == job.id
+
+    job = wait(runner, job.id)
+    assert job.status == JobStatus.SUCCEEDED
+    assert job.result == 3
+    assert results == [3]
+    assert runner.start(seconds=0.0)[1]
+
+
+def test_failing_job():
+    runner = JobRunner(failing_update)
+
+    job, _ = runner.start()
+
+    job = wait(runner, job.id)
+    assert job.status == JobStatus.FAILED
+    assert "bulk data not found" in job.error
+    assert runner.get("unknown") is None
+
+
+def test_job_runners_share_the_jobs_folder(tmp_path):
+    # arrange, one runner per server worker
+    results = []
+    runner = JobRunner(update, on_success=results.append, jobs_folder=tmp_path)
+    other_runner = JobRunner(update, jobs_folder=tmp_path)
+
+    # act
+    job, started = runner.start(seconds=1.0)
+    running_job, started_in_other_worker = other_runner.start(seconds=1.0)
+
+    # assert
+    assert started and not started_in_other_worker
+    assert running_job.id == job.id
+    job = wait(other_runner, job.id)
+    assert job.status == JobStatus.SUCCEEDED
+    assert job.result == 3
+    # the result is activated by the worker that started the job
+    wait(runner, job.id)
+    assert results == [3]
+    assert other_runner.start(seconds=0.0)[1]
+
+
+def test_interrupted_job(tmp_path):
+    job = Job(id="abc123")
+    (tmp_path / f"{job.id}.json").write_text(job.model_dump_json())
+
+    job = JobRunner(update, jobs_folder=tmp_path).get(job.id)
+
+    # no worker holds the lock of the running job
+    assert job.status == JobStatus.FAILED
+    assert job.error == "job was interrupted"
+    assert JobRunner(update, jobs_folder=tmp_path).get("../abc123") is None
+
+
+def test_job_starting_in_other_worker(tmp_path):
+    # another worker took the lock and has not written its job yet
+    with (tmp_path / LOCK_FILE).open("a+") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        with pytest.raises(JobStartingError):
+            JobRunner(update, jobs_folder=tmp_path).start(seconds=0.0)
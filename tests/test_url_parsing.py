@@ -0,0 +1,64 @@
+import pytest
+from mtg.objects import Card
+from mtg.name_index import CardNameIndex
+from mtg.url_parsing import CardLinker
+
+
+def create_card(name: str) -> Card:
+    return Card(
+        name=name,
+        mana_cost="{R}",
+        type="Instant",
+        oracle="",
+        price=0.0,
+        url=f"https://cards/{name.replace(' ', '_')}",
+    )
+
+
+CARD_NAMES = ["Lightning Bolt", "Bolt", "Anje Falkenrath", "Lim-Dûl's Vault", "Shock"]
+
+
+@pytest.fixture(scope="module")
+def card_linker():
+    card_name_2_card = {name: create_card(name) for name in CARD_NAMES}
+    return CardLinker(card_name_2_card, name_index=CardNameIndex(CARD_NAMES))
+
+
+def test_link_markers(card_linker):
+    text = "Cast <<Lightning Bolt>>, <<anje falkenrth>> and <<Unknown Card>>."
+
+    linked = card_linker.link(text)
+
+    assert linked == (
+        "Cast [Lightning Bolt](https://cards/Lightning_Bolt), "
+        "[Anje Falkenrath](https://cards/Anje_Falkenrath) and Unknown Card."
+    )
+
+
+def test_link_bare_names(card_linker):
+    text = "Anje Falkenraths ability discards, Lightning Bolt and Lim-Dul's Vault. No shock."
+
+    linked = card_linker.link(text, detect_names=True)
+
+    assert linked == (
+        "[Anje Falkenrath](https://cards/Anje_Falkenrath) ability discards, "
+        "[Lightning Bolt](https://cards/Lightning_Bolt) and "
+        "[Lim-Dûl's Vault](https://cards/Lim-Dûl's_Vault). No shock."
+    )
+
+
+def test_bare_names_are_only_linked_on_request(card_linker):
+    text = "Lightning Bolt deals 3 damage."
+
+    assert card_linker.link(text) == text
+
+
+def test_unresolved_markers_become_plain_text(card_linker):
+    text = "<<Unknown Card>> is not <<Lightning Bolt>>"
+
+    linked = card_linker.link(text)
+
+    # same as the original parser, the markers never reach the user
+    assert (
+        linked == "Unknown Card is not [Lightning Bolt](https://cards/Lightning_Bolt)"
+    )